@@ -39,112 +39,798 @@
 # make sure to respect their usage license.
 
 # PyPDF4
+import PyPDF4
 from PyPDF4 import PdfFileReader, PdfFileWriter
 from PyPDF4.pdf import ContentStream, PageObject
 from PyPDF4.generic import TextStringObject, NameObject, IndirectObject
-from PyPDF4.utils import b_
+from PyPDF4.generic import DecodedStreamObject, DictionaryObject, NumberObject, readObject, createStringObject
+from PyPDF4.generic import ByteStringObject, _pdfDocEncoding
+from PyPDF4.utils import b_, readNonWhitespace
 from PyPDF4.utils import PyPdfError
 
 
-# PyMuPDF
-import fitz
-
+# PyMuPDF, asyncio and the process pools are imported where they are used:
+# PyMuPDF is only needed by the fitz backend, the fallback pages and the pages
+# over a limit, so the PyPDF path doesn't pay for their import
+
+import codecs
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import Counter
-from typing import Dict, List, Optional, Tuple
+from contextlib import contextmanager
+from functools import lru_cache
+from io import BytesIO
+from itertools import accumulate, groupby
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    # Names of the annotations only, they are imported where they are used
+    import fitz
+    from asyncio import Semaphore
+    from concurrent.futures import Executor
+else:
+    # So that get_type_hints resolves the annotations of remove_watermarks_async
+    Executor = Semaphore = Any
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# Content stream operators, as they are read by PyPDF ContentStream
+OP_q = b_('q')
+OP_Q = b_('Q')
+OP_BT = b_('BT')
+OP_ET = b_('ET')
+OP_Tf = b_('Tf')
+TEXT_SHOWING_OPERATORS = frozenset(b_(i) for i in ['TJ', 'Tj'])
+GRAPHICAL_OPERATORS = frozenset(b_(i) for i in ['f', 'F','B', 'B*', 'b', 'b*', 'n', 'W', 'W*','m',
+                                                'l', 'c', 'v', 'y', 'h', 're',])
+
+
+# A PDF input once loaded: a path, or a buffer holding the whole file
+PDFInput = Union[str, bytes, bytearray, memoryview, mmap.mmap]
+
+def load_pdf_input(
+    src) -> PDFInput:
+    """
+    Load the input of remove_watermarks once, so both PyPDF and PyMuPDF read
+    the same object: paths and buffers are kept as they are, file objects
+    backed by a file are memory-mapped and other binary streams are read.
+
+    Args:
+        src: Path, bytes, bytearray, memoryview, mmap or binary file object
+    """
+    if isinstance(src, (str, os.PathLike)):
+        return os.fspath(src)
+    if isinstance(src, (bytes, bytearray, memoryview, mmap.mmap)):
+        return src
+    try:
+        return mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return src.read()
+
+@contextmanager
+def open_pdf_input(
+    pdf: PDFInput):
+    """
+    Seekable binary stream over a loaded PDF input, for PyPDF.
+    Files are memory-mapped; bytes are read in place.
+    """
+    if isinstance(pdf, str):
+        with open(pdf, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as stream:
+            yield stream
+    elif isinstance(pdf, mmap.mmap):
+        pdf.seek(0)
+        yield pdf
+    else:
+        # BytesIO shares the memory of bytes, it copies the other buffers
+        yield BytesIO(pdf)
+
+def fitz_open_input(
+    pdf: PDFInput) -> 'fitz.Document':
+    """
+    Open a loaded PDF input with PyMuPDF: from its path, or from its buffer.
+
+    bytes and bytearray are handed to PyMuPDF as they are, and so is the
+    bytes object under a memoryview of all of it. PyMuPDF can't open other
+    memoryviews nor mmaps, so those are the only buffers copied into bytes.
+    """
+    import fitz
+    if isinstance(pdf, str):
+        return fitz.open(pdf)
+    if (isinstance(pdf, memoryview) and isinstance(pdf.obj, (bytes, bytearray))
+            and pdf.contiguous and pdf.nbytes == len(pdf.obj)):
+        pdf = pdf.obj
+    if not isinstance(pdf, (bytes, bytearray)):
+        pdf = bytes(pdf)
+    return fitz.open(stream=pdf, filetype="pdf")
+
+@contextmanager
+def open_pdf_output(
+    output):
+    """
+    Binary stream where an output PDF is written: a path is opened
+    for writing, a writable stream is used as it is.
+    """
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, "wb") as stream:
+            yield stream
+    else:
+        yield output
+
+def fitz_save(
+    doc: 'fitz.Document',
+    output):
+    """
+    Save a PyMuPDF document to a path or to a writable stream
+    """
+    if isinstance(output, (str, os.PathLike)):
+        doc.save(os.fspath(output))
+    else:
+        output.write(doc.tobytes())
+
+def resolved_object_text(
+    obj: object,
+    visited: Optional[set] = None) -> str:
+    """
+    Text of a PDF object with its IndirectObject attributions resolved, in
+    a recursive fashion, for the label checks of the XObject entries.
+
+    The document is only read: the IndirectObjects stay in place, so the
+    writer still finds them. Each indirect object is resolved only once,
+    later references to it (e.g., /PieceInfo data pointing back to its
+    parent) are written as the reference.
+
+    Args:
+        obj: PDF object
+        visited: (idnum, generation) of the objects already resolved
+    """
+    visited = set() if visited is None else visited
+    if isinstance(obj, IndirectObject):
+        reference = (obj.idnum, obj.generation)
+        if reference in visited:
+            return str(obj)
+        visited.add(reference)
+        obj = obj.getObject()
+
+    if isinstance(obj, dict):
+        return '{%s}' % ', '.join('%s: %s' % (key, resolved_object_text(val, visited))
+                                  for key, val in dict.items(obj))
+    if isinstance(obj, list):
+        return '[%s]' % ', '.join(resolved_object_text(val, visited) for val in obj)
+    return str(obj)
+
+class ResourceLimitExceeded(Exception):
+    """
+    Raised when a page, or the document, goes over a RemovalLimits limit
+    """
+
+    def __init__(self, limit: str):
+        super().__init__(limit)
+        self.limit = limit
+
+def current_rss() -> int:
+    """
+    Resident set size of the process now, in bytes (the peak where unknown)
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+# Ways out for the pages that go over a limit
+LIMIT_DEGRADATIONS = ('fitz', 'passthrough')
+
+class RemovalLimits:
+    """
+    Resource limits of remove_watermarks on a single PDF.
+
+    Pages over a limit are not processed by PyPDF: they are cleaned by the
+    PyMuPDF artifact-only path ('fitz'), or copied unchanged ('passthrough').
+    Pages over max_page_stream_bytes are always copied unchanged, since
+    PyMuPDF would decode their content streams as well.
+    max_pages and max_page_stream_bytes are checked on each page before it is
+    read; max_seconds and max_memory are checked between pages and while a
+    content stream is being parsed, and once one is exceeded every page left
+    goes the degraded way. With workers, each worker process checks them as
+    well, the memory limit on its own growth.
+
+    Args:
+        max_pages: Pages after the first max_pages are degraded
+        max_page_stream_bytes: Pages whose decoded content streams are larger are degraded
+        max_seconds: Wall-clock seconds since remove_watermarks started
+        max_memory: Growth of the process resident set, in bytes, since remove_watermarks started
+        degrade: 'fitz' or 'passthrough'
+    """
+    __slots__ = ('max_pages', 'max_page_stream_bytes', 'max_seconds', 'max_memory', 'degrade')
+
+    def __init__(
+        self,
+        max_pages: Optional[int] = None,
+        max_page_stream_bytes: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        max_memory: Optional[int] = None,
+        degrade: str = 'fitz'):
+
+        if degrade not in LIMIT_DEGRADATIONS:
+            raise ValueError("degrade must be one of {}".format(", ".join(LIMIT_DEGRADATIONS)))
+        self.max_pages = max_pages
+        self.max_page_stream_bytes = max_page_stream_bytes
+        self.max_seconds = max_seconds
+        self.max_memory = max_memory
+        self.degrade = degrade
+
+    def start(self) -> 'RemovalBudget':
+        return RemovalBudget(self)
+
+class RemovalBudget:
+    """
+    RemovalLimits of a run of remove_watermarks, and the pages that went over them
+    """
+
+    def __init__(self, limits: RemovalLimits):
+        self.limits = limits
+        self.deadline = None if limits.max_seconds is None else time.monotonic() + limits.max_seconds
+        self.max_rss = None if limits.max_memory is None else current_rss() + limits.max_memory
+        self.exceeded = None
+        # Page number: name of the limit it went over
+        self.limited = {}
+
+    def check(self):
+        """
+        Raise ResourceLimitExceeded when the time or memory limit is exceeded
+        (always, once it was)
+        """
+        if self.exceeded is None:
+            if self.deadline is not None and time.monotonic() > self.deadline:
+                self.exceeded = 'max_seconds'
+            elif self.max_rss is not None and current_rss() > self.max_rss:
+                self.exceeded = 'max_memory'
+        if self.exceeded is not None:
+            raise ResourceLimitExceeded(self.exceeded)
+
+    def limit(self, page: int, limit: str):
+        self.limited.setdefault(page, limit)
+
+    def limit_pages(self, source: PdfFileReader):
+        """
+        Set aside the pages over max_pages or max_page_stream_bytes,
+        before anything else reads them
+        """
+        max_pages = self.limits.max_pages
+        max_bytes = self.limits.max_page_stream_bytes
+        for page in range(source.getNumPages()):
+            if max_pages is not None and page >= max_pages:
+                self.limit(page, 'max_pages')
+            elif max_bytes is not None:
+                try:
+                    if page_content_size(source.getPage(page), max_bytes) > max_bytes:
+                        self.limit(page, 'max_page_stream_bytes')
+                except PyPdfError:
+                    # Left to the page passes, which fall back on PyMuPDF
+                    pass
+
+def page_content_size(
+    page: PageObject,
+    limit: int) -> int:
+    """
+    Decoded size of the content streams of a page, counted up to 'limit' + 1 bytes:
+    FlateDecode streams are inflated only that far, so a compression bomb
+    never takes more than 'limit' bytes of memory.
+    """
+
+    if page.get("/Contents") is None:
+        return 0
+
+    streams = page["/Contents"].getObject()
+    if not isinstance(streams, list):
+        streams = [streams]
+
+    size = 0
+    for stream in streams:
+        stream = stream.getObject()
+        filters = stream.get("/Filter")
+        if isinstance(filters, list) and len(filters) == 1:
+            filters = filters[0]
+
+        if isinstance(stream, ContentStream) or filters not in ("/FlateDecode", "/Fl"):
+            size += len(stream.getData())
+        else:
+            try:
+                size += len(zlib.decompressobj().decompress(stream._data, limit - size + 1))
+            except zlib.error:
+                # Not ours to report, PyPDF fails on it when the page is read
+                pass
+        if size > limit:
+            break
+    return size
+
+class CompactContentStream(ContentStream):
+    """
+    Parsed content stream of a page, held in typed arrays instead of
+    lists of PyPDF objects.
+
+    The decoded bytes are kept as they are, and ContentStreamLexer indexes
+    each operation: the offset where it starts ('starts'), the code of its
+    operator ('codes', see 'operator_table'), and where its name and numeric
+    operands start in 'names' (interned, see 'name_table') and 'numbers'.
+    Strings, arrays and dictionaries stay in the bytes; the operands of an
+    operation are parsed into PyPDF objects only when they are read (see operands).
+
+    The removal passes edit the operations through 'keep', the mask of the
+    operations left, and 'replaced', the bytes written instead of some of them;
+    the content stream is only written again by getData, copying the bytes
+    of the operations left as they are.
+
+    Args:
+        stream: Content stream, or array of content streams, of a page
+        pdf: PyPDF  file reader
+        budget: If given, the indexing stops with ResourceLimitExceeded once it is exceeded
+    """
+
+    def __init__(self, stream, pdf, budget: Optional[RemovalBudget] = None):
+        self.pdf = pdf
+        stream = stream.getObject()
+        if isinstance(stream, list):
+            data = b"".join(b_(s.getObject().getData()) for s in stream)
+        else:
+            data = b_(stream.getData())
+        self._index(data, budget)
+
+    def _index(
+        self,
+        data: bytes,
+        budget: Optional[RemovalBudget] = None):
+        self.raw_data = data
+        self.starts = starts = array('L')
+        self.codes = codes = array('I')
+        self.name_starts = name_starts = array('L', [0])
+        self.names = names = array('L')
+        self.number_starts = number_starts = array('L', [0])
+        self.numbers = numbers = array('d')
+        self.operator_table = []
+        self.name_table = []
+        # Operations whose first operand names an image, as in find_watermark_stack_block
+        self.images = set()
+        operator_codes = {}
+        name_codes = {}
+
+        position = 0
+        for raw, operands, operator in ContentStreamLexer((data,), budget).operations():
+            index = len(codes)
+            starts.append(position)
+            position += len(raw)
+
+            code = operator_codes.get(operator)
+            if code is None:
+                code = operator_codes[operator] = len(self.operator_table)
+                self.operator_table.append(operator)
+            codes.append(code)
+
+            for op in operands:
+                first = op[0]
+                if first == 0x2f: # '/'
+                    code = name_codes.get(op)
+                    if code is None:
+                        code = name_codes[op] = len(self.name_table)
+                        self.name_table.append(bytes(op))
+                    names.append(code)
+                elif first in _NUMBER_START:
+                    try:
+                        numbers.append(float(op))
+                    except ValueError:
+                        pass
+            if operands and operands[0][:1] == b'/' and b'/im' in operands[0].lower():
+                self.images.add(index)
+            name_starts.append(len(names))
+            number_starts.append(len(numbers))
+
+        starts.append(position)
+        self.keep = bytearray(b'\x01') * len(codes)
+        self.replaced = {}
+
+    def operator_codes(
+        self,
+        operators) -> frozenset:
+        """
+        Codes of the 'operators' found in the content stream
+        """
+        return frozenset(code for code, operator in enumerate(self.operator_table) if operator in operators)
+
+    def operation_names(
+        self,
+        index: int) -> List[bytes]:
+        """
+        Names among the operands of an operation
+        """
+        table = self.name_table
+        return [table[code] for code in self.names[self.name_starts[index]:self.name_starts[index + 1]]]
+
+    def raw(
+        self,
+        index: int) -> bytes:
+        """
+        Bytes of an operation, with the white-space before it
+        """
+        if index in self.replaced:
+            return self.replaced[index]
+        return self.raw_data[self.starts[index]:self.starts[index + 1]]
+
+    def operands(
+        self,
+        index: int) -> List:
+        """
+        Operands of an operation, parsed into PyPDF objects
+        (an empty list for an inline image)
+        """
+        operator = self.operator_table[self.codes[index]]
+        if operator == OP_INLINE_IMAGE:
+            return []
+        raw = self.raw(index)
+        # The trailing white-space ends numbers and names read by PyPDF
+        stream = BytesIO(raw[:len(raw) - len(operator)] + b' ')
+        operands = []
+        while True:
+            first = readNonWhitespace(stream)
+            if not first:
+                return operands
+            if first == b'%':
+                stream.readline()
+                continue
+            stream.seek(-1, 1)
+            operands.append(readObject(stream, self.pdf))
+
+    @property
+    def operations(self) -> List:
+        """
+        (operands, operator) of the operations left, as PyPDF ContentStream
+        has them; every operand is parsed, so the passes don't read them this way
+        """
+        table = self.operator_table
+        return [(self.operands(index), table[code])
+                for index, code in enumerate(self.codes) if self.keep[index]]
+
+    @property
+    def changed(self) -> bool:
+        """
+        Whether any operation was removed or replaced
+        """
+        return bool(self.replaced) or 0 in self.keep
+
+    def _getData(self) -> bytes:
+        if not self.changed:
+            return self.raw_data
+
+        # Runs of operations left, split at the replaced ones
+        data, starts, keep = self.raw_data, self.starts, self.keep
+        replaced = sorted(index for index in self.replaced if keep[index])
+        chunks = []
+        end = 0
+        while True:
+            start = keep.find(1, end)
+            if start < 0:
+                break
+            end = keep.find(0, start)
+            if end < 0:
+                end = len(keep)
+            for index in replaced[bisect_left(replaced, start):bisect_left(replaced, end)]:
+                chunks.append(data[starts[start]:starts[index]])
+                chunks.append(self.replaced[index])
+                start = index + 1
+            chunks.append(data[starts[start]:starts[end]])
+        return b''.join(chunks)
+
+    def _setData(self, value: bytes):
+        self._index(b_(value))
+
+    _data = property(_getData, _setData)
+
+def get_page_content_stream(
+    page: PageObject,
+    source: PdfFileReader,
+    budget: Optional[RemovalBudget] = None) -> Optional[CompactContentStream]:
+    """
+    Return the parsed content stream of a page.
+
+    The stream is parsed only once: the resulting CompactContentStream replaces
+    the page '/Contents', so every detection and removal pass that runs
+    over the same page reads and edits the same operations.
+
+    Args:
+        page: PyPDF page object
+        source: PyPDF  file reader
+        budget: If given, the parsing stops with ResourceLimitExceeded once it is exceeded
+    """
+
+    if page.get("/Contents") is None:
+        return None
+
+    content = page["/Contents"].getObject()
+    if isinstance(content, CompactContentStream):
+        return content
 
+    original = page.raw_get('/Contents')
+    content = CompactContentStream(content, source, budget)
+    content.original = original
+    page.__setitem__(NameObject('/Contents'), content)
+    return content
+
+def serialize_page_content_stream(
+    page: PageObject) -> PageObject:
+    """
+    Write the parsed content stream of a page back into bytes,
+    right before the page is written.
+
+    Pages whose operations were not changed get their original
+    content stream back, as it was in the input.
+
+    Args:
+        page: PyPDF page object
+    """
+
+    if page.get("/Contents") is None:
+        return page
+
+    content = page["/Contents"].getObject()
+    if not isinstance(content, CompactContentStream):
+        return page
+
+    if not content.changed:
+        page.__setitem__(NameObject('/Contents'), content.original)
+        return page
+
+    stream = DecodedStreamObject()
+    stream.setData(content.getData())
+    page.__setitem__(NameObject('/Contents'), stream)
+    return page
 
-def fix_recursive_IndirectObject(
-    obj: object) -> object:
+def find_figures_covering_page(
+    page: PageObject,
+    source: PdfFileReader,
+    figure_keys: List,
+    p_covered: float = 0.95,
+    streaming: bool = False,
+    budget: Optional[RemovalBudget] = None) -> List:
     """
-    Resolve all IndirectObject attribution in a recursive fashion
+    Find the figures that cover more than 'p_covered' of a page; these
+    figures are considerated as watermarks.
+
+    The 'q' 'Q' blocks drawing any of the figures are found in a single walk
+    over the page operations, and the size of each figure is taken from the
+    first current transformation matrix (CTM) of its blocks. Without
+    streaming, the walk reads the ContentStream that is kept on the page for
+    the removal, so the page is parsed only once.
+
+    Args:
+        page: PyPDF page object
+        source: PyPDF  file reader
+        figure_keys: PDF Stream Operand names addressing the figures
+        p_covered: percentage of accepted coverage of the figure over the page
+        streaming: scan the content stream bytes instead of the parsed ContentStream
+        budget: If given, the scan of the content stream bytes stops with
+                ResourceLimitExceeded once it is exceeded
+    Return:
+        The figure keys covering the page, in the order of 'figure_keys'
     """
-    if not isinstance(obj, IndirectObject):
-        return obj
 
-    obj = obj.getObject()
+    if not figure_keys:
+        return []
+
+    page_height = int(page.mediaBox.getHeight())
+    page_width = int(page.mediaBox.getWidth())
+
+    if streaming:
+        lexer = ContentStreamLexer(iter_page_content_chunks(page), budget)
+        blocks = ([read_stream_operands(operands) for _, operands, _ in block]
+                  for is_watermark, block in
+                  stream_watermark_stack_blocks(lexer.operations(), figure_keys, aggressive=1)
+                  if is_watermark)
+    else:
+        wm_operation_blocks, content = find_watermark_stack_block(page, source, figure_keys, aggressive=1)
+        blocks = (compact_block_operands(content, block) for block in wm_operation_blocks)
+
+    covering = set()
+    pending = set(figure_keys)
+    for block in blocks:
+        names = pending.intersection(op for operands in block for op in operands if isinstance(op, str))
+        if not names:
+            continue
+        for operands in block:
+            # Check the cm operator found in the watermark stack block
+            # This is riscky since we are supposing that the stram PDF operations
+            # are well organized and with only one 'cm' operand in the watermark rendering stack block
+            # The figure width and height are the size of the unit square mapped by the
+            # current transformation matrix (CTM), also when it is flipped or rotated
+            if len(operands) != 6:
+                continue
+            try:
+                a, b, c, d = (float(op) for op in operands[:4])
+            except (TypeError, ValueError):
+                continue
+            # If the minimum percentage among the position of the figure is more than
+            # 0.95, the image is a watermark
+            if min((abs(b) + abs(d)) / page_height, (abs(a) + abs(c)) / page_width) > p_covered:
+                covering.update(names)
+            pending -= names
+            break
+        if not pending:
+            break
+
+    return [key for key in figure_keys if key in covering]
 
-    for key, val in obj.items():
-        obj[key] = fix_recursive_IndirectObject(val)
-    return obj
+def compact_block_operands(
+    content: CompactContentStream,
+    block: range) -> List[List]:
+    """
+    Operands of the operations of a block, as find_figures_covering_page reads
+    them: the names and numbers taken from the arrays of the content stream
+    """
+    numbers, number_starts = content.numbers, content.number_starts
+    return [[name.decode('utf-8', 'replace') for name in content.operation_names(index)] +
+            numbers[number_starts[index]:number_starts[index + 1]].tolist()
+            for index in block]
 
 def fig_covers_entiry_page(
     page: PageObject,
     source: PdfFileReader,
     operand: str,
-    p_covered: int = 0.95) -> bool:
+    p_covered: float = 0.95,
+    streaming: bool = False) -> bool:
     """
     Check if a figure cover more than 0.95 of a page
     if so, the image will be considerated as watermark
+    (see find_figures_covering_page)
 
     Args:
         page: PyPDF page object
         source: PyPDF  file reader
         operand: PDF Stream Operand name addressing the figure
         p_covered: percentage of accepted coverage of the figure over the page
+        streaming: scan the content stream bytes instead of the parsed ContentStream
     """
 
-    page_height = int(page.mediaBox.getHeight())
-    page_width = int(page.mediaBox.getWidth())
+    return len(find_figures_covering_page(page, source, [operand], p_covered, streaming)) > 0
 
-    wm_operation_blocks, content = find_watermark_stack_block(page, source, [operand], aggressive=1)
-    fig_width = 0
-    fig_height = 0
-    for p in wm_operation_blocks:
-         # Check the cm operator found in the watermark stack block
-         # This is riscky since we are supposing that the stram PDF operations
-         # are well organized and with only one 'cm' operand in the watermark rendering stack block
-         # Fig_width and Fig_height are the scaling factor (in x and y) presented in the
-         # current transformation matrix (CTM)
-         if len(content.operations[p][0]) == 6:
-            fig_width = content.operations[p][0][0]
-            fig_height = content.operations[p][0][3]
-            break
+def resolve_resource(
+    container: Dict,
+    key: str,
+    counters: Counter) -> Tuple[object, object]:
+    """
+    Return the (object id, object) of the entry 'key' of a resource dictionary.
 
-    # If the minimum percentage among the position of the figure is more than
-    # 0.95, the image is a watermark
-    if min((fig_height/page_height), (fig_width / page_width) > p_covered):
-        return True
-    return False
+    The object id is the (idnum, generation) of indirect objects, so resources
+    shared by many pages get the same id; each indirect resolution is counted
+    in counters['indirect_resolutions'].
+    """
 
-def get_page_resources_watermarks(
-    page: PageObject,
-    source: PdfFileReader) -> List:
+    obj = container.raw_get(key) if hasattr(container, 'raw_get') else container[key]
+    if isinstance(obj, IndirectObject):
+        counters['indirect_resolutions'] += 1
+        return (obj.idnum, obj.generation), obj.getObject()
+    return id(obj), obj
+
+# Terms that classify an XObject as a watermark, for each XObject entry checked
+XOBJECT_ENTRY_LABELS = {'/PieceInfo': ('watermark', 'background'),
+                        '/Subtype': ('form',)}
+
+def xobject_entry_has_label(
+    xobject: Dict,
+    key: str,
+    entry: str,
+    counters: Counter,
+    classifications: Optional[Dict] = None) -> bool:
     """
-    Return all operands keys from a PDF page Resource that might be
-    from a watermark, i.e. named resources /Fm0 and /X0
+    Check if the resolved 'entry' ('/PieceInfo' or '/Subtype') of the
+    XObject 'key' mentions one of its XOBJECT_ENTRY_LABELS terms.
+
+    Publishers reuse the same watermark XObject on every page, so the result
+    is memoized in 'classifications' by the (idnum, generation) of the XObject;
+    counters['classification_hits'] and counters['classification_misses']
+    track the cache usage.
     """
 
-    if page.get('/Resources') is None:
-        return []
-    if page['/Resources'].get('/XObject') is None:
-        return []
+    raw = xobject.raw_get(key) if hasattr(xobject, 'raw_get') else xobject[key]
+    cache_key = None
+    if classifications is not None and isinstance(raw, IndirectObject):
+        cache_key = (raw.idnum, raw.generation, entry)
+        if cache_key in classifications:
+            counters['classification_hits'] += 1
+            return classifications[cache_key]
+        counters['classification_misses'] += 1
+
+    info = resolve_resource(xobject, key, counters)[1].get(entry)
+    if info is None:
+        has_label = False
+    else:
+        info = resolved_object_text(info).lower()
+        has_label = any(label in info for label in XOBJECT_ENTRY_LABELS[entry])
+
+    if cache_key is not None:
+        classifications[cache_key] = has_label
+    return has_label
+
+def xobject_reference(
+    xobject: Dict,
+    key: str) -> Optional[Tuple[int, int]]:
+    """
+    Return the (idnum, generation) of the XObject 'key', None if it is a direct object
+    """
 
-    xobject = page['/Resources']['/XObject'].getObject()
+    raw = xobject.raw_get(key) if hasattr(xobject, 'raw_get') else xobject[key]
+    if isinstance(raw, IndirectObject):
+        return raw.idnum, raw.generation
+    return None
+
+def classify_xobject_resources(
+    xobject: Dict,
+    counters: Counter,
+    classifications: Optional[Dict] = None) -> Tuple[List, List]:
+    """
+    Split the keys of a /XObject resource dictionary into the keys that
+    are watermarks by themselves, and the /X keys that are watermarks
+    if they cover the entire page (see find_figures_covering_page).
+
+    Args:
+        xobject: /XObject resource dictionary
+        counters: Counter of resolutions and cache hits
+        classifications: Per document cache of xobject_entry_has_label
+    """
 
     wm_keys = []
+    figure_keys = []
     for key in xobject.keys():
         #Usally the softwares like Adobe insert the watermark as a
         # named resource name as Fm, na dwith a information claiming
         # that this resource is a watermark
         if '/fm' in key.lower():
-            info =  xobject[key].get('/PieceInfo')
-            if info is None:
-                continue
-            info = fix_recursive_IndirectObject(info)
             # If watermark found, include it to watermark_keys
-            if ('watermark' in str(info).lower()) or \
-                'background' in str(info).lower():
+            if xobject_entry_has_label(xobject, key, '/PieceInfo', counters, classifications):
                 wm_keys.append(key)
 
         # Some Academic mistakely add the watermark to the PDF
         # As a form, without adding the informatio of watermark
         elif '/x' in key.lower():
-            info = xobject[key].get('/Subtype')
-            info = fix_recursive_IndirectObject(info)
-            if 'form' in str(info).lower():
-                wm_keys.append(key)
-            if fig_covers_entiry_page(page, source, key):
+            if xobject_entry_has_label(xobject, key, '/Subtype', counters, classifications):
                 wm_keys.append(key)
+            figure_keys.append(key)
+
+    return wm_keys, figure_keys
+
+def get_page_resources_watermarks(
+    page: PageObject,
+    source: PdfFileReader,
+    streaming: bool = False) -> List:
+    """
+    Return all operands keys from a PDF page Resource that might be
+    from a watermark, i.e. named resources /Fm0 and /X0
+    """
+
+    if page.get('/Resources') is None:
+        return []
+    if page['/Resources'].get('/XObject') is None:
+        return []
+
+    xobject = page['/Resources']['/XObject'].getObject()
+
+    wm_keys, figure_keys = classify_xobject_resources(xobject, Counter())
+    figure_keys = [key for key in figure_keys if key not in wm_keys]
+    wm_keys += find_figures_covering_page(page, source, figure_keys, streaming=streaming)
 
     return  wm_keys
 
@@ -180,134 +866,511 @@ def get_GS_watermark_from_pdf(
 
     return watermarks
 
+# Coordinates and other numbers of the fingerprinted blocks are quantized to this step
+BLOCK_FINGERPRINT_QUANTUM = 0.01
+
+# Tokens of a block: strings, dictionary and array delimiters, names, numbers and operators
+_FINGERPRINT_TOKEN = re.compile(
+    rb'\((?:[^()\\]|\\.)*\)|<<|>>|<[^<>]*>|[\[\]{}]|/?[^\x00\t\n\x0c\r ()<>\[\]{}/%]+', re.DOTALL)
+_FINGERPRINT_COMMENT = re.compile(rb'%[^\r\n]*')
+# Operators of a normalized block: the words that are not names nor numbers
+_FINGERPRINT_OPERATOR = re.compile(rb'(?:^| )[A-Za-z\'"]')
+_NUMBER_START = frozenset(b'+-.0123456789')
+
+@lru_cache(maxsize=1 << 16)
+def _fingerprint_token(
+    token: bytes) -> bytes:
+    """
+    Normalized token: quantized numbers, strings without their content
+    (PyPDF writes them back differently), other tokens as they are
+    """
+    if token[0] in _NUMBER_START:
+        try:
+            return b'%d' % round(float(token) / BLOCK_FINGERPRINT_QUANTUM)
+        except ValueError:
+            return token
+    if token[0] == 0x28 or (token[0] == 0x3c and token != b'<<'): # '(' or '<'
+        return b'()'
+    return token
+
+# 'q' and 'Q' operators, and operations that keep a block from being fingerprinted:
+# images (named /Im, as in find_watermark_stack_block), texts and inline images
+_BLOCK_DELIMITER = re.compile(rb'[qQ](?<![^\x00\t\n\x0c\r \])>][qQ])(?![^\x00\t\n\x0c\r %(/<\[])')
+_UNFINGERPRINTED_BLOCK = re.compile(
+    rb'/[iI][mM]|B[TI](?<![^\x00\t\n\x0c\r \])>]B[TI])(?![^\x00\t\n\x0c\r %(/<\[])')
+
+def block_fingerprint(
+    data: bytes) -> int:
+    """
+    Fingerprint of the bytes of a 'q' 'Q' block: a hash of its normalized
+    tokens (see _fingerprint_token), so the same drawing gets the same
+    fingerprint however it is spaced or its numbers are written.
+    The number of operations of the block is in the bits above the 64 bits
+    of the hash (see fingerprint_operations).
+    """
+    if b'%' in data:
+        data = _FINGERPRINT_COMMENT.sub(b'', data)
+    tokens = b' '.join(map(_fingerprint_token, _FINGERPRINT_TOKEN.findall(data)))
+    digest = hashlib.blake2b(tokens, digest_size=8).digest()
+    return len(_FINGERPRINT_OPERATOR.findall(tokens)) << 64 | int.from_bytes(digest, 'big')
+
+def fingerprint_operations(
+    fingerprints: frozenset) -> frozenset:
+    """
+    Numbers of operations of the blocks of 'fingerprints': blocks of other
+    lengths are not fingerprinted by the removal passes
+    """
+    return frozenset(fingerprint >> 64 for fingerprint in fingerprints)
+
+def iter_page_blocks(
+    data: bytes):
+    """
+    Yield the candidate 'q' 'Q' blocks of the decoded content stream 'data'
+    of a page: the innermost blocks, as in find_watermark_stack_block.
+    They are found in the bytes, without tokenizing the page.
+    """
+    start = None
+    for match in _BLOCK_DELIMITER.finditer(data):
+        if match.group() == b'q':
+            start = match.start()
+        elif start is not None:
+            yield data[start:match.end()]
+            start = None
+
+class BlockFingerprintIndex:
+    """
+    Document-wide count of the pages that draw each 'q' 'Q' block.
+
+    Blocks drawn on most pages (more than 'min_ratio' of them, and at least
+    two) are watermark candidates, even without any named resource.
+    The pages are scanned cheaply: the blocks are counted by the hash of
+    their bytes, and only those that reach enough pages get the fingerprint
+    of their normalized, quantized tokens (see block_fingerprint) that the
+    removal passes look up. Blocks with images, texts or inline images are
+    never candidates.
+
+    The memory is bounded: beyond 'max_entries' counted blocks, the ones
+    that can no longer reach enough pages are dropped and then, if needed,
+    the ones drawn on the fewest pages, down to half of 'max_entries'.
+
+    Args:
+        num_pages: Number of pages of the document
+        min_ratio: Fraction of the pages a block must be drawn on
+        max_entries: Number of blocks counted at most
+    """
+
+    def __init__(
+        self,
+        num_pages: int,
+        min_ratio: float = 0.5,
+        max_entries: int = 1 << 16):
+        self.min_pages = max(2, int(num_pages * min_ratio) + 1)
+        self.pages_left = num_pages
+        self.max_entries = max_entries
+        self.counts = {}
+        self.fingerprints = {}
+
+    def add_page(
+        self,
+        data: bytes):
+        """
+        Count the distinct blocks of the decoded content stream 'data' of a page
+        """
+        counts = self.counts
+        page_keys = set()
+        for block in iter_page_blocks(data):
+            # Blocks are counted by their white-space separated tokens
+            key = hash(b' '.join(block.split()))
+            if key in page_keys:
+                continue
+            page_keys.add(key)
+            count = counts.get(key, 0) + 1
+            counts[key] = count
+            if count == self.min_pages:
+                self.fingerprints[key] = (None if _UNFINGERPRINTED_BLOCK.search(block)
+                                          else block_fingerprint(block))
+        self.pages_left -= 1
+        if len(counts) > self.max_entries:
+            self.prune()
+
+    def prune(self):
+        needed = self.min_pages - self.pages_left
+        counts = {key: count for key, count in self.counts.items() if count >= needed}
+        if len(counts) > self.max_entries // 2:
+            counts = dict(sorted(counts.items(), key=lambda item: -item[1])[:self.max_entries // 2])
+        self.counts = counts
+
+    def repeated(self) -> frozenset:
+        """
+        Fingerprints of the blocks drawn on most pages
+        """
+        return frozenset(fingerprint for fingerprint in self.fingerprints.values()
+                         if fingerprint is not None)
+
 def get_operands_watermarks_list(
     source: PdfFileReader,
-    aggressive: int):
+    aggressive: int,
+    streaming: bool = False,
+    counters: Optional[Counter] = None,
+    failed_pages: Optional[set] = None,
+    budget: Optional[RemovalBudget] = None,
+    blocks: Optional[BlockFingerprintIndex] = None):
     """
     According to the user aggresive will, returns the stream operands names
     that might be considerated as watermarks.
 
+    The document is scanned in a single walk over its pages, gathering the
+    ExtGState names (as get_GS_watermark_from_pdf), the XObject candidates
+    (as get_page_resources_watermarks) and the figure coverage of each page.
+    Resource dictionaries are classified once per object id, so the ones shared
+    by many pages are resolved only once. The coverage of all the figures of a
+    page is checked in one walk over its operations, and a figure found
+    covering a page is a watermark on every page, by its (idnum, generation).
+
+    Args:
+        source: PyPDF  file reader
+        aggressive: Integer in [1,3]
+        streaming: scan the content streams bytes instead of parsing them
+        counters: Counter updated with the number of 'page_tree_walks',
+                  'indirect_resolutions', 'resource_cache_hits',
+                  XObject 'classification_hits' / 'classification_misses',
+                  'figure_page_scans' and 'figure_coverage_hits'
+        failed_pages: If given, pages that PyPDF fails to read are added to it
+                      and skipped, instead of raising the PyPdfError
+        budget: If given, its limited pages are skipped, and the pages read
+                once its time or memory limit is exceeded are added to them
+        blocks: If given, the 'q' 'Q' blocks of each page are counted in it at
+                level 2, instead of the ExtGState names: names like /GS0 are
+                shared by most pages, watermark drawings are repeated on them
+    """
+
+    counters = Counter() if counters is None else counters
+    counters['page_tree_walks'] += 1
+
+    extGstates = Counter()
+    extGstates_keys = {}
+    xobject_keys = {}
+    classifications = {}
+    covering_figures = set()
+    watermarks = set()
+
+    for page_number in range(source.getNumPages()):
+        if budget is not None and page_number in budget.limited:
+            continue
+        try:
+            if budget is not None:
+                budget.check()
+            page = source.getPage(page_number)
+            if blocks is not None and aggressive == 2:
+                blocks.add_page(b''.join(iter_page_content_chunks(page)))
+            if page.get('/Resources') is None:
+                continue
+            _, resources = resolve_resource(page, '/Resources', counters)
+
+            # Check the GS operators
+            # Our heuristic is that if the GS appears in more then
+            # one page, then it should be considerated as a watermark
+            if aggressive > 1 and (blocks is None or aggressive > 2) and resources.get('/ExtGState'):
+                gs_id, extGstate = resolve_resource(resources, '/ExtGState', counters)
+                if gs_id in extGstates_keys:
+                    counters['resource_cache_hits'] += 1
+                else:
+                    extGstates_keys[gs_id] = list(extGstate.keys())
+                extGstates.update(extGstates_keys[gs_id])
+
+            if resources.get('/XObject') is None:
+                continue
+            xobject_id, xobject = resolve_resource(resources, '/XObject', counters)
+            if xobject_id in xobject_keys:
+                counters['resource_cache_hits'] += 1
+            else:
+                wm_keys, figure_keys = classify_xobject_resources(xobject, counters, classifications)
+                xobject_keys[xobject_id] = wm_keys, {key: xobject_reference(xobject, key) for key in figure_keys}
+            wm_keys, figure_keys = xobject_keys[xobject_id]
+
+            watermarks.update(wm_keys)
+            pending_keys = []
+            for key, reference in figure_keys.items():
+                # Names already taken as watermarks don't need another check
+                if key in watermarks:
+                    continue
+                # Neither do the figures found covering another page
+                if reference in covering_figures:
+                    counters['figure_coverage_hits'] += 1
+                    watermarks.add(key)
+                    continue
+                pending_keys.append(key)
+
+            if pending_keys:
+                counters['figure_page_scans'] += 1
+                if budget is not None and not streaming:
+                    # The figure checks parse the page, within the budget
+                    get_page_content_stream(page, source, budget)
+                for key in find_figures_covering_page(page, source, pending_keys, streaming=streaming,
+                                                      budget=budget):
+                    watermarks.add(key)
+                    if figure_keys[key] is not None:
+                        covering_figures.add(figure_keys[key])
+        except ResourceLimitExceeded as error:
+            budget.limit(page_number, error.limit)
+        except PyPdfError:
+            if failed_pages is None:
+                raise
+            failed_pages.add(page_number)
+
+    for key, occ in extGstates.items():
+        if occ > 1:
+            watermarks.add(key)
+
+    watermarks = list(watermarks)
+    return watermarks
+
+# Marked content of watermarks: /Artifact <</Subtype /Watermark ...>> BDC
+ARTIFACT_WATERMARK_MARKER = re.compile(rb'/Artifact\s*<<(?:(?!>>).)*?/(?:Watermark|Background)', re.DOTALL)
+
+def _retracted_text_pattern():
+    """
+    Pattern of the 'retracted' term as it may be written in a content stream:
+    in literal strings, also spaced out, kerned in a TJ array or split across
+    text operations, or in a hex string of single or two-byte characters
+    """
+    between = rb'(?:[\s()\[\]\d.\-]|T[jJdD*])*'
+    variants = [between.join(re.escape(bytes([letter])) for letter in b'retracted')]
+    for word in ('RETRACTED', 'Retracted', 'retracted'):
+        for encoded in (word.encode('latin-1'), word.encode('utf-16-be')):
+            variants.append(re.escape(encoded.hex().encode()))
+    return re.compile(b'|'.join(variants), re.IGNORECASE)
+
+RETRACTED_TEXT = _retracted_text_pattern()
+
+def find_watermark_candidates(
+    source: PdfFileReader,
+    aggressive: int = 2) -> Dict[str, Optional[bool]]:
+    """
+    Fast triage of a PDF: check if the document has anything that the
+    removal at the 'aggressive' level could take as a watermark, without
+    parsing the content streams into operations.
+
+    The resource dictionaries tell about /Fm watermarks, /X XObjects and,
+    at level 3, repeated ExtGStates (level 2 looks for repeated blocks
+    instead, as get_operands_watermarks_list does). Only when they show no candidate, the decoded
+    content streams are searched for /Artifact watermark markers and,
+    from level 2, for the 'retracted' term and for 'q' 'Q' blocks drawn on
+    most pages (see BlockFingerprintIndex); otherwise these flags are None.
+    Texts written with the codes of a font /ToUnicode CMap that remaps
+    letters are not seen by this search.
+    At level 3 every page with graphical operations is changed, so the
+    document is always a candidate.
+
     Args:
         source: PyPDF  file reader
         aggressive: Integer in [1,3]
+    Return:
+        Dict of flags: 'fm_watermark', 'x_xobject', 'repeated_extgstate',
+        'artifact_watermark', 'retracted_text', 'repeated_block' and
+        'candidates' (any of them)
     """
 
-    # Check the GS operators
-    # Our heuristic is that if the GS appears in more then
-    # one page, then it should be considerated as a watermark
-    watermarks = get_GS_watermark_from_pdf(source) if aggressive> 1 else []
+    counters = Counter()
+    extGstates = Counter()
+    classifications = {}
+    flags = {'fm_watermark': False, 'x_xobject': False, 'repeated_extgstate': False,
+             'artifact_watermark': None, 'retracted_text': None, 'repeated_block': None}
+
     for page in range(source.getNumPages()):
         page = source.getPage(page)
-        watermarks += get_page_resources_watermarks(page, source)
+        if page.get('/Resources') is None:
+            continue
+        _, resources = resolve_resource(page, '/Resources', counters)
 
-    watermarks = list(set(watermarks))
-    return watermarks
+        if aggressive > 2 and resources.get('/ExtGState'):
+            extGstates.update(resolve_resource(resources, '/ExtGState', counters)[1].keys())
+
+        if resources.get('/XObject') is None:
+            continue
+        xobject = resolve_resource(resources, '/XObject', counters)[1]
+        wm_keys, figure_keys = classify_xobject_resources(xobject, counters, classifications)
+        # Any /X XObject may be a watermark figure covering the entire page
+        flags['x_xobject'] |= len(figure_keys) > 0
+        flags['fm_watermark'] |= any('/fm' in key.lower() for key in wm_keys)
+
+    flags['repeated_extgstate'] = any(occ > 1 for occ in extGstates.values())
+
+    if not any(flags.values()):
+        flags['artifact_watermark'] = False
+        flags['retracted_text'] = False if aggressive > 1 else None
+        blocks = BlockFingerprintIndex(source.getNumPages())
+        for page in range(source.getNumPages()):
+            data = b''.join(iter_page_content_chunks(source.getPage(page)))
+            if ARTIFACT_WATERMARK_MARKER.search(data):
+                flags['artifact_watermark'] = True
+                break
+            if aggressive > 1 and RETRACTED_TEXT.search(data):
+                flags['retracted_text'] = True
+                break
+            if aggressive == 2:
+                blocks.add_page(data)
+        else:
+            if aggressive == 2:
+                flags['repeated_block'] = len(blocks.repeated()) > 0
+
+    flags['candidates'] = aggressive > 2 or any(flags.values())
+    return flags
+
+def check_watermarks(
+    inputFile,
+    aggressive: int = 2) -> Dict[str, Optional[bool]]:
+    """
+    Triage the PDF 'inputFile', a path, buffer or binary stream (see find_watermark_candidates)
+    """
+
+    with open_pdf_input(load_pdf_input(inputFile)) as f:
+        return find_watermark_candidates(PdfFileReader(f, "rb"), aggressive)
+
+def copy_clean_pdf(
+    inputFile: PDFInput,
+    outputFile,
+    link: bool = False):
+    """
+    Output a PDF without watermarks as it is: copied byte for byte,
+    or hard-linked when 'link' is set and the file system allows it.
+    Buffers and writable streams are copied too.
+    """
+
+    if not isinstance(inputFile, str) or not isinstance(outputFile, (str, os.PathLike)):
+        with open_pdf_output(outputFile) as output:
+            if isinstance(inputFile, str):
+                with open(inputFile, "rb") as f:
+                    shutil.copyfileobj(f, output)
+            else:
+                output.write(inputFile)
+        return
+
+    if os.path.exists(outputFile):
+        if os.path.samefile(inputFile, outputFile):
+            return
+        os.remove(outputFile)
+    if link:
+        try:
+            os.link(inputFile, outputFile)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(inputFile, outputFile)
 
 def check_blockqQ_has_watermark(
-    block: ContentStream ,
-    watermarks: List)-> bool:
+    content: CompactContentStream,
+    block: range,
+    watermarks: frozenset)-> bool:
     """
     Check if the rendering watermark instruction
     is present in the Stream block.
     We are assuming that the blocks are within 'q' 'Q' structure instruction stack
-    """
-
-    for (operands, _) in block:
 
-        # operands is a list of operand
-        for op in operands:
-            if not isinstance(op, str):
-                continue
-            if op in watermarks:
-                return True
+    Args:
+        content: Parsed content stream of the page
+        block: Range of the operations of the block
+        watermarks: Codes, in content.name_table, of the watermark operand names
+    """
 
-    return False
+    names = content.names
+    return any(code in watermarks for code in
+               names[content.name_starts[block.start]:content.name_starts[block.stop]])
 
 def find_watermark_stack_block(
     page: PageObject,
     source: PdfFileReader,
     watermarks: List,
-    aggressive: int) -> Tuple[List, ContentStream]:
+    aggressive: int,
+    repeated_blocks: frozenset = frozenset()) -> Tuple[List[range], CompactContentStream]:
     """
     Find the all blocks of instructions stacks within the 'q' 'Q'
     that the Watermark instruction is involved
 
+    The blocks are returned as ranges of operation indices, in stream order.
+
     Args:
         page: PyPDF page object
         source: PyPDF  file reader
         watermarks: List of watermark operand names inside the PDF
         aggressive: Integer in [1,3]
+        repeated_blocks: Fingerprints of the blocks drawn on most pages
+                         (see BlockFingerprintIndex), also taken as watermarks
     """
 
+    # Retrive contents stream
+    content = get_page_content_stream(page, source)
+
     # Check if page has contents
-    if page.get("/Contents") is None:
+    if content is None:
         return [], None
 
     # q Q stack blocks with watermarks
     wm_blocksqQ = []
+    watermarks = frozenset(b_(wm) for wm in watermarks)
+    watermarks = frozenset(code for code, name in enumerate(content.name_table) if name in watermarks)
+    repeated_lengths = fingerprint_operations(repeated_blocks)
+    q_codes = content.operator_codes((OP_q,))
+    Q_codes = content.operator_codes((OP_Q,))
+    images = content.images
 
     Found = False
-    index_op = 0
-    # Get content objects id
-    content_object = page["/Contents"].getObject()
-    # Retrive contents stream
-    content = ContentStream(content_object, source)
 
     # For each operand check if it a q, if yes start a new
-    # block, inserting the indeces and the operations involved
-    # in lists.
-    # If for any reason an operand of a Image (Im) or a text (BT)
-    # is found, we will ignore that block, even if it contains a watermark;
+    # block, recording the index of the operation where it starts;
+    # the block is closed as a range of indices at its Q.
+    # If for any reason an operand of a Image (Im) is found,
+    # we will ignore that block, even if it contains a watermark;
     # otherwise we would erase valid information from the PDF.
 
     # If the Aggressive is more than 2, we don't check if the stack of intructions operands
-    # have a watermark's operand or not, we include everthing that either isn't a text
-    # nor a image as a watermark block of instruction.
-    for operands, operator in content.operations:
+    # have a watermark's operand or not, we include everthing that isn't
+    # a image as a watermark block of instruction.
+    for index_op, code in enumerate(content.codes):
 
-        if Found:
-            new_block_indeces.append(index_op)
-            new_block_ops.append((operands, operator))
-
-        if operator == b_('q'):
+        # The current block starts at the index of its 'q'
+        if code in q_codes:
             Found = True
-            new_block_indeces = [index_op]
-            new_block_ops = [(operands, operator)]
-
-        if type(operands) is list:
-            if len(operands)>0:
-                if isinstance(operands[0], NameObject):
-                    name = str(operands[0]).lower()
-                    if '/im' in name:
-                        Found = False
-                        new_block_indeces = []
-                        new_block_ops = []
-
-        if operands == b_('BT'):
+            block_start = index_op
+
+        if index_op in images:
             Found = False
-            new_block_indeces = []
-            new_block_ops = []
 
-        if operator == b_('Q') and Found:
+        if code in Q_codes and Found:
             Found = False
+            block = range(block_start, index_op + 1)
             # If aggressive is more than 3, include even blocks that
             # don't have explicit a watermark operand to be erased
             if aggressive <=2:
-                if check_blockqQ_has_watermark(new_block_ops, watermarks):
-                    wm_blocksqQ += new_block_indeces
+                if check_blockqQ_has_watermark(content, block, watermarks):
+                    wm_blocksqQ.append(block)
+                elif len(block) in repeated_lengths and \
+                    compact_block_fingerprint(content, block) in repeated_blocks:
+                    wm_blocksqQ.append(block)
             else:
-                wm_blocksqQ += new_block_indeces
-
-        index_op += 1
+                wm_blocksqQ.append(block)
 
     return wm_blocksqQ, content
 
+def compact_block_fingerprint(
+    content: CompactContentStream,
+    block: range) -> Optional[int]:
+    """
+    block_fingerprint of a block of a parsed content stream;
+    None for blocks with texts or inline images, which are never fingerprinted
+    """
+    unfingerprinted = content.operator_codes((OP_BT, OP_INLINE_IMAGE))
+    if any(code in unfingerprinted for code in content.codes[block.start:block.stop]):
+        return None
+    return block_fingerprint(content.raw_data[content.starts[block.start]:content.starts[block.stop]])
+
 
 def remove_watermark_from_page(
     page: PageObject,
     source: PdfFileReader,
     watermarks: List,
-    aggressive: int) -> Tuple[PageObject, ContentStream]:
+    aggressive: int,
+    repeated_blocks: frozenset = frozenset()) -> Tuple[PageObject, CompactContentStream]:
     """
     Considering the list 'watermark' of operand names consideraded as
     Watermark Resources, find all stack of rendering instruction that it participates
@@ -318,38 +1381,47 @@ def remove_watermark_from_page(
         source: PyPDF  file reader
         watermarks: List of watermark operand names inside the PDF
         aggressive: Integer in [1,3]
+        repeated_blocks: Fingerprints of the blocks drawn on most pages
     """
 
-    wm_operation_blocks, content = find_watermark_stack_block(page, source, watermarks, aggressive)
-
-    non_wm_blocks = []
-    if not content is None:
-        for ops_index, ops in enumerate(content.operations):
-            if ops_index in wm_operation_blocks:
-                continue
-            non_wm_blocks.append((ops))
+    wm_operation_blocks, content = find_watermark_stack_block(page, source, watermarks, aggressive,
+                                                              repeated_blocks)
 
-        # Update Page content with non watermark blocks
-        content.operations = non_wm_blocks
-        page.__setitem__(NameObject('/Contents'), content)
+    # Mask the operations of the watermark blocks out
+    for block in wm_operation_blocks:
+        content.keep[block.start:block.stop] = bytes(len(block))
 
+    page = remove_watermark_resources_from_page(page, watermarks)
 
+    return page, content
 
-    if  page.get('/Resources') is None:
-        return page, content
+def remove_watermark_resources_from_page(
+    page: PageObject,
+    watermarks: List) -> PageObject:
+    """
+    Remove the watermark operand names from the page /XObject and
+    /ExtGState resources
 
-    # Remove watermarks from the page resources
-    for wm in watermarks:
+    Args:
+        page: PyPDF page object
+        watermarks: List of watermark operand names inside the PDF
+    """
 
-        if page['/Resources'].get('/XObject'):
-            if wm in page['/Resources']['/XObject'].keys():
-                page['/Resources']['/XObject'].pop(wm)
+    if  page.get('/Resources') is None:
+        return page
 
-        if page['/Resources'].get('/ExtGState'):
-            if wm in page['/Resources']['/ExtGState'].keys():
-                page['/Resources']['/ExtGState'].pop(wm)
+    # Remove watermarks from the page resources,
+    # resolving each resource dictionary once
+    resources = page['/Resources']
+    for category in ('/XObject', '/ExtGState'):
+        if not resources.get(category):
+            continue
+        names = resources[category]
+        for wm in watermarks:
+            if wm in names:
+                names.pop(wm)
 
-    return page, content
+    return page
 
 def remove_graphical_watermarks_from_contents(
     page: PageObject,
@@ -364,133 +1436,1817 @@ def remove_graphical_watermarks_from_contents(
         page
     """
 
-    graph_operators = ['f', 'F','B', 'B*', 'b', 'b*', 'n', 'W', 'W*','m',
-                       'l', 'c', 'v', 'y', 'h', 're',]
-    if page.get('/Contents') is None:
+    # Retrive contents stream
+    content = get_page_content_stream(page, source)
+    if content is None:
         return page
 
-    # Get content objects id
-    content_object = page["/Contents"].getObject()
-    # Retrive contents stream
-    content = ContentStream(content_object, source)
+    # Mask the graphical operations out, keep the non graphical ones
+    graphical = content.operator_codes(GRAPHICAL_OPERATORS)
+    keep = content.keep
+    for index, code in enumerate(content.codes):
+        if code in graphical:
+            keep[index] = 0
 
-    # List of non graphical operations, remainded
-    non_graphical_operations = []
+    return page
 
-    # Analyze each operation, keep only the non graphical ones
-    for operands, operator in content.operations:
-        if not operator in [b_(i) for i in graph_operators]:
-            non_graphical_operations.append((operands, operator))
+# The 'retracted' term, also spaced out or split across strings and operations
+RETRACTED_WORD = re.compile(r'r\s*e\s*t\s*r\s*a\s*c\s*t\s*e\s*d', re.IGNORECASE)
 
-    # update content operations
-    content.operations = non_graphical_operations
-    page.__setitem__(NameObject('/Contents'), content)
+# Texts showing the term and at least this number of characters are article body, not watermarks
+RETRACTED_WATERMARK_MAX_LENGTH = 30
 
-    return page
+# Operators read by find_retracted_watermarks
+_RETRACTED_SCAN_OPERATORS = TEXT_SHOWING_OPERATORS | {OP_ET, OP_Tf}
 
-def remove_retracted_watermarks_letters(
-    page: PageObject,
-    content: ContentStream) -> PageObject:
+# Characters that RETRACTED_WORD looks at
+_RETRACTED_WORD_CHARACTERS = frozenset(map(ord, 'retractedRETRACTED \t\n\r\x0b\x0c'))
+
+_CMAP_CODESPACE = re.compile(rb'begincodespacerange\s*<([0-9A-Fa-f]+)>')
+_CMAP_SECTION = re.compile(rb'begin(bfchar|bfrange)(.*?)endbf(?:char|range)', re.DOTALL)
+_CMAP_TOKEN = re.compile(rb'<([0-9A-Fa-f\s]*)>|\[|\]')
+
+def _cmap_unicode(hex_string: bytes) -> str:
+    return bytes.fromhex(hex_string.decode()).decode('utf-16-be', 'surrogatepass')
+
+def parse_to_unicode_cmap(
+    data: bytes) -> Tuple[int, Dict[int, str]]:
     """
-    This is a watermark removal function.
-    It replaces the word "RETRACTED" from the page text
-    by "".
+    Read a /ToUnicode CMap.
+
     Args:
-        page: PyPDF page object
-        source: PyPDF  file reader
+        data: Decoded CMap stream
     Return:
-        page
+        Number of bytes of the character codes, and the text of each code
     """
 
-    if content is None:
-        return page
+    codespace = _CMAP_CODESPACE.search(data)
+    width = len(codespace.group(1)) // 2 if codespace else 0
+    table = {}
+
+    for section, body in _CMAP_SECTION.findall(data):
+        tokens = []
+        array = None
+        for token in _CMAP_TOKEN.finditer(body):
+            if token.group(0) == b'[':
+                array = []
+            elif token.group(0) == b']':
+                tokens.append(array)
+                array = None
+            elif array is not None:
+                array.append(token.group(1))
+            else:
+                tokens.append(token.group(1))
+
+        if section == b'bfchar':
+            for source, target in zip(tokens[::2], tokens[1::2]):
+                width = width or len(source) // 2
+                table[int(source, 16)] = _cmap_unicode(target)
+            continue
+
+        for low, high, target in zip(tokens[::3], tokens[1::3], tokens[2::3]):
+            width = width or len(low) // 2
+            low, high = int(low, 16), int(high, 16)
+            if isinstance(target, list):
+                for code, text in zip(range(low, high + 1), target):
+                    table[code] = _cmap_unicode(text)
+            else:
+                # The last character of the text goes up with the code
+                text = _cmap_unicode(target)
+                first = ord(text[-1]) if text else 0
+                for code in range(low, min(high, low + 0xFFFF) + 1):
+                    table[code] = text[:-1] + chr(first + code - low)
+
+    return width or 1, table
+
+class ToUnicodeDecoder:
+    """
+    Text of the strings shown with a font, through its /ToUnicode CMap
+    """
+    __slots__ = ('width', 'table')
+
+    def __init__(self, width: int, table: Dict[int, str]):
+        self.width = width
+        self.table = table
+
+    def decode(self, string) -> str:
+        if isinstance(string, TextStringObject):
+            # PyPDF decoded the codes as PDFDocEncoding
+            try:
+                string = string.original_bytes
+            except Exception:
+                return str(string)
+        if self.width == 1:
+            text = bytes(string).decode('latin-1')
+        else:
+            text = bytes(string[:len(string) & ~1]).decode('utf-16-be', 'surrogatepass')
+        return text.translate(self.table)
+
+def font_to_unicode_decoder(
+    font) -> Optional[ToUnicodeDecoder]:
+    """
+    ToUnicodeDecoder of a font dictionary, or None when the text of its strings
+    can be matched as they are: no /ToUnicode, or a single-byte one that keeps
+    the letters of 'retracted' and the white-space where they are
+    """
+
+    to_unicode = font.get('/ToUnicode') if isinstance(font, dict) else None
+    if to_unicode is None:
+        return None
+    try:
+        width, table = parse_to_unicode_cmap(to_unicode.getObject().getData())
+    except (PyPdfError, ValueError, UnicodeDecodeError, AttributeError):
+        return None
 
+    if width == 1 and all((code in _RETRACTED_WORD_CHARACTERS) == (text == chr(code)) or
+                          (code not in _RETRACTED_WORD_CHARACTERS and
+                           _RETRACTED_WORD_CHARACTERS.isdisjoint(map(ord, text)))
+                          for code, text in table.items()):
+        return None
+    return ToUnicodeDecoder(width, table)
 
-    # Check if the 'retracted' term appears in the text
+# Font decoders of each open PDF, by font object reference
+_font_decoders = weakref.WeakKeyDictionary()
+
+def page_font_decoders(
+    page: PageObject,
+    source: Optional[PdfFileReader]) -> Dict[str, ToUnicodeDecoder]:
+    """
+    ToUnicodeDecoder of the page fonts that need one, by resource name.
+    Fonts shared by several pages are read once per document.
+    """
+
+    resources = page.get('/Resources')
+    fonts = resources.getObject().get('/Font') if resources is not None else None
+    if fonts is None:
+        return {}
+
+    cache = {} if source is None else _font_decoders.setdefault(source, {})
+    decoders = {}
+    for name, font in fonts.getObject().items():
+        if isinstance(font, IndirectObject):
+            reference = (font.idnum, font.generation)
+            if reference not in cache:
+                cache[reference] = font_to_unicode_decoder(font.getObject())
+            decoder = cache[reference]
+        else:
+            decoder = font_to_unicode_decoder(font)
+        if decoder is not None:
+            decoders[name] = decoder
+    return decoders
+
+def shown_text(
+    operands: List,
+    decoder: Optional[ToUnicodeDecoder] = None) -> str:
+    """
+    Text shown by a TJ or Tj operation: its strings, without the TJ positioning numbers
+    """
+
+    if not operands:
+        return ''
+    strings = operands[0]
+    if not isinstance(strings, list):
+        strings = (strings,)
+
+    if decoder is not None:
+        return ''.join(decoder.decode(string) for string in strings if isinstance(string, (str, bytes)))
+    return ''.join(string if isinstance(string, str) else string.decode('latin-1')
+                   for string in strings if isinstance(string, (str, bytes)))
+
+def find_retracted_watermarks(
+    operations: List,
+    decoders: Dict[str, ToUnicodeDecoder],
+    font: Optional[str] = None) -> List[int]:
+    """
+    Find the TJ and Tj operations that show the 'RETRACTED' term as a watermark.
+
+    The texts shown in each BT ET block are decoded (through the fonts
+    /ToUnicode CMaps, see page_font_decoders) and joined, and RETRACTED_WORD
+    runs once over the text of all the blocks; so the term is also found when
+    it is spaced out, kerned in a TJ array or split across operations.
+    A match is a watermark when the operations showing it show less than
+    RETRACTED_WATERMARK_MAX_LENGTH characters in total.
+
+    Args:
+        operations: (operands, operator) of a content stream; only the
+                    operands of the TJ, Tj and Tf operations are read
+        decoders: ToUnicodeDecoder of the fonts, by resource name
+        font: Resource name of the font selected before the operations
+    Return:
+        Indexes of the operations to blank
+    """
+
+    decoder = decoders.get(font)
+
+    # Text of each TJ or Tj operation and its index; '\x00' and -1 at the end of a text block,
+    # the term is not looked for across text blocks
+    texts = []
+    indexes = []
+    for index in [index for index, (_, operator) in enumerate(operations)
+                  if operator in _RETRACTED_SCAN_OPERATORS]:
+        operands, operator = operations[index]
+        if operator in TEXT_SHOWING_OPERATORS:
+            strings = operands[0] if operands else ''
+            texts.append(strings if decoder is None and isinstance(strings, str)
+                         else shown_text(operands, decoder))
+            indexes.append(index)
+        elif operator == OP_ET:
+            texts.append('\x00')
+            indexes.append(-1)
+        elif decoders:
+            decoder = decoders.get(operands[0]) if operands else None
+
+    watermarks = []
+    matches = list(RETRACTED_WORD.finditer(''.join(texts)))
+    if not matches:
+        return watermarks
+
+    # Where each text starts and ends in the joined text
+    ends = list(accumulate(len(text) for text in texts))
+    starts = [end - len(text) for end, text in zip(ends, texts)]
+    for match in matches:
+        # Texts from the one the match starts in to the one it ends in
+        shown = range(bisect_right(starts, match.start()) - 1, bisect_left(starts, match.end()))
+        if sum(ends[k] - starts[k] for k in shown) < RETRACTED_WATERMARK_MAX_LENGTH:
+            watermarks.extend(indexes[k] for k in shown if indexes[k] >= 0)
+    return watermarks
+
+# Operands of most TJ and Tj operations: literal strings without nested
+# parentheses and hex strings, alone or in a TJ array with numbers
+_LITERAL_STRING = rb'\(((?:[^()\\]|\\[\x00-\xff])*)\)'
+_HEX_STRING = rb'<([0-9A-Fa-f\x00\t\n\x0c\r ]*)>'
+_TEXT_STRING = re.compile(_LITERAL_STRING + b'|' + _HEX_STRING)
+_TEXT_OPERANDS = {
+    b'Tj': re.compile(rb'[\x00\t\n\x0c\r ]*(?:%s|%s)[\x00\t\n\x0c\r ]*Tj' % (_LITERAL_STRING, _HEX_STRING)),
+    # One white-space character, or a whole number, at a time: no backtracking over them
+    b'TJ': re.compile(rb'[\x00\t\n\x0c\r ]*\[(?:[\x00\t\n\x0c\r ]|%s|%s|[+\-.0-9]+(?![+\-.0-9]))*\][\x00\t\n\x0c\r ]*TJ'
+                      % (_LITERAL_STRING, _HEX_STRING)),
+}
+
+# Escape sequences of literal strings, and the bytes PyPDF reads for them
+_LITERAL_STRING_ESCAPE = re.compile(rb'\\(\d{1,3}|[\x00-\xff])')
+_LITERAL_STRING_ESCAPES = {**{bytes([char]): bytes([char]) for char in b'()/\\ %<>[]#_&$'},
+                           b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f', b'c': b'\\c'}
+
+# Bytes that PDFDocEncoding leaves undefined, and the characters of the others where they aren't Latin-1
+_PDFDOC_UNDEFINED = re.compile(b'[%s]' % b''.join(re.escape(bytes([code]))
+                                                  for code, char in enumerate(_pdfDocEncoding) if char == '\x00'))
+_PDFDOC_CHARACTERS = {code: char for code, char in enumerate(_pdfDocEncoding) if char != chr(code)}
+
+def unescape_literal_string(
+    data: bytes) -> Optional[bytes]:
+    """
+    Bytes of a literal string, from the ones between its parentheses; None
+    for the escape sequences that PyPDF reads in its own way, or rejects
+    (line breaks, octal codes of less than 3 digits, with 8 or 9 digits or
+    over 255, unknown escapes)
+    """
+    chunks = []
+    position = 0
+    for match in _LITERAL_STRING_ESCAPE.finditer(data):
+        chunks.append(data[position:match.start()])
+        position = match.end()
+        escape = match.group(1)
+        if escape[:1].isdigit():
+            # PyPDF drops the character after an octal code of less than 3 digits
+            if len(escape) < 3 or b'8' in escape or b'9' in escape or int(escape, 8) > 255:
+                return None
+            chunks.append(bytes([int(escape, 8)]))
+        elif escape in _LITERAL_STRING_ESCAPES:
+            chunks.append(_LITERAL_STRING_ESCAPES[escape])
+        else:
+            return None
+    chunks.append(data[position:])
+    return b''.join(chunks)
+
+def pdf_string_text(
+    data: bytes) -> str:
+    """
+    Text that shown_text reads from createStringObject(data), without
+    decoding PDFDocEncoding one character at a time as PyPDF does
+    """
+    if data.startswith(codecs.BOM_UTF16_BE):
+        try:
+            return data.decode('utf-16')
+        except UnicodeDecodeError:
+            return data.decode('latin-1')
+    if _PDFDOC_UNDEFINED.search(data):
+        return data.decode('latin-1')
+    return data.decode('latin-1').translate(_PDFDOC_CHARACTERS)
+
+def pdf_string_object(
+    data: bytes):
+    """
+    createStringObject of the bytes of a string (see pdf_string_text)
+    """
+    if data.startswith(codecs.BOM_UTF16_BE):
+        return createStringObject(data)
+    if _PDFDOC_UNDEFINED.search(data):
+        return ByteStringObject(data)
+    string = TextStringObject(pdf_string_text(data))
+    string.autodetect_pdfdocencoding = True
+    return string
+
+def text_operands(
+    content: CompactContentStream,
+    index: int,
+    text: bool = False) -> List:
+    """
+    Operands of a TJ or Tj operation as shown_text reads them: its strings,
+    without the TJ positioning numbers. The strings are read straight from
+    the bytes when they are as simple as they usually are, and parsed by
+    PyPDF otherwise (see CompactContentStream.operands).
+
+    With text, the strings read from the bytes are given as their text
+    joined in a single str, for the fonts that need no ToUnicodeDecoder.
+    """
+    raw = content.raw(index)
+    operator = content.operator_table[content.codes[index]]
+    if not _TEXT_OPERANDS[operator].fullmatch(raw):
+        return content.operands(index)
+
+    read_string = pdf_string_text if text else pdf_string_object
+    strings = []
+    for match in _TEXT_STRING.finditer(raw):
+        literal, hexadecimal = match.groups()
+        if literal is not None:
+            if b'\\' in literal:
+                literal = unescape_literal_string(literal)
+                if literal is None:
+                    return content.operands(index)
+            strings.append(read_string(literal))
+        else:
+            hexadecimal = hexadecimal.translate(None, _PDF_WHITESPACE)
+            strings.append(read_string(bytes.fromhex((hexadecimal + b'0' * (len(hexadecimal) & 1)).decode())))
+
+    if operator == b'Tj':
+        return strings
+    return [''.join(strings)] if text else [strings]
+
+def remove_retracted_watermarks_letters(
+    page: PageObject,
+    content: CompactContentStream) -> PageObject:
+    """
+    This is a watermark removal function.
+    It replaces the word "RETRACTED" from the page text
+    by "".
+    The operations are found by find_retracted_watermarks, over the whole page.
+
+    Args:
+        page: PyPDF page object
+        source: PyPDF  file reader
+    Return:
+        page
+    """
+
+    if content is None:
+        return page
+
+    # Only the operations read by find_retracted_watermarks are parsed,
+    # and the fonts selected by Tf only when some font needs a decoder
+    decoders = page_font_decoders(page, content.pdf)
+    scanned = content.operator_codes(_RETRACTED_SCAN_OPERATORS)
+    table, keep = content.operator_table, content.keep
+    indexes = [index for index, code in enumerate(content.codes) if code in scanned and keep[index]]
     operations = []
-    for operands, operator in content.operations:
+    for index in indexes:
+        operator = table[content.codes[index]]
+        operations.append((text_operands(content, index, not decoders) if operator in TEXT_SHOWING_OPERATORS else
+                           content.operands(index) if operator == OP_Tf and decoders else None, operator))
+
+    for k in find_retracted_watermarks(operations, decoders):
+        index = indexes[k]
+        content.replaced[index] = blank_text_operation(content.raw(index), operations[k][1])
+
+    return page
+
+# Streaming content stream processing
+#
+# The functions below work on the decoded bytes of a page content stream
+# without building the PyPDF ContentStream list of operations: the bytes are
+# decoded and tokenized incrementally, the operations outside the candidate
+# 'q' 'Q' blocks are copied straight to the output, and only the operations
+# of the current candidate block are kept in memory until its 'Q' is found.
+
+# PDF white-space and delimiter characters
+_PDF_WHITESPACE = b'\x00\t\n\x0c\r '
+_PDF_TOKEN = re.compile(
+    rb'(?P<space>[\x00\t\n\x0c\r ]+|%[^\r\n]*)'
+    rb'|(?P<regular>/?[^\x00\t\n\x0c\r ()<>\[\]{}/%]+|/)'
+    rb'|(?P<delimiter><<|>>|[()<>\[\]{}])')
+_PDF_STRING_DELIMITERS = re.compile(rb'[()\\]')
+_PDF_HEX_STRING_END = re.compile(rb'>')
+_INLINE_IMAGE_END = re.compile(rb'[\x00\t\n\x0c\r ]EI(?=[\x00\t\n\x0c\r ]|$)')
+
+OP_INLINE_IMAGE = b_('INLINE IMAGE')
+
+class ContentStreamLexer:
+    """
+    Incremental tokenizer of decoded PDF content stream bytes.
+
+    'operations' yields, for each operation, the tuple (raw, operands, operator):
+    the raw bytes of the operation (including the white-space before it),
+    the raw bytes of each of its operands and the operator. An inline image
+    (BI ... ID ... EI) is a single operation with operator 'INLINE IMAGE'.
+    Only a sliding window of the stream, around the current operation, is
+    kept in memory.
+
+    Args:
+        chunks: Iterable of decoded content stream bytes
+        budget: If given, it is checked every 1024 operations, and the
+                tokenizing stops with ResourceLimitExceeded once it is exceeded
+    """
 
-        # TJ or Tj flags the occurence of a text term
-        if operator == b_("TJ") or operator == b_('Tj'):
-            text = operands
+    def __init__(
+        self,
+        chunks,
+        budget: Optional[RemovalBudget] = None):
+        self.chunks = iter(chunks)
+        self.buffer = b''
+        self.eof = False
+        self.budget = budget
+
+    def _fill(self) -> bool:
+        """
+        Append the next chunk to the buffer; return False at the end of the stream
+        """
+        for chunk in self.chunks:
+            if chunk:
+                self.buffer += chunk
+                return True
+        self.eof = True
+        return False
+
+    def _match_token(
+        self,
+        pos: int):
+        """
+        Match the token starting at 'pos', reading more chunks
+        when the token may continue past the end of the buffer
+        """
+        while True:
+            if pos >= len(self.buffer) and not self._fill():
+                return None
+            match = _PDF_TOKEN.match(self.buffer, pos)
+            if match.end() < len(self.buffer) or self.eof:
+                return match
+            self._fill()
+
+    def _find(
+        self,
+        pattern,
+        pos: int):
+        """
+        Search 'pattern' from 'pos', reading more chunks until it is found
+        """
+        while True:
+            match = pattern.search(self.buffer, pos)
+            if match is not None and (match.end() < len(self.buffer) or self.eof):
+                return match
+            if not self._fill():
+                return pattern.search(self.buffer, pos)
+
+    def _skip_string(
+        self,
+        pos: int) -> int:
+        """
+        Return the position after the literal string starting at 'pos'
+        """
+        depth = 0
+        while True:
+            match = self._find(_PDF_STRING_DELIMITERS, pos)
+            if match is None:
+                return len(self.buffer)
+            pos = match.end()
+            char = match.group()
+            if char == b'\\':
+                if pos >= len(self.buffer):
+                    self._fill()
+                pos += 1
+            elif char == b'(':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return pos
+
+    def _skip_operand(
+        self,
+        match) -> int:
+        """
+        Return the position after the operand whose first token is 'match'
+        (strings, arrays and dictionaries may span many tokens)
+        """
+        token = match.group()
+        if token == b'(':
+            return self._skip_string(match.start())
+        if token == b'<':
+            hex_end = self._find(_PDF_HEX_STRING_END, match.end())
+            return len(self.buffer) if hex_end is None else hex_end.end()
+        if token not in (b'[', b'<<'):
+            return match.end()
+
+        depth = 1
+        pos = match.end()
+        while depth > 0:
+            match = self._match_token(pos)
+            if match is None:
+                return len(self.buffer)
+            if match.lastgroup == 'delimiter' and match.group() in (b'(', b'<'):
+                pos = self._skip_operand(match)
+                continue
+            if match.group() in (b'[', b'<<'):
+                depth += 1
+            elif match.group() in (b']', b'>>'):
+                depth -= 1
+            pos = match.end()
+        return pos
+
+    def operations(self):
+        start = 0
+        pos = 0
+        operands = []
+        count = 0
+        while True:
+            # Drop the bytes of the operations already yielded
+            if start > 1 << 16:
+                self.buffer = self.buffer[start:]
+                pos -= start
+                operands = [(i - start, j - start) for i, j in operands]
+                start = 0
+
+            match = self._match_token(pos)
+            if match is None:
+                break
+
+            if match.lastgroup == 'space':
+                pos = match.end()
+                continue
 
-            if not text:
-                operations.append((operands, operator))
+            token = match.group()
+            first = token[:1]
+            # Same rule as PyPDF ContentStream: alphabetic tokens are operators
+            if match.lastgroup == 'regular' and (first.isalpha() or first in b'\'"'):
+                end = match.end()
+                operator = token
+                if operator == b'BI':
+                    # Inline image: its binary data ends at the EI operator
+                    image_end = self._find(_INLINE_IMAGE_END, end)
+                    end = len(self.buffer) if image_end is None else image_end.end()
+                    operator = OP_INLINE_IMAGE
+                if not count & 1023 and self.budget is not None:
+                    self.budget.check()
+                count += 1
+                yield (bytes(self.buffer[start:end]),
+                       [self.buffer[i:j] for i, j in operands],
+                       operator)
+                operands = []
+                start = pos = end
                 continue
 
-            if isinstance(text[0], list):
-                text = " ".join([str(i) for i in text])
+            end = self._skip_operand(match)
+            operands.append((match.start(), end))
+            pos = end
+
+        # Trailing operands without operator (and white-space) are kept as they are
+        if start < len(self.buffer):
+            yield bytes(self.buffer[start:]), [], b''
+
+def read_stream_operands(
+    operands: List[bytes]) -> List:
+    """
+    Parse the raw operands of an operation yielded by ContentStreamLexer
+    into PyPDF objects
+    """
+    # The trailing white-space ends numbers and names read by PyPDF
+    return [readObject(BytesIO(op + b' '), None) for op in operands]
+
+def iter_page_content_chunks(
+    page: PageObject,
+    chunk_size: int = 1 << 16):
+    """
+    Yield the decoded bytes of the page content streams by chunks.
 
-            elif isinstance(text[0], str):
-                text = text[0]
+    FlateDecode streams without predictor are inflated incrementally;
+    streams with other filters are decoded by PyPDF at once.
 
+    Args:
+        page: PyPDF page object
+        chunk_size: Number of encoded bytes inflated at a time
+    """
+
+    if page.get("/Contents") is None:
+        return
+
+    streams = page["/Contents"].getObject()
+    if not isinstance(streams, list):
+        streams = [streams]
+
+    for stream in streams:
+        stream = stream.getObject()
+        filters = stream.get("/Filter")
+        if isinstance(filters, list) and len(filters) == 1:
+            filters = filters[0]
+
+        if isinstance(stream, ContentStream) or \
+            filters not in ("/FlateDecode", "/Fl") or stream.get("/DecodeParms"):
+            yield stream.getData()
+        else:
+            inflater = zlib.decompressobj()
+            data = stream._data
+            for offset in range(0, len(data), chunk_size):
+                yield inflater.decompress(data[offset:offset + chunk_size])
+            yield inflater.flush()
+
+        # Content streams of an array are separated by white-space
+        yield b'\n'
+
+def stream_watermark_stack_blocks(
+    operations,
+    watermarks: List,
+    aggressive: int,
+    repeated_blocks: frozenset = frozenset()):
+    """
+    Streaming counterpart of find_watermark_stack_block.
+
+    Yields the operations in stream order as (is_watermark, block) groups:
+    operations outside candidate 'q' 'Q' blocks are yielded one by one as
+    soon as they are read, and each candidate block is buffered until its
+    'Q' tells whether it is a watermark block.
+
+    Args:
+        operations: Operations yielded by ContentStreamLexer
+        watermarks: List of watermark operand names inside the PDF
+        aggressive: Integer in [1,3]
+        repeated_blocks: Fingerprints of the blocks drawn on most pages
+    """
+
+    watermarks = frozenset(b_(wm) for wm in watermarks)
+    repeated_lengths = fingerprint_operations(repeated_blocks)
+    block = None
+
+    for operation in operations:
+        _, operands, operator = operation
+
+        if operator == OP_q:
+            # A 'q' inside a candidate block starts a new block
+            if block:
+                yield False, block
+            block = [operation]
+            continue
+
+        if block is None:
+            yield False, [operation]
+            continue
+
+        block.append(operation)
+
+        # Blocks with images are never erased
+        if operands and operands[0][:1] == b'/' and b'/im' in operands[0].lower():
+            yield False, block
+            block = None
+
+        elif operator == OP_Q:
+            if aggressive > 2:
+                yield True, block
+            elif any(op in watermarks for _, ops, _ in block for op in ops):
+                yield True, block
             else:
-                operations.append((operands, operator))
+                yield len(block) in repeated_lengths and stream_block_fingerprint(block) in repeated_blocks, block
+            block = None
+
+    if block:
+        yield False, block
+
+def stream_block_fingerprint(
+    block: List) -> Optional[int]:
+    """
+    block_fingerprint of a block of operations yielded by ContentStreamLexer;
+    None for blocks with texts or inline images
+    """
+    if any(operator in (OP_BT, OP_INLINE_IMAGE) for _, _, operator in block):
+        return None
+    return block_fingerprint(b''.join(raw for raw, _, _ in block))
+
+def stream_remove_watermarks_from_page(
+    page: PageObject,
+    watermarks: List,
+    aggressive: int,
+    repeated_blocks: frozenset = frozenset(),
+    budget: Optional[RemovalBudget] = None) -> PageObject:
+    """
+    Streaming version of the page content removal passes.
+
+    The content stream is rewritten in a single pass over its bytes: watermark
+    'q' 'Q' blocks are dropped, 'RETRACTED' texts are blanked (aggressive > 1)
+    and graphical operations are dropped (aggressive > 2); every other operation
+    is copied to the output as it is.
+
+    Args:
+        page: PyPDF page object
+        watermarks: List of watermark operand names inside the PDF
+        aggressive: Integer in [1,3]
+        repeated_blocks: Fingerprints of the blocks drawn on most pages
+        budget: If given, the rewrite stops with ResourceLimitExceeded once it
+                is exceeded, and the page is left as it was
+    """
+
+    if page.get("/Contents") is None:
+        return remove_watermark_resources_from_page(page, watermarks)
+
+    lexer = ContentStreamLexer(iter_page_content_chunks(page), budget)
+    output = BytesIO()
+    changed = False
+    decoders = page_font_decoders(page, page.pdf) if aggressive > 1 else {}
+    # Operations of the current BT ET block, held until its ET
+    # to look for the 'RETRACTED' term (see find_retracted_watermarks)
+    text_block = None
+    font = None
+
+    for is_watermark, block in stream_watermark_stack_blocks(lexer.operations(), watermarks, aggressive,
+                                                             repeated_blocks):
+        if is_watermark:
+            changed = True
+            continue
+
+        for raw, operands, operator in block:
+            if aggressive > 2 and operator in GRAPHICAL_OPERATORS:
+                changed = True
                 continue
 
-            if ("retracted" in text.lower()) and len(text)< 30:
-                operands = TextStringObject('')
+            if aggressive > 1:
+                if operator == OP_BT and text_block is None:
+                    text_block = []
+                if text_block is not None:
+                    text_block.append((raw, operands, operator))
+                    if operator == OP_ET:
+                        changed |= write_stream_text_block(output, text_block, decoders, font)
+                        font = next((operands[0] for _, operands, operator in reversed(text_block)
+                                     if operator == OP_Tf and operands), font)
+                        text_block = None
+                    continue
+                if operator == OP_Tf and operands:
+                    font = operands[0]
+
+            output.write(raw)
+
+    if text_block:
+        changed |= write_stream_text_block(output, text_block, decoders, font)
+
+    # Pages without watermarks keep their original content stream
+    if changed:
+        stream = DecodedStreamObject()
+        stream.setData(output.getvalue())
+        page.__setitem__(NameObject('/Contents'), stream)
+
+    return remove_watermark_resources_from_page(page, watermarks)
+
+def write_stream_text_block(
+    output,
+    text_block: List[Tuple[bytes, List[bytes], bytes]],
+    decoders: Dict[str, ToUnicodeDecoder],
+    font: Optional[bytes]) -> bool:
+    """
+    Write the operations of a BT ET block read by ContentStreamLexer to 'output',
+    with the texts of the 'RETRACTED' watermarks blanked; returns whether any was
+    """
 
-        operations.append((operands, operator))
+    operations = [(read_stream_operands(operands) if operator in TEXT_SHOWING_OPERATORS or operator == OP_Tf
+                   else None, operator) for _, operands, operator in text_block]
+    watermarks = set(find_retracted_watermarks(operations, decoders,
+                                               None if font is None else font.decode('latin-1')))
 
-    content.operations = operations
+    for index, (raw, _, operator) in enumerate(text_block):
+        if index in watermarks:
+            raw = blank_text_operation(raw, operator)
+        output.write(raw)
+    return bool(watermarks)
 
-    # update content operations
-    page.__setitem__(NameObject('/Contents'), content)
+def blank_text_operation(
+    raw: bytes,
+    operator: bytes) -> bytes:
+    """
+    Bytes of a TJ or Tj operation showing an empty text instead,
+    with the white-space before the operation kept
+    """
+    return raw[:len(raw) - len(raw.lstrip(_PDF_WHITESPACE))] + (b'() ' if operator == b'Tj' else b'[] ') + operator
+
+# Start of an /Artifact marked content: /Artifact <<...>> BDC or /Artifact /Name BDC
+_ARTIFACT_BDC = re.compile(
+    rb'/Artifact\s*(<<.*?>>|/[^\x00\t\n\x0c\r ()<>\[\]{}/%]+)\s*BDC'
+    rb'(?![^\x00\t\n\x0c\r ()<>\[\]{}/%])', re.DOTALL)
+_ARTIFACT_WATERMARK_SUBTYPE = re.compile(rb'/(?:Watermark|Background)')
+# Tokens that nest marked contents, with the strings and inline images to skip
+_MARKED_CONTENT_TOKEN = re.compile(
+    rb'\((?:[^()\\]|\\.)*\)|\\.|[()]|(?<![^\x00\t\n\x0c\r ()<>\[\]{}/%])(?:BDC|BMC|EMC|ID)'
+    rb'(?![^\x00\t\n\x0c\r ()<>\[\]{}/%])', re.DOTALL)
+
+def find_marked_content_end(
+    data: bytes,
+    pos: int) -> int:
+    """
+    Position right after the EMC that closes the marked content open before 'pos',
+    counting the nested BDC/BMC ... EMC pairs and skipping strings and inline images.
+    Returns len(data) for an unterminated marked content.
+    """
+    nesting = 1
+    string_depth = 0
+
+    while True:
+        match = _MARKED_CONTENT_TOKEN.search(data, pos)
+        if match is None:
+            return len(data)
+        token = match.group()
+        pos = match.end()
+
+        if token == b'(':
+            string_depth += 1
+        elif token == b')':
+            string_depth = max(0, string_depth - 1)
+        elif string_depth or token[:1] in b'(\\':
+            continue
+        elif token == b'ID':
+            end = _INLINE_IMAGE_END.search(data, pos)
+            pos = len(data) if end is None else end.end()
+        elif token == b'EMC':
+            nesting -= 1
+            if nesting == 0:
+                return pos
+        else:
+            nesting += 1
+
+def strip_artifact_watermarks(
+    data: bytes) -> Optional[bytes]:
+    """
+    Remove the /Artifact watermark marked contents from the bytes of a content stream.
 
-    return page
+    A span starts at the '/Artifact' operand of a BDC whose properties mention
+    /Watermark or /Background, and ends at its matching EMC (see find_marked_content_end).
+    Only the bytes inside the spans are tokenized; the rest of the stream is
+    searched by a single regular expression.
+
+    Args:
+        data: decoded content stream
+    Return:
+        The stream without the watermark spans, or None when it has none
+    """
+
+    if b'/Artifact' not in data:
+        return None
+
+    pieces = []
+    keep_from = 0
+    pos = 0
+    while True:
+        match = _ARTIFACT_BDC.search(data, pos)
+        if match is None:
+            break
+        pos = match.end()
+        if not _ARTIFACT_WATERMARK_SUBTYPE.search(match.group(1)):
+            continue
+
+        pieces.append(data[keep_from:match.start()])
+        pos = keep_from = find_marked_content_end(data, pos)
+
+    if not pieces:
+        return None
+
+    pieces.append(data[keep_from:])
+    return b''.join(pieces)
+
+def fitz_remove_watermarks_from_page(
+    doc: 'fitz.Document',
+    page: 'fitz.Page'):
+    """
+    Remove the /Artifact watermarks and the annotations of a PyMuPDF page
+
+    REFERENCE: https://github.com/pymupdf/PyMuPDF/issues/468#issuecomment-601142235
+
+    Only the content streams with a watermark span are rewritten
+    (see strip_artifact_watermarks).
+
+    Args:
+        doc: PyMuPDF document
+        page: page of 'doc'
+    """
+    contents = page.get_contents()
+    if len(contents) > 1:
+        # Join the streams, a marked content can start in one and end in another
+        page.clean_contents()
+        contents = page.get_contents()
+
+    for xref in contents:
+        stream = strip_artifact_watermarks(doc.xref_stream(xref))
+        if stream is not None:
+            doc.update_stream(xref, stream)
+
+    # Removing annotationg, just in case
+    annot = page.first_annot
+    while annot:
+        annot = page.delete_annot(annot)
 
 def fitz_solvent_watermarks(
-    input_pdf: str,
-    output_pdf: str):
+    input_pdf,
+    output_pdf=None,
+    pages: Optional[List[int]] = None) -> Optional[bytes]:
     """
     Use the PyMuPDF function to remove watermark
 
     In case PyPDF fails, we use the solution from PyMupdf
-    REFERENCE: https://github.com/pymupdf/PyMuPDF/issues/468#issuecomment-601142235
+    (see fitz_remove_watermarks_from_page)
 
     Args:
-        input_pdf: str,
-        output_pdf: str):
+        input_pdf: Path, bytes, bytearray, memoryview, mmap or binary file object
+        output_pdf: Path or writable binary stream (default: return the output bytes)
+        pages: Numbers of the pages to clean (default: all of them)
+    """
+    doc = fitz_open_input(load_pdf_input(input_pdf))
+
+    for page in (range(len(doc)) if pages is None else pages):
+        fitz_remove_watermarks_from_page(doc, doc[page])
 
+    if output_pdf is None:
+        return doc.tobytes()
+    fitz_save(doc, output_pdf) # original uses garbage=4
+
+def merge_fallback_pages(
+    pypdf_data: bytes,
+    inputFile: PDFInput,
+    outputFile,
+    fallback_pages: List[int],
+    num_pages: int):
     """
-    doc = fitz.open(input_pdf)
+    Assemble an output from the pages cleaned by PyPDF and the pages
+    that only PyMuPDF could clean.
 
-    for page in doc:
+    Args:
+        pypdf_data: PDF written by PyPDF, with every page of the input but the fallback ones
+        inputFile: Path or buffer of the input PDF
+        outputFile: Path or writable stream of the output PDF
+        fallback_pages: Numbers of the input pages that PyPDF failed to process
+        num_pages: Number of pages of the input
+    """
+    import fitz
+    processed = fitz.open("pdf", pypdf_data)
+    original = fitz_open_input(inputFile)
+    for page in fallback_pages:
+        fitz_remove_watermarks_from_page(original, original[page])
+
+    fallback_pages = set(fallback_pages)
+    doc = fitz.open()
+    processed_page = 0
+    # Copy runs of consecutive pages from the same document at once
+    for is_fallback, run in groupby(range(num_pages), key=lambda page: page in fallback_pages):
+        run = list(run)
+        if is_fallback:
+            doc.insert_pdf(original, from_page=run[0], to_page=run[-1])
+        else:
+            doc.insert_pdf(processed, from_page=processed_page,
+                          to_page=processed_page + len(run) - 1)
+            processed_page += len(run)
+
+    doc.set_metadata(processed.metadata)
+    fitz_save(doc, outputFile)
+
+class StageStats:
+    """
+    Measures accumulated over every run of a stage of remove_watermarks
+    """
+    __slots__ = ('calls', 'seconds', 'operations', 'pages', 'bytes_in', 'bytes_out', 'peak_rss')
 
-        page.cleanContents()  # cleanup page painting commands
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.operations = 0
+        self.pages = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.peak_rss = 0
 
-        if len(page.getContents()) > 0:
-            xref = page.getContents()[0]  # get xref of the resulting source
-            cont0 = doc.xrefStream(xref).decode().splitlines()  # and read it as lines of strings
-            cont1 = []  # will contain reduced cont lines
-            found = False  # indicates we are inside watermark instructions
+    def to_dict(self) -> Dict:
+        return {key: getattr(self, key) for key in self.__slots__}
 
-            for line in cont0:
+class _StageTimer:
+    """
+    Context manager timing one run of a stage; returns the StageStats to update
+    """
+    __slots__ = ('stats', 'name', 'record', 'start')
+
+    def __init__(self, stats, name: str, record: StageStats):
+        self.stats = stats
+        self.name = name
+        self.record = record
+
+    def __enter__(self) -> StageStats:
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.record.calls += 1
+        self.record.seconds += elapsed
+        self.record.peak_rss = max(self.record.peak_rss, peak_rss())
+        if self.stats.hook is not None:
+            self.stats.hook(self.name, elapsed, self.record)
+
+class _NullStageTimer:
+    """
+    Stage timer of disabled stats: records nothing
+    """
+    __slots__ = ('record',)
 
-                if line.startswith("/Artifact") and (("/Background" in line) or ("/Watermark" in line)):  # start of watermark
-                    found = True  # switch on
-                    continue  # and skip line
-                if found and line == "EMC":  # end of watermark
-                    found = False  # switch off
-                    continue  # and skip line
-                if found is False:  # copy commands while outside watermarks
-                    cont1.append(line)
+    def __init__(self):
+        self.record = StageStats()
 
-            cont = "\n".join(cont1)  # new paint commands source
-            doc.updateStream(xref, cont.encode())  # replace old one with 'bytes' version
+    def __enter__(self) -> StageStats:
+        return self.record
 
-        # Removing annotationg, just in case
-        annot = page.firstAnnot
-        while annot:
-            annot = page.deleteAnnot(annot)
+    def __exit__(self, *exc_info):
+        pass
 
-    doc.save(output_pdf) # original uses garbage=4
+_NULL_STAGE_TIMER = _NullStageTimer()
+
+def peak_rss() -> int:
+    """
+    Peak resident set size of the process so far, in bytes (0 where unknown)
+    """
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux counts KB, macOS bytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+class RemovalStats:
+    """
+    Per-stage instrumentation of remove_watermarks.
+
+    Stages: 'cache', 'open', 'limits', 'triage', 'detection', 'parse', 'block_removal',
+    'retracted_text', 'graphical_removal', 'serialize', 'streaming_rewrite',
+    'parallel_pages', 'write' and 'fitz'. Each one accumulates its wall time,
+    number of runs, content stream operations, pages touched, bytes in and out,
+    and the peak RSS of the process when it ended. The page stages of a run with
+    workers are only measured as a whole, in 'parallel_pages'.
+
+    Disabled stats (enabled=False) hand out a shared no-op timer, so the
+    instrumented code costs a method call per stage.
+
+    Args:
+        hook: Called as hook(stage, seconds, stage_stats) after each run of a stage
+        enabled: Record the stages
+    """
+
+    def __init__(
+        self,
+        hook: Optional[Callable[[str, float, StageStats], None]] = None,
+        enabled: bool = True):
+
+        self.hook = hook
+        self.enabled = enabled
+        self.stages = {}
+
+    def stage(self, name: str):
+        """
+        Context manager timing a run of the stage 'name'; returns its StageStats
+        """
+        if not self.enabled:
+            return _NULL_STAGE_TIMER
+        record = self.stages.get(name)
+        if record is None:
+            record = self.stages[name] = StageStats()
+        return _StageTimer(self, name, record)
+
+    def to_dict(self) -> Dict[str, Dict]:
+        return {name: record.to_dict() for name, record in self.stages.items()}
+
+    def format_table(self) -> str:
+        lines = ["{:<18} {:>6} {:>10} {:>10} {:>6} {:>11} {:>11} {:>9}".format(
+            "stage", "calls", "seconds", "ops", "pages", "bytes in", "bytes out", "RSS (MB)")]
+        for name, record in self.stages.items():
+            lines.append("{:<18} {:>6} {:>10.4f} {:>10} {:>6} {:>11} {:>11} {:>9.1f}".format(
+                name, record.calls, record.seconds, record.operations, record.pages,
+                record.bytes_in, record.bytes_out, record.peak_rss / 2**20))
+        return "\n".join(lines)
+
+NO_STATS = RemovalStats(enabled=False)
+
+def print_detection_statistics(
+    counters: Counter):
+    """
+    Print the counters gathered while scanning the document for watermarks, on stderr
+    """
+
+    lookups = counters['classification_hits'] + counters['classification_misses']
+    hit_rate = 100 * counters['classification_hits'] / lookups if lookups else 0
+    print("Page-tree walks: {}".format(counters['page_tree_walks']), file=sys.stderr)
+    print("Indirect object resolutions: {}".format(counters['indirect_resolutions']), file=sys.stderr)
+    print("Resource dictionary cache hits: {}".format(counters['resource_cache_hits']), file=sys.stderr)
+    print("XObject classification cache: {} hits / {} lookups ({:.1f}%)".format(
+        counters['classification_hits'], lookups, hit_rate), file=sys.stderr)
+    print("Figure coverage: {} page scans, {} known from other pages".format(
+        counters['figure_page_scans'], counters['figure_coverage_hits']), file=sys.stderr)
+    print("Blocks repeated on most pages: {}".format(counters['repeated_blocks']), file=sys.stderr)
+    for key in sorted(counters):
+        if key.startswith(('fallback_', 'fitz_routed_', 'limit_')):
+            print("{}: {}".format(key.replace('_', ' ').capitalize(), counters[key]), file=sys.stderr)
+
+def remove_watermarks_from_single_page(
+    page: PageObject,
+    source: PdfFileReader,
+    watermarks: List,
+    aggressive: int,
+    streaming: bool = False,
+    stats: RemovalStats = NO_STATS,
+    repeated_blocks: frozenset = frozenset(),
+    budget: Optional[RemovalBudget] = None) -> Tuple[PageObject, bool]:
+    """
+    Apply every removal pass allowed by the aggressive level to a page,
+    and serialize its content stream so it is ready to be written.
+
+    Args:
+        page: PyPDF page object
+        source: PyPDF  file reader
+        watermarks: List of watermark operand names inside the PDF
+        aggressive: Integer in [1,3]
+        streaming: rewrite the content stream bytes in a single pass
+                   (see stream_remove_watermarks_from_page)
+        stats: RemovalStats recording the passes
+        repeated_blocks: Fingerprints of the blocks drawn on most pages,
+                         removed as watermarks (see BlockFingerprintIndex)
+        budget: If given, the parsing or the streaming rewrite stops with
+                ResourceLimitExceeded once it is exceeded
+    Return:
+        page, and whether any operation of its content stream was removed or changed
+    """
+
+    if streaming and aggressive > 0:
+        contents = page.raw_get('/Contents') if '/Contents' in page else None
+        with stats.stage('streaming_rewrite') as stage:
+            page = stream_remove_watermarks_from_page(page, watermarks, aggressive, repeated_blocks, budget)
+            stage.pages += 1
+            if stats.enabled and page.raw_get('/Contents') is not contents:
+                stage.bytes_out += len(page['/Contents'].getObject().getData())
+        return page, contents is not None and page.raw_get('/Contents') is not contents
+
+    content = None
+    if aggressive > 0:
+        with stats.stage('parse') as stage:
+            content = get_page_content_stream(page, source, budget)
+            stage.pages += 1
+            stage.operations += 0 if content is None else len(content.codes)
+    operations = 0 if content is None else len(content.codes)
+
+    if aggressive >0:
+        with stats.stage('block_removal') as stage:
+            page, content = remove_watermark_from_page(page, source, watermarks, aggressive, repeated_blocks)
+            stage.pages += 1
+            stage.operations += operations
+    if aggressive >1:
+        with stats.stage('retracted_text') as stage:
+            page = remove_retracted_watermarks_letters(page, content)
+            stage.pages += 1
+            stage.operations += operations
+    if aggressive > 2:
+        with stats.stage('graphical_removal') as stage:
+            page = remove_graphical_watermarks_from_contents(page, source)
+            stage.pages += 1
+            stage.operations += operations
+
+    # The passes mask out or replace the operations they change
+    changed = content is not None and content.changed
+
+    with stats.stage('serialize') as stage:
+        page = serialize_page_content_stream(page)
+        stage.pages += 1
+        if stats.enabled and page.get('/Contents') is not None:
+            stage.bytes_out += len(page['/Contents'].getObject().getData())
+
+    return page, changed
+
+# PDF source opened by each process of the page worker pool, and its budget
+_worker_source = None
+_worker_budget = None
+
+def _init_page_worker(
+    inputFile: Union[str, bytes],
+    limits: Optional[RemovalLimits] = None,
+    deadline: Optional[float] = None):
+    """
+    Reopen the input PDF (path or bytes) once in each worker process.
+
+    With 'limits', the worker starts its own budget: its memory limit is on
+    the growth of the worker process, and its time limit ends at 'deadline',
+    the time.time() at which the budget of the parent runs out.
+    """
+    global _worker_source, _worker_budget
+    _worker_budget = None
+    if limits is not None:
+        _worker_budget = limits.start()
+        if deadline is not None:
+            _worker_budget.deadline = time.monotonic() + deadline - time.time()
+    stream = open(inputFile, "rb") if isinstance(inputFile, str) else BytesIO(inputFile)
+    _worker_source = PdfFileReader(stream, "rb")
+
+def _remove_watermarks_from_page_range(
+    pages: List[int],
+    watermarks: List,
+    aggressive: int,
+    streaming: bool,
+    repeated_blocks: frozenset = frozenset()) -> List[Union[None, str, Tuple[Optional[bytes], bool]]]:
+    """
+    Worker side of the parallel page processing.
+    Returns the cleaned content stream data of each page in 'pages'
+    (None for pages that keep their original contents), and whether it changed.
+    Pages that PyPDF fails to process are returned as None, and the pages over
+    the time or memory limit of the worker budget as the name of the limit.
+    """
+
+    contents = []
+    for page in pages:
+        try:
+            if _worker_budget is not None:
+                _worker_budget.check()
+            page = _worker_source.getPage(page)
+            original = page.raw_get('/Contents') if '/Contents' in page else None
+            page, changed = remove_watermarks_from_single_page(page, _worker_source, watermarks,
+                                                               aggressive, streaming,
+                                                               repeated_blocks=repeated_blocks,
+                                                               budget=_worker_budget)
+        except ResourceLimitExceeded as error:
+            contents.append(error.limit)
+            continue
+        except PyPdfError:
+            contents.append(None)
+            continue
+
+        if original is None or page.raw_get('/Contents') is original:
+            contents.append((None, changed))
+        else:
+            contents.append((page['/Contents'].getObject().getData(), changed))
+
+    return contents
+
+def remove_watermarks_from_pages_in_parallel(
+    source: PdfFileReader,
+    inputFile: PDFInput,
+    watermarks: List,
+    aggressive: int,
+    workers: int,
+    streaming: bool = False,
+    failed_pages: Optional[set] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    budget: Optional[RemovalBudget] = None,
+    repeated_blocks: frozenset = frozenset()) -> Tuple[List[PageObject], List[bool]]:
+    """
+    Spread the watermark removal of the pages across a process pool.
+
+    Each worker reopens the input file and returns the cleaned content
+    streams; they are put back into the pages of 'source' in page order,
+    so the written PDF is the same as the one from a serial run.
+
+    Args:
+        source: PyPDF  file reader
+        inputFile: Path or buffer of the PDF opened by 'source'
+        watermarks: List of watermark operand names inside the PDF
+        aggressive: Integer in [1,3]
+        workers: Number of worker processes
+        streaming: rewrite the content streams bytes in a single pass
+        failed_pages: Pages that PyPDF failed to read; they are skipped, and the
+                      pages PyPDF fails to process are added to it
+        should_stop: Called as each range of pages comes back; when it returns True
+                     the pending ranges are cancelled and RemovalCancelled is raised
+        budget: Its limited pages are skipped; its limits are checked by the workers
+                while they parse the pages, and by the parent as each range of pages
+                comes back. Once a time or memory limit is exceeded, the pending
+                ranges are cancelled and their pages are added to its limited pages
+        repeated_blocks: Fingerprints of the blocks drawn on most pages
+    Return:
+        pages, and whether the content stream of each page changed
+    """
+
+    failed_pages = set() if failed_pages is None else failed_pages
+    limited_pages = {} if budget is None else budget.limited
+    page_numbers = [page for page in range(source.getNumPages())
+                    if page not in failed_pages and page not in limited_pages]
+    workers = max(1, min(workers, len(page_numbers)))
+
+    # Split the pages in contiguous ranges, a few per worker to balance the load
+    chunk_size = max(1, -(-len(page_numbers) // (workers * 4)))
+    chunks = [page_numbers[start:start + chunk_size]
+              for start in range(0, len(page_numbers), chunk_size)]
+
+    # Workers get a path or bytes, mmaps and memoryviews can't be sent to them
+    if not isinstance(inputFile, (str, bytes)):
+        inputFile = bytes(inputFile)
+
+    # The workers share the deadline of the budget, as a wall-clock time
+    limits = deadline = None
+    if budget is not None:
+        limits = budget.limits
+        if budget.deadline is not None:
+            deadline = time.time() + budget.deadline - time.monotonic()
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_page_worker,
+                             initargs=(inputFile, limits, deadline)) as executor:
+        futures = [executor.submit(_remove_watermarks_from_page_range, chunk,
+                                   watermarks, aggressive, streaming, repeated_blocks)
+                   for chunk in chunks]
+
+        pages = []
+        changed = []
+        for chunk, future in zip(chunks, futures):
+            if budget is not None and budget.exceeded is not None:
+                future.cancel()
+                for page in chunk:
+                    budget.limit(page, budget.exceeded)
+                continue
+            contents = future.result()
+            if should_stop is not None and should_stop():
+                for future in futures:
+                    future.cancel()
+                raise RemovalCancelled()
+            if budget is not None:
+                try:
+                    budget.check()
+                except ResourceLimitExceeded:
+                    # This range made it, the pending ones are limited
+                    pass
+            for page, result in zip(chunk, contents):
+                if result is None:
+                    failed_pages.add(page)
+                    continue
+                if isinstance(result, str):
+                    # Over a limit in the worker: the pending ranges are limited as well
+                    budget.limit(page, result)
+                    budget.exceeded = budget.exceeded or result
+                    continue
+                data, page_changed = result
+                page = source.getPage(page)
+                if aggressive > 0:
+                    page = remove_watermark_resources_from_page(page, watermarks)
+                if data is not None:
+                    stream = DecodedStreamObject()
+                    stream.setData(data)
+                    page.__setitem__(NameObject('/Contents'), stream)
+                else:
+                    # The detection may have parsed the page, it gets its original content stream back
+                    page = serialize_page_content_stream(page)
+                pages.append(page)
+                changed.append(page_changed)
+
+    return pages, changed
+
+_STARTXREF = re.compile(rb'startxref\s+(\d+)')
+
+def write_incremental_update(
+    inputFile: PDFInput,
+    outputFile,
+    source: PdfFileReader,
+    pages: List[PageObject],
+    changed: List[bool]):
+    """
+    Write the output as the original PDF bytes followed by an incremental update.
+
+    Only the objects changed by the removal are appended: the new content stream
+    (Flate compressed) of each changed page, the page dictionaries that point to
+    them, and the resource dictionaries whose /XObject or /ExtGState entries were
+    removed, also the ones left empty. The cost is proportional to the size of
+    the edit, not of the file; when nothing changed, the original PDF is copied.
+
+    Args:
+        inputFile: Path or buffer of the PDF opened by 'source'
+        outputFile: Path or writable stream of the output PDF
+        source: PyPDF file reader whose pages were processed
+        pages: Processed pages of 'source', in page order
+        changed: Whether the content stream of each page changed
+    """
+
+    objects = {}
+    new_streams = []
+    next_idnum = int(source.trailer['/Size'])
+
+    # The original resources, to find the resource dictionaries that changed
+    with open_pdf_input(inputFile) as f:
+        original = PdfFileReader(f, "rb")
+
+        for page_number, page in enumerate(pages):
+            page_ref = page.indirectRef
+            rewrite_page = False
+
+            if changed[page_number]:
+                stream = page['/Contents'].getObject().flateEncode()
+                new_streams.append((next_idnum, stream))
+                page.__setitem__(NameObject('/Contents'), IndirectObject(next_idnum, 0, source))
+                next_idnum += 1
+                rewrite_page = True
+
+            if page.get('/Resources') is not None:
+                resources = page['/Resources']
+                original_resources = original.getPage(page_number)['/Resources']
+                for category in ('/XObject', '/ExtGState'):
+                    # Dictionaries emptied by the removal are rewritten too
+                    if resources.get(category) is None or original_resources.get(category) is None:
+                        continue
+                    if set(resources[category].keys()) == set(original_resources[category].keys()):
+                        continue
+                    # Rewrite the closest indirect object holding the changed dictionary
+                    if isinstance(resources.raw_get(category), IndirectObject):
+                        ref = resources.raw_get(category)
+                        objects[(ref.idnum, ref.generation)] = resources[category]
+                    elif isinstance(page.raw_get('/Resources'), IndirectObject):
+                        ref = page.raw_get('/Resources')
+                        objects[(ref.idnum, ref.generation)] = resources
+                    else:
+                        rewrite_page = True
+
+            if rewrite_page:
+                objects[(page_ref.idnum, page_ref.generation)] = page
+
+        for idnum, stream in new_streams:
+            objects[(idnum, 0)] = stream
+
+        f.seek(0, io.SEEK_END)
+        input_size = f.tell()
+        f.seek(max(0, input_size - 1024))
+        prev_xref = int(_STARTXREF.findall(f.read())[-1])
+
+    # Nothing changed: the original PDF is the output, an empty update would not be readable
+    if not objects:
+        copy_clean_pdf(inputFile, outputFile)
+        return
+
+    # The update is built apart, its offsets start at the end of the input
+    update = BytesIO()
+    update.write(b_("\n"))
+    offsets = {}
+    for (idnum, generation), obj in sorted(objects.items()):
+        offsets[idnum] = (input_size + update.tell(), generation)
+        update.write(b_("%d %d obj\n" % (idnum, generation)))
+        obj.writeToStream(update, None)
+        update.write(b_("\nendobj\n"))
+
+    # Cross-reference section, one subsection per run of consecutive numbers
+    xref_offset = input_size + update.tell()
+    update.write(b_("xref\n"))
+    idnums = sorted(offsets)
+    start = 0
+    while start < len(idnums):
+        end = start
+        while end + 1 < len(idnums) and idnums[end + 1] == idnums[end] + 1:
+            end += 1
+        update.write(b_("%d %d\n" % (idnums[start], end - start + 1)))
+        for idnum in idnums[start:end + 1]:
+            update.write(b_("%010d %05d n\r\n" % offsets[idnum]))
+        start = end + 1
+
+    trailer = DictionaryObject()
+    trailer[NameObject('/Size')] = NumberObject(next_idnum)
+    for key in ('/Root', '/Info', '/ID'):
+        if key in source.trailer:
+            trailer[NameObject(key)] = source.trailer.raw_get(key)
+    trailer[NameObject('/Prev')] = NumberObject(prev_xref)
+    update.write(b_("trailer\n"))
+    trailer.writeToStream(update, None)
+    update.write(b_("\nstartxref\n%d\n%%%%EOF\n" % xref_offset))
+
+    with open_pdf_output(outputFile) as out:
+        if isinstance(inputFile, str):
+            with open(inputFile, "rb") as f:
+                shutil.copyfileobj(f, out)
+        else:
+            out.write(inputFile)
+        out.write(update.getvalue())
+
+class RemovalCancelled(Exception):
+    """
+    Raised by remove_watermarks when its should_stop callback asks to stop
+    """
+
+class FallbackError(Exception):
+    """
+    Raised by remove_watermarks when PyPDF failed and the PyMuPDF fallback
+    failed as well; 'report' is the report of the attempt, and the error of
+    PyMuPDF is the cause of this one
+    """
+
+    def __init__(self, report: Dict):
+        super().__init__("PyMuPDF fallback failed")
+        self.report = report
+
+def failed_removal_error(
+    target,
+    report: Dict,
+    error: BaseException) -> BaseException:
+    """
+    Remove the partial output of a failed remove_watermarks and return the
+    exception to raise: a FallbackError when the PyMuPDF fallback was attempted
+    """
+    if isinstance(target, str) and os.path.exists(target):
+        os.remove(target)
+    if not report['fallback'] or not isinstance(error, Exception):
+        return error
+    fallback_error = FallbackError(report)
+    fallback_error.__cause__ = error
+    return fallback_error
+
+# Backends that can write the output of remove_watermarks
+BACKENDS = ('pypdf', 'fitz', 'auto')
+
+def pypdf_unsupported_signature(
+    inputFile: PDFInput) -> Optional[str]:
+    """
+    Look for the file signatures of PDFs that PyPDF is known to fail on,
+    reading only the first and last KB of the file.
+
+    Args:
+        inputFile: Path or buffer of the PDF
+    Return:
+        Name of the signature found ('header_offset', 'missing_eof',
+        'missing_startxref' or 'encrypted'), or None
+    """
+    if isinstance(inputFile, str):
+        with open(inputFile, "rb") as f:
+            head = f.read(1024)
+            f.seek(max(0, os.path.getsize(inputFile) - 1024))
+            tail = f.read()
+    else:
+        buffer = memoryview(inputFile).cast('B')
+        head = bytes(buffer[:1024])
+        tail = bytes(buffer[-1024:])
+
+    # PyPDF takes the xref offsets from the start of the file
+    if not head.startswith(b'%PDF-'):
+        return 'header_offset'
+    if b'%%EOF' not in tail:
+        return 'missing_eof'
+    if not _STARTXREF.search(tail):
+        return 'missing_startxref'
+    # The trailer (or the xref stream) is at the end of the file
+    if b'/Encrypt' in tail:
+        return 'encrypted'
+    return None
+
+def input_size(
+    pdf: PDFInput) -> int:
+    """
+    Number of bytes of a loaded PDF input
+    """
+    return os.path.getsize(pdf) if isinstance(pdf, str) else memoryview(pdf).nbytes
+
+def output_size(
+    target) -> int:
+    """
+    Number of bytes written to an output path or buffer
+    """
+    return os.path.getsize(target) if isinstance(target, str) else target.tell()
+
+def fitz_remove_watermarks_with_stats(
+    inputFile: PDFInput,
+    target,
+    stats: RemovalStats):
+    """
+    fitz_solvent_watermarks over the whole PDF, recorded as the 'fitz' stage
+    """
+    with stats.stage('fitz') as record:
+        fitz_solvent_watermarks(inputFile, target)
+        if stats.enabled:
+            record.bytes_in += input_size(inputFile)
+            record.bytes_out += output_size(target)
+
+def finish_pdf_output(
+    target,
+    outputFile,
+    report: Dict) -> Dict:
+    """
+    Move a complete output from its temporary 'target' (see remove_watermarks)
+    to 'outputFile': rename the temporary file, copy the buffer to the output
+    stream, or keep the bytes in report['output'] when there is no outputFile.
+    """
+    if isinstance(target, str):
+        os.replace(target, outputFile)
+    elif outputFile is None:
+        report['output'] = target.getvalue()
+    else:
+        outputFile.write(target.getbuffer())
+    return report
+
+def library_version() -> str:
+    """
+    Version of the code that writes the outputs: a hash of this module,
+    with the PyPDF and PyMuPDF versions. The PyMuPDF version is read from
+    the package metadata, so the cache keys don't import PyMuPDF.
+    """
+    global _library_version
+    if _library_version is None:
+        from importlib import metadata
+        try:
+            fitz_version = metadata.version('pymupdf')
+        except metadata.PackageNotFoundError:
+            fitz_version = ''
+        digest = hashlib.blake2b(digest_size=8)
+        with open(__file__, 'rb') as f:
+            digest.update(f.read())
+        digest.update('{} {}'.format(getattr(PyPDF4, '__version__', ''), fitz_version).encode())
+        _library_version = digest.hexdigest()
+    return _library_version
+
+_library_version = None
+
+def content_hash(
+    pdf: PDFInput) -> str:
+    """
+    BLAKE2b hash of the bytes of a loaded PDF input (see load_pdf_input)
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(pdf, str):
+        with open(pdf, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    else:
+        digest.update(pdf)
+    return digest.hexdigest()
+
+# Report entries kept by ResultCache
+CACHED_REPORT_KEYS = ('mode', 'watermarks', 'backend', 'fallback', 'fallback_pages',
+                      'limited_pages', 'passthrough_pages', 'clean', 'counters')
+
+class ResultCache:
+    """
+    On-disk cache of the outputs of remove_watermarks.
+
+    Entries are addressed by the hash of the input bytes, the aggressive mode,
+    the options that change the output and the library_version. Each one is an
+    output PDF and its report, written to temporary files and renamed in place,
+    so worker processes sharing the directory never read a partial entry.
+    The least recently used entries are removed once the directory holds more
+    than max_bytes; the directory is scanned for that when this process
+    counts more than max_bytes in it, and after every max_bytes / 16 it wrote,
+    since other processes write to it too.
+
+    Args:
+        directory: Directory of the cache (created if missing)
+        max_bytes: Size cap of the cached PDFs and reports
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 1 << 30):
+
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        # Bytes in the cache at the last scan, and written by this process since
+        self.scanned_bytes = None
+        self.written_bytes = 0
+
+    def key(
+        self,
+        pdf: PDFInput,
+        aggressive: int,
+        **options) -> str:
+        """
+        Key of the output of 'pdf' with the remove_watermarks 'options'
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(json.dumps([content_hash(pdf), aggressive, library_version(),
+                                  sorted(options.items())]).encode())
+        return digest.hexdigest()
+
+    def paths(self, key: str) -> Tuple[str, str]:
+        """
+        Paths of the PDF and the report of an entry
+        """
+        base = os.path.join(self.directory, key[:2], key)
+        return base + '.pdf', base + '.json'
+
+    def get(
+        self,
+        key: str,
+        target) -> Optional[Dict]:
+        """
+        Copy the cached PDF of 'key' to 'target' (path or writable binary stream)
+        and return its report, or return None when 'key' is not cached
+        """
+        pdf_path, report_path = self.paths(key)
+        try:
+            with open(report_path) as f:
+                report = json.load(f)
+            with open(pdf_path, 'rb') as f:
+                if isinstance(target, str):
+                    with open(target, 'wb') as output:
+                        shutil.copyfileobj(f, output, 1 << 20)
+                else:
+                    shutil.copyfileobj(f, target, 1 << 20)
+            # Most recently used
+            os.utime(report_path)
+        except (OSError, ValueError):
+            # Missing, or evicted by another process meanwhile
+            return None
+        return report
+
+    def put(
+        self,
+        key: str,
+        output,
+        report: Dict) -> bool:
+        """
+        Store the output PDF of 'key' (path or BytesIO) and its report.
+        Returns whether it was stored: a full or read-only cache never
+        fails the removal.
+        """
+        pdf_path, report_path = self.paths(key)
+        report = {name: report[name] for name in CACHED_REPORT_KEYS if name in report}
+
+        try:
+            os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+            for path, write in ((pdf_path, lambda f: self._copy_output(output, f)),
+                                (report_path, lambda f: f.write(json.dumps(report).encode()))):
+                handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+                try:
+                    with os.fdopen(handle, 'wb') as f:
+                        write(f)
+                        self.written_bytes += f.tell()
+                    os.replace(temporary, path)
+                except BaseException:
+                    os.remove(temporary)
+                    raise
+
+            if (self.scanned_bytes is None or self.written_bytes > self.max_bytes // 16 or
+                    self.scanned_bytes + self.written_bytes > self.max_bytes):
+                self.evict()
+        except OSError:
+            return False
+        return True
+
+    @staticmethod
+    def _copy_output(output, f):
+        if isinstance(output, str):
+            with open(output, 'rb') as source:
+                shutil.copyfileobj(source, f, 1 << 20)
+        else:
+            f.write(output.getbuffer())
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_bytes
+        """
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                sizes = {}
+                used = {}
+                for entry in os.scandir(shard.path):
+                    key, extension = os.path.splitext(entry.name)
+                    try:
+                        stat = entry.stat()
+                        if extension == '.tmp':
+                            # Left by a process that died while writing it
+                            if stat.st_mtime < time.time() - 3600:
+                                os.remove(entry.path)
+                            continue
+                    except OSError:
+                        continue
+                    sizes[key] = sizes.get(key, 0) + stat.st_size
+                    if extension == '.json':
+                        used[key] = stat.st_mtime
+                for key, size in sizes.items():
+                    entries.append((used.get(key, 0), key, size))
+                    total += size
+
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            # The report first: without it the entry is a miss
+            for path in reversed(self.paths(key)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+        self.scanned_bytes = total
+        self.written_bytes = 0
 
 def remove_watermarks(
-    inputFile: str,
-    outputFile: str,
-    aggressive: int = 2):
+    inputFile,
+    outputFile=None,
+    aggressive: int = 2,
+    workers: int = 1,
+    streaming: bool = False,
+    verbose: bool = False,
+    skip_clean: bool = False,
+    link_clean: bool = False,
+    incremental: bool = False,
+    backend: str = 'pypdf',
+    should_stop: Optional[Callable[[], bool]] = None,
+    stats: Union[bool, RemovalStats] = False,
+    limits: Optional[RemovalLimits] = None,
+    cache: Optional[ResultCache] = None):
     """
     Removes 'RETRACTED' watermarks from Academic PDF articles.
 
@@ -509,32 +3265,358 @@ def remove_watermarks(
         All WM from 1 and 2 and all graphical elements are removed from the PDF.
         The only change for the Retraction Watermark not to be removed with such a level of aggressivity is the Retraction Watermark embedded as an Image File.
         In this case, we will preserve the Watermark since this function is designed not to erase any image/photo from the PDF.
+
+    With workers > 1, the pages are processed by a pool of 'workers' processes;
+    the output is the same as the one from a serial run.
+
+    With streaming, the content streams are never parsed into PyPDF operations:
+    their decoded bytes are tokenized incrementally and the untouched operations are
+    copied to the output as they are, so the memory used by a page is bounded by its
+    largest candidate 'q' 'Q' block instead of by its whole list of operations.
+
+    With skip_clean, the PDF is first triaged by find_watermark_candidates; a PDF
+    without any watermark candidate is copied as it is (hard-linked with link_clean)
+    instead of being rewritten.
+
+    With incremental, the output is the input file followed by an incremental update
+    holding only the changed content streams, pages and resource dictionaries
+    (see write_incremental_update); untouched objects, like images and fonts,
+    are not re-serialized.
+
+    The 'backend' writing the output is PyPDF ('pypdf'), PyMuPDF ('fitz'), or
+    'auto': PyMuPDF for the PDFs with a signature that PyPDF is known to fail on
+    (see pypdf_unsupported_signature), PyPDF otherwise.
+    When PyPDF fails on some pages, only those pages are cleaned by PyMuPDF;
+    the whole PDF falls back to PyMuPDF only when PyPDF can't open or write it.
+    The output is written to a temporary file first, so a failure never leaves
+    a partial output behind. When the PyMuPDF fallback fails too, FallbackError
+    is raised, with the report of the attempt.
+
+    The input is a path, bytes, bytearray, memoryview, mmap or binary file object,
+    loaded once (see load_pdf_input) and read in place by both PyPDF and PyMuPDF.
+    The output is a path or a writable binary stream; without outputFile, the
+    output PDF bytes are returned in report['output'].
+
+    should_stop is called between pages; when it returns True the removal stops
+    with RemovalCancelled and no output is written.
+
+    With stats (True, or a RemovalStats to choose the hook), the time, operations,
+    pages, bytes and peak memory of each stage are recorded in report['stats'].
+
+    With limits (see RemovalLimits), the pages over the page count, content stream
+    size, time or memory limits are not processed by PyPDF: they are cleaned by the
+    PyMuPDF artifact-only path, or copied unchanged, and listed in report['limited_pages']
+    (the ones copied unchanged in report['passthrough_pages'] as well).
+    The limits are not applied with backend 'fitz'.
+
+    With cache (see ResultCache), a PDF already processed with the same mode and
+    options is copied from the cache, and report['cache'] tells whether it was a
+    'hit' or a 'miss'. Outputs with limited pages are not cached.
+
+    Return:
+        report: dict with the aggressive 'mode', the watermark operand names found
+                ('watermarks'), the 'backend' that wrote the output ('pypdf', 'fitz'
+                or 'mixed'), whether the PyMuPDF 'fallback' was used and on which
+                'fallback_pages', whether the PDF was 'clean', the 'counters' of
+                page-tree walks, indirect-object resolutions and fallbacks,
+                the 'output' bytes when no outputFile is given and the
+                RemovalStats in 'stats' when enabled, the 'limited_pages' that
+                went over the limits, the 'passthrough_pages' among them that
+                were copied unchanged, and the number of them for each limit in
+                the 'limit_<name>' counters
     """
 
+    if backend not in BACKENDS:
+        raise ValueError("backend must be one of {}".format(", ".join(BACKENDS)))
+
+    report = {'mode': aggressive, 'watermarks': [], 'backend': 'pypdf', 'fallback': False,
+              'fallback_pages': [], 'limited_pages': [], 'passthrough_pages': [], 'clean': False}
+    counters = Counter()
+    budget = None if limits is None else limits.start()
+    stats = RemovalStats() if stats is True else (stats or NO_STATS)
+    if stats.enabled:
+        report['stats'] = stats
+
+    inputFile = load_pdf_input(inputFile)
+    # The output is written to 'target': a temporary file next to the output path,
+    # or a buffer copied to the output stream once complete
+    if isinstance(outputFile, (str, os.PathLike)):
+        outputFile = os.fspath(outputFile)
+        target = outputFile + '.part'
+    else:
+        target = BytesIO()
+
+    if cache is not None:
+        with stats.stage('cache') as record:
+            key = cache.key(inputFile, aggressive, backend=backend, streaming=streaming,
+                            incremental=incremental, skip_clean=skip_clean)
+            cached = cache.get(key, target)
+            record.bytes_in += input_size(inputFile) if stats.enabled else 0
+        if cached is not None:
+            report.update(cached, cache='hit')
+            return finish_pdf_output(target, outputFile, report)
+        report['cache'] = 'miss'
+        # Drop what a failed copy from the cache left
+        if isinstance(target, str):
+            if os.path.exists(target):
+                os.remove(target)
+        else:
+            target.seek(0)
+            target.truncate()
+
+    if backend == 'auto':
+        signature = pypdf_unsupported_signature(inputFile)
+        if signature is not None:
+            counters['fitz_routed_' + signature] += 1
+            backend = 'fitz'
+
+    # Where PyPDF failed: 'open', 'pages' or 'write'
+    stage = 'open'
+    failed_pages = set()
     try:
-        with open(inputFile, "rb") as f:
-            source = PdfFileReader(f, "rb")
-            output = PdfFileWriter()
-
-            watermarks = get_operands_watermarks_list(source, aggressive)
-            watermarks = list(set(watermarks))
+        if backend == 'fitz':
+            fitz_remove_watermarks_with_stats(inputFile, target, stats)
+            report['backend'] = 'fitz'
+        else:
+            with open_pdf_input(inputFile) as f:
+                with stats.stage('open') as record:
+                    source = PdfFileReader(f, "rb")
+                    num_pages = source.getNumPages()
+                    record.bytes_in += input_size(inputFile) if stats.enabled else 0
+                if budget is not None:
+                    with stats.stage('limits') as record:
+                        budget.limit_pages(source)
+                        record.pages += num_pages
+
+                if skip_clean:
+                    with stats.stage('triage') as record:
+                        candidates = find_watermark_candidates(source, aggressive)['candidates']
+                        record.pages += num_pages
+                    if not candidates:
+                        copy_clean_pdf(inputFile, target, link_clean)
+                        report['clean'] = True
+                        if cache is not None:
+                            cache.put(key, target, report)
+                        return finish_pdf_output(target, outputFile, report)
+
+                output = PdfFileWriter()
+
+                stage = 'pages'
+                with stats.stage('detection') as record:
+                    blocks = BlockFingerprintIndex(num_pages) if aggressive == 2 else None
+                    watermarks = get_operands_watermarks_list(source, aggressive, streaming, counters,
+                                                              failed_pages, budget, blocks)
+                    repeated_blocks = frozenset() if blocks is None else blocks.repeated()
+                    counters['repeated_blocks'] += len(repeated_blocks)
+                    del blocks
+                    record.pages += num_pages
+                watermarks = list(set(watermarks))
+                report['watermarks'] = sorted(watermarks)
+
+                if workers > 1 and num_pages > 1:
+                    with stats.stage('parallel_pages') as record:
+                        pages, changed = remove_watermarks_from_pages_in_parallel(source, inputFile, watermarks,
+                                                                                  aggressive, workers, streaming,
+                                                                                  failed_pages, should_stop, budget,
+                                                                                  repeated_blocks)
+                        record.pages += len(pages)
+                else:
+                    pages, changed = [], []
+                    for page in range(num_pages):
+                        if should_stop is not None and should_stop():
+                            raise RemovalCancelled()
+                        if page in failed_pages or (budget is not None and page in budget.limited):
+                            continue
+                        page_number = page
+                        try:
+                            page = source.getPage(page)
+                            if budget is not None:
+                                budget.check()
+                            page, page_changed = remove_watermarks_from_single_page(page, source,
+                                                                                    watermarks, aggressive, streaming,
+                                                                                    stats, repeated_blocks, budget)
+                        except ResourceLimitExceeded as error:
+                            budget.limit(page_number, error.limit)
+                            continue
+                        except PyPdfError:
+                            failed_pages.add(page_number)
+                            continue
+                        pages.append(page)
+                        changed.append(page_changed)
+
+                counters['page_tree_walks'] += 1
+                if len(failed_pages) == num_pages:
+                    raise PyPdfError("PyPDF failed on every page")
+
+                # Pages cleaned by PyMuPDF: the ones PyPDF failed on, and the limited ones
+                fitz_pages = set(failed_pages)
+                if budget is not None and budget.limited:
+                    for limit in budget.limited.values():
+                        counters['limit_' + limit] += 1
+                    report['limited_pages'] = sorted(budget.limited)
+                    # PyMuPDF would decode the content streams that are too large
+                    passthrough = {page for page, limit in budget.limited.items()
+                                   if limits.degrade == 'passthrough' or limit == 'max_page_stream_bytes'}
+                    fitz_pages.update(page for page in budget.limited if page not in passthrough)
+                    if passthrough:
+                        report['passthrough_pages'] = sorted(passthrough)
+                        # Copied unchanged, in their place
+                        processed = iter(zip(pages, changed))
+                        pages, changed = [], []
+                        for page in range(num_pages):
+                            if page in fitz_pages:
+                                continue
+                            page, page_changed = ((serialize_page_content_stream(source.getPage(page)), False)
+                                                  if page in passthrough else next(processed))
+                            pages.append(page)
+                            changed.append(page_changed)
+                if failed_pages:
+                    print("PyPDFError on {} pages, trying Pymupdf on them".format(len(failed_pages)), file=sys.stderr)
+                    counters['fallback_pages'] += len(failed_pages)
+                    report.update(fallback=True, fallback_pages=sorted(failed_pages))
+
+                stage = 'write'
+                if len(fitz_pages) == num_pages:
+                    fitz_remove_watermarks_with_stats(inputFile, target, stats)
+                    report['backend'] = 'fitz'
+
+                elif fitz_pages:
+                    with stats.stage('write') as record:
+                        for page in pages:
+                            output.addPage(page)
+                        data = BytesIO()
+                        output.write(data)
+                        record.pages += len(pages)
+                    with stats.stage('fitz') as record:
+                        merge_fallback_pages(data.getvalue(), inputFile, target,
+                                             sorted(fitz_pages), num_pages)
+                        record.pages += len(fitz_pages)
+                        record.bytes_out += output_size(target)
+                    report['backend'] = 'mixed'
+
+                elif incremental and not source.isEncrypted:
+                    with stats.stage('write') as record:
+                        write_incremental_update(inputFile, target, source, pages, changed)
+                        record.pages += sum(changed)
+                        record.bytes_out += output_size(target)
+
+                else:
+                    with stats.stage('write') as record:
+                        for page in pages:
+                            output.addPage(page)
+
+                        with open_pdf_output(target) as outputStream:
+                            output.write(outputStream)
+                        record.pages += len(pages)
+                        record.bytes_out += output_size(target)
 
-            #TODO
-            # Process the followint FOR in parallel
-            for page in range(source.getNumPages()):
-                page = source.getPage(page)
-                if aggressive >0:
-                    page, content = remove_watermark_from_page(page, source, watermarks, aggressive)
-                if aggressive >1:
-                    page = remove_retracted_watermarks_letters(page, content)
-                if aggressive > 2:
-                    page = remove_graphical_watermarks_from_contents(page, source)
-                output.addPage(page)
+    except PyPdfError:
+        print("PyPDFError trying Pymupdf", file=sys.stderr)
+        counters['fallback_file_' + stage] += 1
+        if not isinstance(target, str):
+            # Drop what PyPDF wrote before failing
+            target.seek(0)
+            target.truncate()
+        report.update(backend='fitz', fallback=True, fallback_pages=[])
+        try:
+            fitz_remove_watermarks_with_stats(inputFile, target, stats)
+        except BaseException as error:
+            raise failed_removal_error(target, report, error)
+
+    except BaseException as error:
+        raise failed_removal_error(target, report, error)
+
+    report['counters'] = dict(counters)
+    if verbose:
+        print_detection_statistics(counters)
+
+    if cache is not None and not report['limited_pages']:
+        with stats.stage('cache') as record:
+            if cache.put(key, target, report) and stats.enabled:
+                record.bytes_out += output_size(target)
+    return finish_pdf_output(target, outputFile, report)
+
+
+# Default number of PDFs processed at the same time by remove_watermarks_async
+ASYNC_CONCURRENCY = os.cpu_count() or 1
+_async_semaphores = weakref.WeakKeyDictionary()
+
+def _remove_watermarks_in_memory(
+    src,
+    aggressive: int,
+    options: Dict,
+    should_stop: Optional[Callable[[], bool]] = None) -> Tuple[bytes, Dict]:
+    """
+    Executor side of remove_watermarks_async: run remove_watermarks on 'src'
+    (path, buffer or binary file object) and return the output bytes and the report
+    """
+    report = remove_watermarks(src, None, aggressive, should_stop=should_stop, **options)
+    return report.pop('output'), report
+
+async def remove_watermarks_async(
+    src,
+    mode: int = 2,
+    executor: Optional[Executor] = None,
+    semaphore: Optional[Semaphore] = None,
+    report: Optional[Dict] = None,
+    **options) -> bytes:
+    """
+    Asyncio version of remove_watermarks: the PDF is processed off the event loop
+    and the output PDF is returned as bytes.
 
-            with open(outputFile, "wb") as outputStream:
-                output.write(outputStream)
+    At most ASYNC_CONCURRENCY PDFs (or as many as 'semaphore' allows) are processed
+    at the same time per event loop. Cancelling the awaiting task stops the removal
+    at the next page when it runs on a thread; on a process executor only the PDFs
+    that didn't start yet are cancelled.
 
-    except PyPdfError:
-        print("PyPDFError trying Pymupdf")
-        fitz_solvent_watermarks(inputFile, outputFile)
+    Args:
+        src: Path, bytes, bytearray, memoryview or binary file object of the input PDF
+        mode: Integer in [1,3], the aggressive level
+        executor: Executor running the removal (default: the event loop default executor)
+        semaphore: Semaphore capping the concurrent removals
+        report: dict updated with the report of remove_watermarks
+        options: Other keyword arguments of remove_watermarks
+    """
 
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+
+    loop = asyncio.get_running_loop()
+    if semaphore is None:
+        semaphore = _async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = _async_semaphores[loop] = asyncio.Semaphore(ASYNC_CONCURRENCY)
+
+    stop = threading.Event()
+    should_stop = stop.is_set
+    if isinstance(executor, ProcessPoolExecutor):
+        # Neither the event nor memoryviews, mmaps and file objects cross processes
+        should_stop = None
+        src = load_pdf_input(src)
+        if isinstance(src, (memoryview, mmap.mmap)):
+            src = bytes(src)
+
+    async with semaphore:
+        job = loop.run_in_executor(executor, _remove_watermarks_in_memory,
+                                   src, mode, options, should_stop)
+        try:
+            data, result = await job
+        except asyncio.CancelledError:
+            stop.set()
+            raise
+
+    if report is not None:
+        report.update(result)
+    return data
+
+async def iter_remove_watermarks_async(
+    src,
+    mode: int = 2,
+    chunk_size: int = 1 << 16,
+    **kwargs):
+    """
+    Like remove_watermarks_async, but yields the output PDF in chunks of 'chunk_size' bytes
+    """
+    data = memoryview(await remove_watermarks_async(src, mode, **kwargs))
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
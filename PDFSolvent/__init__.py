@@ -0,0 +1 @@
+from .PDFSolvent import *
@@ -1,16 +1,25 @@
 import argparse
-import re
+import json
+import os
+import sys
+
+# The sibling modules (batch, server) are imported by name, also with python -m PDFSolvent
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from PDFSolvent import *
 
-parser = argparse.ArgumentParser(prog='PDFSolvent', description="Removes 'RETRACTED' watermarks from Academic PDF articles..", formatter_class=argparse.MetavarTypeHelpFormatter)
-parser.add_argument("--input_pdf","-i", required=True, type=str ,nargs='?',
-                    help="Path to the PDF input.")
-parser.add_argument("--output_pdf","-o", type=str ,nargs='?', required=True,
-                    help="Path to the output.")
-parser.add_argument("--mode", "-m", type=int ,nargs='?', default=2, metavar=("mode"),
-                    help=
-"""
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Parser of the arguments of the single PDF command
+    """
+    parser = argparse.ArgumentParser(prog='PDFSolvent', description="Removes 'RETRACTED' watermarks from Academic PDF articles..", formatter_class=argparse.MetavarTypeHelpFormatter)
+    parser.add_argument("--input_pdf","-i", required=True, type=str ,nargs='?',
+                        help="Path to the PDF input.")
+    parser.add_argument("--output_pdf","-o", type=str ,nargs='?',
+                        help="Path to the output (required unless --check).")
+    parser.add_argument("--mode", "-m", type=int ,nargs='?', default=2, metavar=("mode"),
+                        help=
+    """
     This program has three levels of aggressivity; as higher the level more damage it can cause to the final result.
     Even though, even for the maximum level of aggressivity, the images/photos embedded in the PDF are preserved.
 
@@ -26,19 +35,99 @@ parser.add_argument("--mode", "-m", type=int ,nargs='?', default=2, metavar=("mo
         All WM from 1 and 2 and all graphical elements are removed from the PDF.
         The only change for the Retraction Watermark not to be removed with such a level of aggressivity is the Retraction Watermark embedded as an Image File.
         In this case, we will preserve the Watermark since this function is designed not to erase any image/photo from the PDF.
-""")
+    """)
+
+    parser.add_argument("--workers", "-w", type=int, default=1, metavar=("N"),
+                        help="Number of processes used to remove the watermarks from the pages.")
 
-args = vars(parser.parse_args())
 
+    parser.add_argument("--streaming", action='store_true',
+                        help="Rewrite the page content streams in a single streaming pass over their bytes.")
+    parser.add_argument("--verbose", "-v", action='store_true',
+                        help="Print statistics of the watermark detection.")
+    parser.add_argument("--check", action='store_true',
+                        help="Only report whether the PDF has watermark candidates (exit status 1 if it has, 2 if it can't be read).")
+    parser.add_argument("--skip-clean", action='store_true',
+                        help="Copy PDFs without watermark candidates as they are, instead of rewriting them.")
+    parser.add_argument("--link-clean", action='store_true',
+                        help="With --skip-clean, hard-link clean PDFs instead of copying them.")
+    parser.add_argument("--incremental", action='store_true',
+                        help="Append only the changed objects to the original PDF, as an incremental update.")
+    parser.add_argument("--backend", type=str, choices=BACKENDS, default='pypdf',
+                        help="Library that writes the output; 'auto' uses PyMuPDF for PDFs that PyPDF is known to fail on.")
+    parser.add_argument("--stats", type=str, choices=['json', 'text'], default=None,
+                        help="Print the time, operations, pages, bytes and peak memory of each stage.")
+    parser.add_argument("--max-pages", type=int, default=None, metavar=("N"),
+                        help="Pages after the first N are not processed by PyPDF (see --on-limit).")
+    parser.add_argument("--max-page-stream-bytes", type=int, default=None, metavar=("BYTES"),
+                        help="Pages whose decoded content streams are larger are copied unchanged.")
+    parser.add_argument("--max-seconds", type=float, default=None, metavar=("SECONDS"),
+                        help="Wall-clock time after which the pages left are not processed by PyPDF.")
+    parser.add_argument("--max-memory", type=int, default=None, metavar=("MB"),
+                        help="Memory growth after which the pages left are not processed by PyPDF.")
+    parser.add_argument("--cache", type=str, default=None, metavar=("DIR"),
+                        help="Directory of a cache of the outputs, by input content, mode and options.")
+    parser.add_argument("--cache-size", type=int, default=1024, metavar=("MB"),
+                        help="Size cap of the --cache directory; the least recently used outputs are removed.")
+    parser.add_argument("--on-limit", type=str, choices=LIMIT_DEGRADATIONS, default='fitz',
+                        help="Pages over a limit are cleaned by the PyMuPDF artifact-only path, or copied unchanged.")
+    return parser
 
 def main():
+    # Batch mode: python PDFSolvent batch <sources> -o <output_dir>
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        from batch import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+    # Server mode: python PDFSolvent serve [--port N | --unix PATH]
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        from server import main as serve_main
+        sys.exit(serve_main(sys.argv[2:]))
+
+    parser = build_parser()
+    args = vars(parser.parse_args())
     input_pdf = args['input_pdf']
     output_pdf = args['output_pdf']
     if type(args['mode']) == list:
         mode = args['mode'][0]
     else:
         mode = args['mode']
-    remove_watermarks( input_pdf, output_pdf, mode)
+
+    if args['check']:
+        # Exit status 1 means watermark candidates, a PDF that can't be read is 2
+        try:
+            flags = check_watermarks(input_pdf, mode)
+        except (PyPdfError, OSError) as error:
+            print("Could not read {}: {}".format(input_pdf, error), file=sys.stderr)
+            sys.exit(2)
+        print(json.dumps(flags))
+        sys.exit(1 if flags['candidates'] else 0)
+    if output_pdf is None:
+        parser.error("the following arguments are required: --output_pdf/-o")
+
+    limits = None
+    if any(args[key] is not None for key in ('max_pages', 'max_page_stream_bytes', 'max_seconds', 'max_memory')):
+        limits = RemovalLimits(args['max_pages'], args['max_page_stream_bytes'], args['max_seconds'],
+                               None if args['max_memory'] is None else args['max_memory'] << 20,
+                               args['on_limit'])
+
+    report = remove_watermarks( input_pdf, output_pdf, mode, workers=args['workers'],
+                                streaming=args['streaming'], verbose=args['verbose'],
+                                skip_clean=args['skip_clean'], link_clean=args['link_clean'],
+                                incremental=args['incremental'], backend=args['backend'],
+                                stats=args['stats'] is not None, limits=limits,
+                                cache=ResultCache(args['cache'], args['cache_size'] << 20) if args['cache'] else None)
+    passthrough_pages = set(report['passthrough_pages'])
+    for action, pages in (('cleaned by PyMuPDF', [page for page in report['limited_pages']
+                                                  if page not in passthrough_pages]),
+                          ('copied unchanged', report['passthrough_pages'])):
+        if pages:
+            print("Pages over the limits, {}: {}".format(action, ", ".join(str(page + 1) for page in pages)),
+                  file=sys.stderr)
+
+    if args['stats'] == 'json':
+        print(json.dumps(report['stats'].to_dict()))
+    elif args['stats'] == 'text':
+        print(report['stats'].format_table())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,302 @@
+import argparse
+import glob
+import json
+import os
+import signal
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from PDFSolvent import FallbackError, ResultCache, remove_watermarks
+
+
+def relative_names(
+    paths: List[str],
+    root: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    Pair each path with its path relative to 'root'
+    (by default the deepest directory holding all of them)
+    """
+    if not paths:
+        return []
+    if root is None:
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    return [(path, os.path.relpath(os.path.abspath(path), os.path.abspath(root))) for path in paths]
+
+
+def glob_root(
+    pattern: str) -> str:
+    """
+    Directory part of a glob pattern before its first wildcard
+    """
+    parts = []
+    for part in os.path.dirname(pattern).split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or os.curdir
+
+
+def collect_input_pdfs(
+    source: str) -> List[Tuple[str, str]]:
+    """
+    Expand a batch source into a list of (input PDF, relative output name).
+
+    Args:
+        source: Either a directory (all the PDFs below it are taken,
+                keeping their relative paths), a manifest file (one PDF
+                path per line, '#' starts a comment; the paths are kept
+                relative to the deepest directory holding all of them) or
+                a glob pattern (the paths are kept relative to the
+                directory before its first wildcard).
+    """
+
+    if os.path.isdir(source):
+        pdfs = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith('.pdf'):
+                    path = os.path.join(root, name)
+                    pdfs.append((path, os.path.relpath(path, source)))
+        return sorted(pdfs)
+
+    if os.path.isfile(source) and not source.lower().endswith('.pdf'):
+        pdfs = []
+        with open(source) as manifest:
+            for line in manifest:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    pdfs.append(line)
+        return relative_names(pdfs)
+
+    return relative_names(sorted(glob.glob(source, recursive=True)), glob_root(source))
+
+
+class FileTimeout(Exception):
+    """
+    Raised inside a batch worker when a PDF exceeds its time budget
+    """
+
+
+def _raise_file_timeout(signum, frame):
+    raise FileTimeout()
+
+
+def remove_watermarks_from_file(
+    inputFile: str,
+    outputFile: str,
+    aggressive: int,
+    timeout: Optional[float] = None,
+    skip_clean: bool = False,
+    cache: Optional[ResultCache] = None) -> Dict:
+    """
+    Batch worker: remove the watermarks of a single PDF and never raise.
+
+    The output is first written to a temporary file and renamed when
+    complete, so an interrupted file is never taken as done.
+
+    With skip_clean, PDFs without watermark candidates are hard-linked
+    (or copied) to the output instead of being rewritten.
+
+    With cache, the outputs are shared through a ResultCache directory.
+
+    Return:
+        result: dict with the file 'status' (done, timeout or error),
+                'mode', 'fallback', the 'backend' that wrote the output,
+                'clean', 'elapsed' seconds and, with cache, whether it was a 'hit' or a 'miss'
+    """
+
+    result = {'input': inputFile, 'output': outputFile, 'status': 'done',
+              'mode': aggressive, 'fallback': False, 'clean': False}
+    partial = outputFile + '.part'
+    start = time.perf_counter()
+
+    if timeout:
+        signal.signal(signal.SIGALRM, _raise_file_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(outputFile)), exist_ok=True)
+        report = remove_watermarks(inputFile, partial, aggressive,
+                                   skip_clean=skip_clean, link_clean=skip_clean, cache=cache)
+        os.replace(partial, outputFile)
+        result['fallback'] = report['fallback']
+        result['backend'] = report['backend']
+        result['clean'] = report['clean']
+        if cache is not None:
+            result['cache'] = report['cache']
+    except FileTimeout:
+        result['status'] = 'timeout'
+    except Exception as error:
+        if isinstance(error, FallbackError):
+            # Report the PyMuPDF error, and that the fallback was attempted
+            result['fallback'] = True
+            result['backend'] = error.report['backend']
+            error = error.__cause__
+        # The time budget may run out while PyMuPDF is at work
+        if isinstance(error, FileTimeout):
+            result['status'] = 'timeout'
+        else:
+            result['status'] = 'error'
+            result['error'] = '{}: {}'.format(type(error).__name__, error)
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    result['elapsed'] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def _run_batch_jobs(
+    jobs: List[Tuple[str, str]],
+    aggressive: int,
+    workers: int,
+    timeout: Optional[float],
+    skip_clean: bool,
+    cache: Optional[ResultCache] = None) -> Iterator[Dict]:
+    """
+    Run the jobs on a pool of reused worker processes, keeping at most
+    two jobs per worker in flight.
+    Jobs that were running when a worker process died are retried
+    one at a time, so only the PDF that kills its worker is reported as crashed.
+    """
+
+    pending = list(reversed(jobs))
+    suspects = []
+
+    while pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            running = {}
+            try:
+                while pending or running:
+                    while pending and len(running) < 2 * workers:
+                        job = pending.pop()
+                        running[executor.submit(remove_watermarks_from_file, *job,
+                                                aggressive, timeout, skip_clean, cache)] = job
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        running.pop(future)
+                        yield result
+            except BrokenProcessPool:
+                suspects += running.values()
+
+    for job in suspects:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            try:
+                yield executor.submit(remove_watermarks_from_file, *job,
+                                      aggressive, timeout, skip_clean, cache).result()
+            except BrokenProcessPool:
+                yield {'input': job[0], 'output': job[1], 'status': 'crashed',
+                       'mode': aggressive, 'fallback': False, 'clean': False, 'elapsed': None}
+
+
+def batch_remove_watermarks(
+    sources: List[str],
+    output_dir: str,
+    aggressive: int = 2,
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    skip_done: bool = True,
+    log_file: Optional[str] = None,
+    skip_clean: bool = False,
+    cache: Optional[ResultCache] = None) -> Dict[str, int]:
+    """
+    Remove the watermarks of many PDFs with a bounded pool of worker processes.
+
+    A corrupted PDF is only reported in the results; it never stops the batch.
+
+    Args:
+        sources: Directories, manifest files or glob patterns (see collect_input_pdfs);
+                 ValueError is raised, before any PDF is processed, when two
+                 of their PDFs would be written to the same output
+        output_dir: Directory where the cleaned PDFs are written
+        aggressive: Integer in [1,3]
+        workers: Number of worker processes (default: number of CPUs)
+        timeout: Maximum number of seconds spent on a single PDF
+        skip_done: Skip PDFs whose output already exists
+        log_file: JSONL file where one result line per PDF is appended
+        skip_clean: Hard-link (or copy) PDFs without watermark candidates
+                    instead of rewriting them
+        cache: ResultCache shared by the worker processes
+    Return:
+        Number of PDFs per status (done, skipped, timeout, error, crashed)
+    """
+
+    workers = workers or os.cpu_count() or 1
+    # Output: input PDF written to it
+    outputs = {}
+    for source in sources:
+        for inputFile, name in collect_input_pdfs(source):
+            outputFile = os.path.normpath(os.path.join(output_dir, name))
+            if outputs.setdefault(outputFile, inputFile) != inputFile:
+                raise ValueError("{} and {} would both be written to {}".format(
+                    outputs[outputFile], inputFile, outputFile))
+
+    log = open(log_file, 'a') if log_file else None
+    summary = {}
+
+    def record(result):
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+        if log:
+            log.write(json.dumps(result) + '\n')
+            log.flush()
+
+    try:
+        jobs = []
+        for outputFile, inputFile in outputs.items():
+            if skip_done and os.path.exists(outputFile):
+                record({'input': inputFile, 'output': outputFile, 'status': 'skipped',
+                        'mode': aggressive, 'fallback': False, 'clean': False,
+                        'elapsed': 0.0})
+                continue
+            jobs.append((inputFile, outputFile))
+
+        for result in _run_batch_jobs(jobs, aggressive, workers, timeout, skip_clean, cache):
+            record(result)
+    finally:
+        if log:
+            log.close()
+
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='PDFSolvent batch',
+                                     description="Removes 'RETRACTED' watermarks from many PDFs.")
+    parser.add_argument("sources", nargs='+', type=str,
+                        help="Input directories, manifest files (one PDF path per line) or glob patterns.")
+    parser.add_argument("--output_dir", "-o", required=True, type=str,
+                        help="Directory where the cleaned PDFs are written.")
+    parser.add_argument("--mode", "-m", type=int, default=2,
+                        help="Level of aggressivity, in [1,3].")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="Number of worker processes (default: number of CPUs).")
+    parser.add_argument("--timeout", "-t", type=float, default=None,
+                        help="Maximum number of seconds spent on a single PDF.")
+    parser.add_argument("--log", "-l", type=str, default=None,
+                        help="JSONL file where the result of each PDF is appended.")
+    parser.add_argument("--overwrite", action='store_true',
+                        help="Process PDFs whose output already exists.")
+    parser.add_argument("--skip-clean", action='store_true',
+                        help="Hard-link (or copy) PDFs without watermark candidates instead of rewriting them.")
+    parser.add_argument("--cache", type=str, default=None,
+                        help="Directory of a cache of the outputs shared by the workers (e.g. for mirrored PDFs).")
+    parser.add_argument("--cache-size", type=int, default=1024,
+                        help="Size cap of the --cache directory, in MB.")
+    args = parser.parse_args(argv)
+
+    summary = batch_remove_watermarks(args.sources, args.output_dir, args.mode,
+                                      workers=args.workers, timeout=args.timeout,
+                                      skip_done=not args.overwrite, log_file=args.log,
+                                      skip_clean=args.skip_clean,
+                                      cache=ResultCache(args.cache, args.cache_size << 20) if args.cache else None)
+    print(json.dumps(summary))
+    return 0 if set(summary) <= {'done', 'skipped'} else 1
+
+
+if __name__ == "__main__":
+    main()
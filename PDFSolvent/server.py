@@ -0,0 +1,341 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import tempfile
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from batch import remove_watermarks_from_file
+
+# Size of the pieces in which request and response bodies are copied
+CHUNK_SIZE = 1 << 16
+
+
+def resolve_served_path(
+    root: Optional[str],
+    path: str) -> Optional[str]:
+    """
+    Real path of the file 'path' (relative to 'root' unless absolute) sent with
+    path=; None when path= is disabled (no root) or the path, once its symbolic
+    links and '..' are resolved, is outside of 'root'
+    """
+    if root is None:
+        return None
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+def _init_server_worker():
+    """
+    Worker processes leave Ctrl-C to the server, which closes the pool
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class WatermarkRemovalService:
+    """
+    Pool of warm worker processes shared by the server threads.
+
+    At most 'workers + queue_size' requests are admitted at the same time;
+    the others are refused at once, so a burst of requests never piles up
+    unbounded bodies on disk. Each worker process is replaced after
+    'max_jobs_per_worker' PDFs, which bounds the memory kept by PyPDF.
+    The PDFs sent with path= are read from below 'root' only (see resolve_served_path).
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        timeout: Optional[float],
+        max_jobs_per_worker: Optional[int],
+        root: Optional[str] = None):
+
+        self.workers = workers
+        self.root = root
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.pool = multiprocessing.Pool(workers, initializer=_init_server_worker,
+                                         maxtasksperchild=max_jobs_per_worker)
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.processed = 0
+
+    def admit(self) -> bool:
+        """
+        Take a slot for a new request; False when the queue is full
+        """
+        if not self.slots.acquire(blocking=False):
+            return False
+        with self.lock:
+            self.in_flight += 1
+        return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+            self.processed += 1
+        self.slots.release()
+
+    def run(
+        self,
+        inputFile: str,
+        outputFile: str,
+        aggressive: int) -> Dict:
+        """
+        Remove the watermarks of 'inputFile' on a worker process.
+        The worker stops the PDF after 'timeout' seconds; the result is given
+        up a little later in case the worker process itself died.
+        """
+        job = self.pool.apply_async(remove_watermarks_from_file,
+                                    (inputFile, outputFile, aggressive, self.timeout))
+        try:
+            return job.get(self.timeout + 5 if self.timeout else None)
+        except multiprocessing.TimeoutError:
+            return {'input': inputFile, 'output': outputFile, 'status': 'timeout',
+                    'mode': aggressive, 'fallback': False, 'clean': False, 'elapsed': None}
+
+    def status(self) -> Dict:
+        with self.lock:
+            return {'workers': self.workers, 'queue_size': self.queue_size,
+                    'in_flight': self.in_flight, 'processed': self.processed}
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+class WatermarkRemovalHandler(BaseHTTPRequestHandler):
+    """
+    POST /remove?mode=2            body: the PDF, answered with the cleaned PDF
+    POST /remove?mode=2&path=FILE  cleans a PDF below the server --root, same answer
+    GET  /status                   load of the worker pool, as JSON
+
+    Request bodies may be sent with Content-Length or chunked; both bodies are
+    copied through temporary files in CHUNK_SIZE pieces.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'PDFSolvent'
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def send_json(self, code: int, content: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(content).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self, output) -> int:
+        """
+        Copy the request body to the file 'output'; returns its size
+        """
+        size = 0
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            while True:
+                chunk_size = int(self.rfile.readline().split(b';', 1)[0], 16)
+                if chunk_size == 0:
+                    # Trailer headers end with an empty line
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return size
+                remaining = chunk_size
+                while remaining:
+                    data = self.rfile.read(min(remaining, CHUNK_SIZE))
+                    if not data:
+                        raise ConnectionError("request body ended early")
+                    output.write(data)
+                    remaining -= len(data)
+                size += chunk_size
+                self.rfile.readline()
+
+        remaining = int(self.headers.get('Content-Length', 0))
+        while remaining:
+            data = self.rfile.read(min(remaining, CHUNK_SIZE))
+            if not data:
+                raise ConnectionError("request body ended early")
+            output.write(data)
+            remaining -= len(data)
+            size += len(data)
+        return size
+
+    def discard_body(self):
+        """
+        Drop the request body, so the connection can still be reused
+        """
+        with open(os.devnull, 'wb') as devnull:
+            self.read_body(devnull)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/status':
+            self.send_json(404, {'error': 'not found'})
+            return
+        self.send_json(200, self.server.service.status())
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/remove':
+            self.send_json(404, {'error': 'not found'})
+            return
+
+        query = parse_qs(url.query)
+        try:
+            aggressive = int(query.get('mode', ['2'])[0])
+            if aggressive not in (1, 2, 3):
+                raise ValueError()
+        except ValueError:
+            self.send_json(400, {'error': 'mode must be 1, 2 or 3'})
+            return
+
+        service = self.server.service
+        if not service.admit():
+            self.discard_body()
+            self.send_json(503, {'error': 'queue full'}, {'Retry-After': '1'})
+            return
+
+        workdir = tempfile.mkdtemp(prefix='pdfsolvent-')
+        try:
+            outputFile = os.path.join(workdir, 'output.pdf')
+            if 'path' in query:
+                self.discard_body()
+                inputFile = resolve_served_path(service.root, query['path'][0])
+                if inputFile is None:
+                    self.send_json(403, {'error': 'path is outside of the server root' if service.root
+                                         else 'path is disabled, start the server with --root'})
+                    return
+            else:
+                inputFile = os.path.join(workdir, 'input.pdf')
+                with open(inputFile, 'wb') as f:
+                    if self.read_body(f) == 0:
+                        self.send_json(400, {'error': 'empty body, send a PDF or a path'})
+                        return
+
+            result = service.run(inputFile, outputFile, aggressive)
+            # The paths are the server temporary files
+            report = {key: value for key, value in result.items() if key not in ('input', 'output')}
+            if result['status'] == 'timeout':
+                self.send_json(504, report)
+                return
+            if result['status'] != 'done':
+                self.send_json(422, report)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(os.path.getsize(outputFile)))
+            self.send_header('X-PDFSolvent-Backend', str(result.get('backend')))
+            self.send_header('X-PDFSolvent-Fallback', str(result['fallback']).lower())
+            self.send_header('X-PDFSolvent-Elapsed', str(result['elapsed']))
+            self.end_headers()
+            with open(outputFile, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+        finally:
+            service.release()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    """
+    HTTP server listening on a Unix socket
+    """
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = self.server_address
+        self.server_port = 0
+
+
+def serve(
+    host: str = '127.0.0.1',
+    port: int = 8765,
+    unix_socket: Optional[str] = None,
+    workers: Optional[int] = None,
+    queue_size: int = 16,
+    timeout: Optional[float] = 120,
+    max_jobs_per_worker: Optional[int] = 100,
+    root: Optional[str] = None):
+    """
+    Serve the watermark removal over HTTP until interrupted.
+
+    Args:
+        host, port: TCP address to listen on (ignored with unix_socket)
+        unix_socket: Path of a Unix socket to listen on instead
+        workers: Number of worker processes (default: number of CPUs)
+        queue_size: Number of requests waiting for a worker before new ones are refused (503)
+        timeout: Maximum number of seconds spent on a single PDF (504 when exceeded)
+        max_jobs_per_worker: PDFs processed by a worker process before it is replaced
+        root: Directory of the PDFs that can be sent with path= (disabled when None)
+    """
+
+    workers = workers or os.cpu_count() or 1
+    service = WatermarkRemovalService(workers, queue_size, timeout, max_jobs_per_worker, root)
+
+    if unix_socket:
+        httpd = UnixHTTPServer(unix_socket, WatermarkRemovalHandler)
+    else:
+        httpd = ThreadingHTTPServer((host, port), WatermarkRemovalHandler)
+    httpd.daemon_threads = True
+    httpd.service = service
+
+    print("Serving on {}".format(unix_socket or "http://{}:{}".format(*httpd.server_address[:2])),
+          flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='PDFSolvent serve',
+                                     description="Serves the 'RETRACTED' watermark removal over HTTP.")
+    parser.add_argument("--host", type=str, default='127.0.0.1',
+                        help="Address to listen on.")
+    parser.add_argument("--port", "-p", type=int, default=8765,
+                        help="Port to listen on.")
+    parser.add_argument("--unix", type=str, default=None,
+                        help="Listen on this Unix socket instead of TCP.")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="Number of worker processes (default: number of CPUs).")
+    parser.add_argument("--queue", "-q", type=int, default=16,
+                        help="Requests waiting for a worker before new ones are refused.")
+    parser.add_argument("--timeout", "-t", type=float, default=120,
+                        help="Maximum number of seconds spent on a single PDF.")
+    parser.add_argument("--max-jobs-per-worker", type=int, default=100,
+                        help="PDFs processed by a worker process before it is replaced.")
+    parser.add_argument("--root", type=str, default=None,
+                        help="Directory of the PDFs that requests can send by path= (disabled without it).")
+    args = parser.parse_args(argv)
+
+    serve(args.host, args.port, args.unix, args.workers, args.queue,
+          args.timeout, args.max_jobs_per_worker, args.root)
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Micro-benchmark of the q/Q block finding and filtering passes.
+
+Builds synthetic pages with a growing number of vector operations, half of
+them inside q...Q blocks that use a watermark ExtGState, and times
+remove_watermark_from_page and remove_graphical_watermarks_from_contents
+on the already parsed content stream. With linear scaling the time per
+operation stays flat as the operation count grows.
+
+    $ python benchmarks/bench_block_filtering.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'PDFSolvent'))
+
+from PyPDF4.generic import DecodedStreamObject, NameObject, RectangleObject
+from PyPDF4.pdf import PageObject
+
+from PDFSolvent import get_page_content_stream, remove_graphical_watermarks_from_contents
+from PDFSolvent import remove_watermark_from_page
+
+# 8 operations per block
+WATERMARK_BLOCK = b"q\n1 0 0 1 10 10 cm\n/GS0 gs\n0 0 m\n10 10 l\n20 0 l\nh\nQ\n"
+PLAIN_BLOCK = b"q\n1 0 0 1 10 10 cm\n/GS1 gs\n0 0 m\n10 10 l\n20 0 l\nf\nQ\n"
+
+
+def synthetic_page(num_operations: int) -> PageObject:
+    """
+    Page whose content stream has about 'num_operations' operations
+    """
+    blocks = num_operations // 16
+    stream = DecodedStreamObject()
+    stream.setData((WATERMARK_BLOCK + PLAIN_BLOCK) * blocks)
+
+    page = PageObject()
+    page[NameObject('/Type')] = NameObject('/Page')
+    page[NameObject('/MediaBox')] = RectangleObject([0, 0, 612, 792])
+    page[NameObject('/Contents')] = stream
+    return page
+
+
+def time_filtering(num_operations: int, repeat: int = 3) -> float:
+    """
+    Best time (seconds) of the filtering passes over a parsed page
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        page = synthetic_page(num_operations)
+        get_page_content_stream(page, None)
+
+        start = time.perf_counter()
+        page, _ = remove_watermark_from_page(page, None, ['/GS0'], aggressive=2)
+        remove_graphical_watermarks_from_contents(page, None)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print("{:>10} {:>12} {:>14}".format("operations", "time (ms)", "ns/operation"))
+    for num_operations in [2 ** i for i in range(10, 18)]:
+        elapsed = time_filtering(num_operations)
+        print("{:>10} {:>12.2f} {:>14.1f}".format(num_operations, elapsed * 1e3,
+                                                 elapsed * 1e9 / num_operations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark of the parsed representation of the page content streams.
+
+Parses the pages of the test/ PDFs and of synthetic vector-dense PDFs
+(benchmarks/synthetic_pdf.py) into PyPDF ContentStream lists of operations,
+as the removal passes read them before, and into CompactContentStream, and
+reports the memory held per page (tracemalloc peak of the parsing) and the
+time of the parsing and of the removal passes of mode 3 (watermark blocks,
+'RETRACTED' texts, graphical operations) on each representation.
+
+    $ python benchmarks/bench_content_store.py
+"""
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCH_DIR, os.path.join(BENCH_DIR, '..', 'PDFSolvent')]
+
+from io import BytesIO
+
+from PyPDF4 import PdfFileReader
+from PyPDF4.generic import NameObject, TextStringObject
+from PyPDF4.pdf import ContentStream
+
+from PDFSolvent import GRAPHICAL_OPERATORS, OP_Q, OP_q, CompactContentStream, find_retracted_watermarks
+from PDFSolvent import get_page_content_stream, page_font_decoders, remove_graphical_watermarks_from_contents
+from PDFSolvent import remove_retracted_watermarks_letters, remove_watermark_from_page
+from synthetic_pdf import synthetic_pdf
+
+TEST_DIR = os.path.join(BENCH_DIR, '..', 'test')
+WATERMARKS = ['/Fm0', '/GS0']
+
+
+def list_passes(page, content: ContentStream):
+    """
+    Mode 3 passes over the lists of operations, copied into new lists
+    as they were before CompactContentStream (without the image check)
+    """
+    operations = content.operations
+    kept, block = [], None
+    for operation in operations:
+        operands, operator = operation
+        if operator == OP_q:
+            kept.extend(block or [])
+            block = [operation]
+        elif block is not None:
+            block.append(operation)
+            if operator == OP_Q:
+                block = None
+        else:
+            kept.append(operation)
+    kept.extend(block or [])
+    for index in find_retracted_watermarks(kept, page_font_decoders(page, content.pdf)):
+        kept[index] = (TextStringObject(''), kept[index][1])
+    content.operations = [operation for operation in kept if operation[1] not in GRAPHICAL_OPERATORS]
+
+
+def compact_passes(page, content: CompactContentStream):
+    page, content = remove_watermark_from_page(page, None, WATERMARKS, 3)
+    remove_retracted_watermarks_letters(page, content)
+    remove_graphical_watermarks_from_contents(page, None)
+
+
+def measure(pages, contents, parse, passes):
+    """
+    Peak memory (bytes) held by parsing a page, the largest among the pages
+    (measured apart, tracemalloc slows the parsing down), and the seconds of
+    the parsing and of the passes
+    """
+    peak = 0
+    parse_time = passes_time = 0.0
+    for page, original in zip(pages, contents):
+        page[NameObject('/Contents')] = original
+        start = time.perf_counter()
+        content = parse(page)
+        parse_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        passes(page, content)
+        passes_time += time.perf_counter() - start
+
+        page[NameObject('/Contents')] = original
+        tracemalloc.start()
+        content = parse(page)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        del content
+        page[NameObject('/Contents')] = original
+    return peak, parse_time, passes_time
+
+
+def main():
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(TEST_DIR, '*.pdf'))):
+        with open(path, 'rb') as f:
+            corpus.append((os.path.basename(path), f.read()))
+    corpus.append(('synthetic dense', synthetic_pdf(4, 50000, ('fm', 'extgstate', 'retracted'), (0, 0))))
+
+    print("{:<36} {:>8} {:>18} {:>18} {:>18}".format(
+        "PDF", "ops", "peak MB (list/cmp)", "parse s (list/cmp)", "passes s (list/cmp)"))
+    for name, data in corpus:
+        source = PdfFileReader(BytesIO(data))
+        pages = [source.getPage(number) for number in range(source.getNumPages())]
+        pages = [page for page in pages if page.get('/Contents') is not None]
+        contents = [page.raw_get('/Contents') for page in pages]
+
+        operations = sum(len(CompactContentStream(content, source).codes) for content in contents)
+        results = [measure(pages, contents, lambda page: ContentStream(page['/Contents'], source), list_passes),
+                   measure(pages, contents, lambda page: get_page_content_stream(page, source), compact_passes)]
+
+        (list_peak, list_parse, list_passes_time), (peak, parse_time, passes_time) = results
+        print("{:<36} {:>8} {:>18} {:>18} {:>18}".format(
+            name[:36], operations,
+            "{:.2f} / {:.2f}".format(list_peak / 2 ** 20, peak / 2 ** 20),
+            "{:.3f} / {:.3f}".format(list_parse, parse_time),
+            "{:.3f} / {:.3f}".format(list_passes_time, passes_time)))
+
+
+if __name__ == "__main__":
+    main()
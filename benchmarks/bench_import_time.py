@@ -0,0 +1,82 @@
+"""
+Benchmark of the startup time of PDFSolvent.
+
+Times fresh interpreters importing PDFSolvent, against the same import
+followed by the modules that were imported eagerly before they were
+imported on first use (PyMuPDF, asyncio and the process pools), and the
+command line on the --help message and on a single-page synthetic PDF
+(benchmarks/synthetic_pdf.py). The time of an empty interpreter is
+reported apart and subtracted from the others.
+
+    $ python benchmarks/bench_import_time.py [--repeat 10]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.join(BENCH_DIR, '..', 'PDFSolvent')
+sys.path[:0] = [BENCH_DIR]
+
+from synthetic_pdf import synthetic_pdf
+
+# Modules that PDFSolvent imported when it was loaded
+EAGER_MODULES = ('fitz', 'asyncio', 'concurrent.futures.process')
+
+
+def best_time(command, repeat: int) -> float:
+    """
+    Best wall time (seconds) of 'repeat' runs of 'command'
+    """
+    env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup time of PDFSolvent.")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="Runs of each command; the best time is kept.")
+    args = parser.parse_args()
+
+    python = [sys.executable, '-W', 'ignore']
+    with tempfile.TemporaryDirectory() as directory:
+        pdf = os.path.join(directory, 'page.pdf')
+        with open(pdf, 'wb') as f:
+            f.write(synthetic_pdf(1, 200, ('fm', 'retracted'), (0, 0)))
+
+        # Compile the modules first, so no run pays for it
+        subprocess.run([sys.executable, '-m', 'compileall', '-q', PACKAGE_DIR], check=True)
+
+        interpreter = best_time(python + ['-c', 'pass'], args.repeat)
+        commands = [
+            ("import PDFSolvent", python + ['-c', 'import PDFSolvent']),
+            ("import PDFSolvent + eager modules",
+             python + ['-c', 'import PDFSolvent, ' + ', '.join(EAGER_MODULES)]),
+            ("PDFSolvent --help", python + [PACKAGE_DIR, '--help']),
+            ("PDFSolvent single page",
+             python + [PACKAGE_DIR, '-i', pdf, '-o', os.path.join(directory, 'out.pdf')]),
+        ]
+
+        print("{:<36} {:>10}".format("command", "ms"))
+        print("{:<36} {:>10.1f}".format("python -c pass", interpreter * 1e3))
+        times = {}
+        for name, command in commands:
+            times[name] = best_time(command, args.repeat) - interpreter
+            print("{:<36} {:>10.1f}".format(name, times[name] * 1e3), flush=True)
+
+    lazy, eager = times["import PDFSolvent"], times["import PDFSolvent + eager modules"]
+    print("Startup saved by the lazy imports: {:.1f} ms ({:.1f}x faster import)".format(
+        (eager - lazy) * 1e3, eager / lazy))
+
+
+if __name__ == "__main__":
+    main()
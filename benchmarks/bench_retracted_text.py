@@ -0,0 +1,129 @@
+"""
+Benchmark of the 'RETRACTED' text pass on parsed content streams.
+
+Times remove_retracted_watermarks_letters against the previous implementation,
+which built a string for every TJ and Tj operation (the repr of the TJ array)
+and looked for the term in it, on the pages of the test/ PDFs and of synthetic
+text-dense PDFs (benchmarks/synthetic_pdf.py). The previous pass runs on a copy
+of the PyPDF ContentStream operations, the current one on CompactContentStream,
+so its time includes the parsing of the operands of the text operations, that
+the ContentStream had parsed beforehand; the time per operation and the number
+of blanked operations are reported.
+
+    $ python benchmarks/bench_retracted_text.py
+"""
+import glob
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCH_DIR, os.path.join(BENCH_DIR, '..', 'PDFSolvent')]
+
+from io import BytesIO
+
+from PyPDF4 import PdfFileReader
+from PyPDF4.generic import TextStringObject
+from PyPDF4.pdf import ContentStream
+
+from PDFSolvent import TEXT_SHOWING_OPERATORS, CompactContentStream, remove_retracted_watermarks_letters
+from synthetic_pdf import synthetic_pdf
+
+TEST_DIR = os.path.join(BENCH_DIR, '..', 'test')
+
+
+def previous_remove_retracted_watermarks_letters(page, content):
+    """
+    remove_retracted_watermarks_letters before the block-level text matching
+    """
+    operations = []
+    for operands, operator in content.operations:
+        if operator in TEXT_SHOWING_OPERATORS:
+            text = operands
+            if text and isinstance(text[0], list):
+                text = " ".join([str(i) for i in text])
+            elif text and isinstance(text[0], str):
+                text = text[0]
+            else:
+                text = None
+            if text is not None and ("retracted" in text.lower()) and len(text) < 30:
+                operands = TextStringObject('')
+        operations.append((operands, operator))
+    content.operations = operations
+    return page
+
+
+def time_previous_pass(pages, repeat: int = 5):
+    """
+    Best time (seconds) of the previous pass over the pages, and the number of blanked operations
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        elapsed = 0.0
+        for page, content, operations, _ in pages:
+            content.operations = list(operations)
+            start = time.perf_counter()
+            previous_remove_retracted_watermarks_letters(page, content)
+            elapsed += time.perf_counter() - start
+        best = min(best, elapsed)
+
+    blanked = sum(1 for _, content, operations, _ in pages
+                  for (before, _), (after, _) in zip(operations, content.operations)
+                  if before is not after)
+    return best, blanked
+
+
+def time_pass(pages, repeat: int = 5):
+    """
+    Best time (seconds) of remove_retracted_watermarks_letters over the pages,
+    and the number of blanked operations
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        elapsed = 0.0
+        for page, _, _, content in pages:
+            content.replaced = {}
+            start = time.perf_counter()
+            remove_retracted_watermarks_letters(page, content)
+            elapsed += time.perf_counter() - start
+        best = min(best, elapsed)
+    return best, sum(len(content.replaced) for _, _, _, content in pages)
+
+
+def parsed_pages(data: bytes):
+    """
+    (page, ContentStream, its operations, CompactContentStream) of each page with contents
+    """
+    source = PdfFileReader(BytesIO(data))
+    pages = []
+    for number in range(source.getNumPages()):
+        page = source.getPage(number)
+        if page.get("/Contents") is not None:
+            content = ContentStream(page["/Contents"], source)
+            pages.append((page, content, list(content.operations),
+                          CompactContentStream(page["/Contents"], source)))
+    return pages
+
+
+def main():
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(TEST_DIR, '*.pdf'))):
+        with open(path, 'rb') as f:
+            corpus.append((os.path.basename(path), f.read()))
+    corpus.append(('synthetic retracted', synthetic_pdf(10, 20000, ('retracted',), (0, 0))))
+    corpus.append(('synthetic clean', synthetic_pdf(10, 20000, (), (0, 0))))
+
+    print("{:<36} {:>8} {:>16} {:>16} {:>8} {:>16}".format(
+        "PDF", "ops", "previous (us/op)", "current (us/op)", "speedup", "blanked (p / c)"))
+    for name, data in corpus:
+        pages = parsed_pages(data)
+        operations = sum(len(content.codes) for _, _, _, content in pages)
+        previous, previous_blanked = time_previous_pass(pages)
+        current, current_blanked = time_pass(pages)
+        print("{:<36} {:>8} {:>16.3f} {:>16.3f} {:>7.1f}x {:>16}".format(
+            name[:36], operations, previous / operations * 1e6, current / operations * 1e6,
+            previous / current, "{} / {}".format(previous_blanked, current_blanked)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Reproducible benchmark suite of remove_watermarks.
+
+Runs modes 1, 2 and 3 and the PyMuPDF path over a corpus of synthetic PDFs
+(benchmarks/synthetic_pdf.py, generated in memory from fixed seeds) and,
+with --test-pdfs, over the test/ PDFs. Each case runs in a fresh forked
+process, so its peak memory is not hidden by the previous cases. For each
+case the best wall time of --repeat runs, the pages per second and the peak
+RSS above the process baseline are reported and compared with a stored
+baseline; the exit status is 1 when a case is slower or bigger than the
+baseline by more than --tolerance.
+
+Offline, CPU only, Linux (the peak memory is 0 where resource is missing).
+
+    $ python benchmarks/run_benchmarks.py
+    $ python benchmarks/run_benchmarks.py --quick --update-baseline
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+from typing import Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCH_DIR, os.path.join(BENCH_DIR, '..', 'PDFSolvent')]
+
+from PDFSolvent import peak_rss, remove_watermarks
+from synthetic_pdf import STYLES, synthetic_pdf
+
+TEST_DIR = os.path.join(BENCH_DIR, '..', 'test')
+BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+# name: pages, operations per page, watermark styles, image size
+CASES = {
+    'fm':         (20, 2000, ('fm',), (256, 256)),
+    'x':          (20, 2000, ('x',), (256, 256)),
+    'extgstate':  (20, 2000, ('extgstate',), (256, 256)),
+    'artifact':   (20, 2000, ('artifact',), (256, 256)),
+    'retracted':  (20, 2000, ('retracted',), (256, 256)),
+    'clean':      (20, 2000, (), (256, 256)),
+    'images':     (10, 200, STYLES, (1024, 1024)),
+    'many-pages': (200, 300, STYLES, (64, 64)),
+    'dense':      (5, 50000, STYLES, (256, 256)),
+}
+
+# variant: remove_watermarks options
+VARIANTS = {
+    'mode1': {'aggressive': 1},
+    'mode2': {'aggressive': 2},
+    'mode3': {'aggressive': 3},
+    'fitz':  {'aggressive': 2, 'backend': 'fitz'},
+}
+
+
+def current_rss() -> int:
+    """
+    Resident set size of the process now, in bytes (0 where unknown)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def corpus(quick: bool, test_pdfs: bool) -> Dict[str, Tuple[bytes, int]]:
+    """
+    PDFs of the suite: name -> (data, number of pages)
+    """
+    pdfs = {}
+    for name, (pages, operations, styles, image_size) in CASES.items():
+        if quick:
+            pages, operations = max(1, pages // 5), max(100, operations // 5)
+        pdfs[name] = (synthetic_pdf(pages, operations, styles, image_size), pages)
+
+    if test_pdfs:
+        import fitz
+        for path in sorted(glob.glob(os.path.join(TEST_DIR, '*.pdf'))):
+            with open(path, 'rb') as f:
+                data = f.read()
+            pdfs['test/' + os.path.basename(path)] = (data, len(fitz.open("pdf", data)))
+    return pdfs
+
+
+def _run_case(data: bytes, options: Dict, repeat: int, connection):
+    """
+    Forked process of one case: best time of 'repeat' runs and peak RSS growth
+    """
+    start_rss = current_rss()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        remove_watermarks(data, None, **options)
+        best = min(best, time.perf_counter() - start)
+    connection.send((best, max(0, peak_rss() - start_rss)))
+    connection.close()
+
+
+def run_case(data: bytes, options: Dict, repeat: int) -> Tuple[float, int]:
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_case, args=(data, options, repeat, sender))
+    process.start()
+    sender.close()
+    try:
+        return receiver.recv()
+    except EOFError:
+        process.join()
+        raise RuntimeError("benchmark process died (exit code {})".format(process.exitcode))
+    finally:
+        process.join()
+
+
+def compare(
+    results: Dict[str, Dict],
+    baseline: Dict[str, Dict],
+    tolerance: float) -> List[str]:
+    """
+    Cases slower or bigger than the baseline by more than 'tolerance'
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result['seconds'] > previous['seconds'] * (1 + tolerance):
+            regressions.append("{}: {:.1f} ms, baseline {:.1f} ms".format(
+                name, result['seconds'] * 1e3, previous['seconds'] * 1e3))
+        # Below 4 MB the peak RSS is mostly allocator noise
+        if (result['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + tolerance)
+                and result['peak_rss_mb'] - previous['peak_rss_mb'] > 4):
+            regressions.append("{}: peak {:.1f} MB, baseline {:.1f} MB".format(
+                name, result['peak_rss_mb'], previous['peak_rss_mb']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark remove_watermarks on a synthetic corpus.")
+    parser.add_argument("--quick", action='store_true',
+                        help="Smaller PDFs (5x fewer pages and operations).")
+    parser.add_argument("--test-pdfs", action='store_true',
+                        help="Also benchmark the PDFs of the test/ directory.")
+    parser.add_argument("--cases", nargs='*', default=None,
+                        help="Only these cases (default: all).")
+    parser.add_argument("--variants", nargs='*', default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs of each case; the best time is kept.")
+    parser.add_argument("--baseline", type=str, default=BASELINE,
+                        help="Baseline JSON file to compare with.")
+    parser.add_argument("--update-baseline", action='store_true',
+                        help="Write the results to the baseline file instead of comparing.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown or memory growth over the baseline (0.25 = 25%%).")
+    parser.add_argument("--json", type=str, default=None,
+                        help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    pdfs = corpus(args.quick, args.test_pdfs)
+    if args.cases is not None:
+        pdfs = {name: pdf for name, pdf in pdfs.items() if name in args.cases}
+
+    results = {}
+    print("{:<44} {:>6} {:>10} {:>10} {:>10}".format("case", "pages", "ms", "pages/s", "peak MB"))
+    for name, (data, pages) in pdfs.items():
+        for variant in args.variants:
+            seconds, peak = run_case(data, VARIANTS[variant], args.repeat)
+            key = "{}/{}".format(name, variant)
+            results[key] = {'pages': pages, 'bytes': len(data), 'seconds': seconds,
+                            'pages_per_second': pages / seconds, 'peak_rss_mb': peak / 2 ** 20}
+            print("{:<44} {:>6} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                key, pages, seconds * 1e3, pages / seconds, peak / 2 ** 20), flush=True)
+
+    document = {
+        'quick': args.quick,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(document, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print("Baseline written to {}".format(args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline at {} (create it with --update-baseline)".format(args.baseline))
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('quick') != args.quick:
+        print("Baseline was recorded {} --quick, not compared".format(
+            'with' if baseline.get('quick') else 'without'))
+        return 0
+
+    regressions = compare(results, baseline['results'], args.tolerance)
+    for regression in regressions:
+        print("REGRESSION " + regression)
+    if not regressions:
+        print("No regression over the baseline (tolerance {:.0%})".format(args.tolerance))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
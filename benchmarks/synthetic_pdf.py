@@ -0,0 +1,193 @@
+"""
+Generator of synthetic watermarked PDFs for the benchmarks.
+
+The PDFs are written byte by byte (no dependency) and are reproducible: the
+same arguments always give the same file. Every page has text and path
+operations in q...Q blocks, up to about 'operations' operations, an image
+of 'image_size' pixels, and one block per watermark style:
+
+    fm         /Fm0 form XObject with /PieceInfo marking it as a watermark
+    x          /X1 form XObject scaled over the entire page
+    extgstate  q...Q block drawn with the /GS0 ExtGState shared by all pages
+    artifact   /Artifact <</Subtype /Watermark>> BDC ... EMC marked content
+    retracted  RETRACTED shown by a Tj operation
+
+    $ python benchmarks/synthetic_pdf.py out.pdf --pages 20 --operations 5000 --styles fm retracted
+"""
+import argparse
+import random
+import zlib
+
+from typing import List, Sequence, Tuple
+
+STYLES = ('fm', 'x', 'extgstate', 'artifact', 'retracted')
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+
+WATERMARK_TEXT = b"BT /F1 72 Tf 0.8 g 1 0 0 1 120 380 Tm (RETRACTED) Tj ET"
+
+WATERMARK_BLOCKS = {
+    'fm': b"q 1 0 0 1 0 0 cm /Fm0 Do Q\n",
+    'x': b"q %d 0 0 %d 0 0 cm /X1 Do Q\n" % (PAGE_WIDTH, PAGE_HEIGHT),
+    'extgstate': b"q /GS0 gs 0.9 g 50 50 m 562 742 l 562 50 l h f Q\n",
+    'artifact': (b"/Artifact <</Subtype /Watermark /Type /Pagination>> BDC q "
+                 + WATERMARK_TEXT + b" Q EMC\n"),
+    'retracted': b"q " + WATERMARK_TEXT + b" Q\n",
+}
+
+WORDS = (b"lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+         b"tempor incididunt ut labore et dolore magna aliqua").split()
+
+
+def page_content(
+    rng: random.Random,
+    operations: int,
+    styles: Sequence[str],
+    image: bool) -> bytes:
+    """
+    Content stream of a page with about 'operations' operations
+    """
+    parts = [WATERMARK_BLOCKS[style] for style in styles]
+    if image:
+        parts.append(b"q 300 0 0 200 150 300 cm /Im0 Do Q\n")
+
+    count = sum(part.count(b' ') for part in parts) // 3
+    line = 0
+    while count < operations:
+        if line % 4 == 3:
+            # 9 operations
+            x, y = rng.randrange(50, 550), rng.randrange(50, 740)
+            parts.append(b"q 0.5 w %d %d m %d %d l %d %d l S Q\n"
+                         % (x, y, x + 20, y + 10, x + 40, y))
+            count += 9
+        else:
+            # 8 operations
+            text = b" ".join(rng.choice(WORDS) for _ in range(8))
+            parts.append(b"q BT /F1 10 Tf 1 0 0 1 72 %d Tm (%s) Tj ET Q\n"
+                         % (740 - 12 * (line % 58), text))
+            count += 8
+        line += 1
+    return b"".join(parts)
+
+
+def stream_object(dictionary: bytes, data: bytes, compress: bool = True) -> bytes:
+    if compress:
+        data = zlib.compress(data)
+        dictionary += b" /Filter /FlateDecode"
+    return b"<<%s /Length %d>>\nstream\n%s\nendstream" % (dictionary, len(data), data)
+
+
+def pdf_file(objects: Sequence[bytes], root: int) -> bytes:
+    """
+    PDF of the 'objects' bytes, numbered from 1, whose catalog is the object 'root'
+    """
+    pdf = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        pdf += b"%010d 00000 n \n" % offset
+    pdf += b"trailer\n<</Size %d /Root %d 0 R>>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, root, xref)
+    return bytes(pdf)
+
+
+def synthetic_pdf(
+    pages: int = 10,
+    operations: int = 1000,
+    styles: Sequence[str] = STYLES,
+    image_size: Tuple[int, int] = (256, 256),
+    seed: int = 0) -> bytes:
+    """
+    Build a synthetic PDF.
+
+    Args:
+        pages: Number of pages
+        operations: Approximate number of content stream operations per page
+        styles: Watermark styles drawn on every page (see STYLES)
+        image_size: Width and height of the RGB image drawn on every page
+                    ((0, 0) for no image)
+        seed: Seed of the text, path and image generator
+    Return:
+        The PDF bytes
+    """
+    unknown = set(styles) - set(STYLES)
+    if unknown:
+        raise ValueError("unknown watermark styles: {}".format(", ".join(sorted(unknown))))
+
+    rng = random.Random(seed)
+    objects: List[bytes] = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    catalog = add(b"")  # filled once the page tree is known
+    page_tree = add(b"")
+    font = add(b"<</Type /Font /Subtype /Type1 /BaseFont /Helvetica>>")
+
+    xobjects = []
+    if 'fm' in styles:
+        fm = add(stream_object(
+            b"/Type /XObject /Subtype /Form /BBox [0 0 %d %d] /Resources <</Font <</F1 %d 0 R>>>>"
+            b" /PieceInfo <</ADBE_CompoundType <</Private /Watermark>>>>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, font), WATERMARK_TEXT))
+        xobjects.append(b"/Fm0 %d 0 R" % fm)
+    if 'x' in styles:
+        x = add(stream_object(
+            b"/Type /XObject /Subtype /Form /BBox [0 0 1 1] /Resources <</Font <</F1 %d 0 R>>>>"
+            % font, b"0.9 g 0 0 1 1 re f"))
+        xobjects.append(b"/X1 %d 0 R" % x)
+    width, height = image_size
+    if width and height:
+        pixels = bytes(rng.getrandbits(8) for _ in range(width * height * 3))
+        image = add(stream_object(
+            b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB"
+            b" /BitsPerComponent 8" % (width, height), pixels))
+        xobjects.append(b"/Im0 %d 0 R" % image)
+
+    resources = b"/Font <</F1 %d 0 R>>" % font
+    if xobjects:
+        resources += b" /XObject <<%s>>" % b" ".join(xobjects)
+    if 'extgstate' in styles:
+        gs = add(b"<</Type /ExtGState /ca 0.5 /CA 0.5>>")
+        resources += b" /ExtGState <</GS0 %d 0 R>>" % gs
+
+    kids = []
+    for _ in range(pages):
+        content = add(stream_object(b"", page_content(rng, operations, styles, bool(width and height))))
+        kids.append(add(b"<</Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources <<%s>>"
+                        b" /Contents %d 0 R>>"
+                        % (page_tree, PAGE_WIDTH, PAGE_HEIGHT, resources, content)))
+
+    objects[catalog - 1] = b"<</Type /Catalog /Pages %d 0 R>>" % page_tree
+    objects[page_tree - 1] = b"<</Type /Pages /Count %d /Kids [%s]>>" % (
+        pages, b" ".join(b"%d 0 R" % kid for kid in kids))
+
+    return pdf_file(objects, catalog)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic watermarked PDF.")
+    parser.add_argument("output", type=str, help="Path of the PDF to write.")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--operations", type=int, default=1000,
+                        help="Approximate number of operations per page.")
+    parser.add_argument("--styles", nargs='*', default=list(STYLES), choices=STYLES)
+    parser.add_argument("--image-size", type=int, nargs=2, default=(256, 256),
+                        metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.output, 'wb') as f:
+        f.write(synthetic_pdf(args.pages, args.operations, args.styles,
+                              tuple(args.image_size), args.seed))
+
+
+if __name__ == "__main__":
+    main()
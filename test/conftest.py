@@ -0,0 +1,6 @@
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+# PDFSolvent and its sibling modules, and the synthetic PDF generator of the benchmarks
+sys.path[:0] = [os.path.join(TEST_DIR, '..', 'PDFSolvent'), os.path.join(TEST_DIR, '..', 'benchmarks')]
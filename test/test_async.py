@@ -0,0 +1,21 @@
+"""
+Asyncio API
+"""
+import asyncio
+import typing
+
+from PDFSolvent import remove_watermarks, remove_watermarks_async
+from synthetic_pdf import synthetic_pdf
+
+
+def test_type_hints_resolve():
+    hints = typing.get_type_hints(remove_watermarks_async)
+    assert 'executor' in hints and 'semaphore' in hints
+
+
+def test_same_output_as_remove_watermarks():
+    data = synthetic_pdf(2, 200, ('fm',), (0, 0))
+    report = {}
+    output = asyncio.run(remove_watermarks_async(data, 1, report=report))
+    assert output == remove_watermarks(data, None, 1)['output']
+    assert report['watermarks'] == ['/Fm0']
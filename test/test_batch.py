@@ -0,0 +1,35 @@
+"""
+Batch sources: the output name of each PDF
+"""
+import os
+
+import pytest
+
+from batch import batch_remove_watermarks, collect_input_pdfs
+
+
+def write_pdfs(root, names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'%PDF-1.4')
+
+
+def test_glob_and_manifest_keep_relative_paths(tmp_path):
+    write_pdfs(tmp_path, ['papers/a/x.pdf', 'papers/b/x.pdf'])
+    expected = [os.path.join('a', 'x.pdf'), os.path.join('b', 'x.pdf')]
+
+    pdfs = collect_input_pdfs(str(tmp_path / 'papers' / '**' / '*.pdf'))
+    assert [name for _, name in pdfs] == expected
+
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text("# mirrors\n{}\n{}\n".format(*(path for path, _ in pdfs)))
+    assert [name for _, name in collect_input_pdfs(str(manifest))] == expected
+
+
+def test_colliding_outputs_are_rejected(tmp_path):
+    write_pdfs(tmp_path, ['a/x.pdf', 'b/x.pdf'])
+
+    with pytest.raises(ValueError):
+        batch_remove_watermarks([str(tmp_path / 'a'), str(tmp_path / 'b')], str(tmp_path / 'out'), 2)
+    assert not (tmp_path / 'out').exists()
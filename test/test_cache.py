@@ -0,0 +1,103 @@
+"""
+ResultCache: keys, hits and misses, eviction of the least recently used entries, atomic writes
+"""
+import os
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+import pytest
+
+from PDFSolvent import ResultCache, remove_watermarks
+from synthetic_pdf import synthetic_pdf
+
+
+def cache_files(cache):
+    return sorted(name for _, _, names in os.walk(cache.directory) for name in names)
+
+
+def test_key_of_input_mode_and_options(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    data = synthetic_pdf(1, 50, ('fm',), (0, 0))
+    path = tmp_path / 'in.pdf'
+    path.write_bytes(data)
+
+    key = cache.key(data, 2, streaming=False)
+    assert cache.key(str(path), 2, streaming=False) == key
+    assert cache.key(data, 1, streaming=False) != key
+    assert cache.key(data, 2, streaming=True) != key
+    assert cache.key(data + b'\n', 2, streaming=False) != key
+
+
+def test_cache_hit_does_not_import_fitz(tmp_path):
+    data = tmp_path / 'in.pdf'
+    data.write_bytes(synthetic_pdf(1, 50, ('fm',), (0, 0)))
+    script = ("import sys\n"
+              "from PDFSolvent import ResultCache, remove_watermarks\n"
+              "cache = ResultCache(sys.argv[1])\n"
+              "reports = [remove_watermarks(sys.argv[2], None, 1, cache=cache) for _ in range(2)]\n"
+              "print(reports[1]['cache'], 'fitz' in sys.modules)\n")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run([sys.executable, '-c', script, str(tmp_path / 'cache'), str(data)], env=env,
+                            stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    assert output.split() == ['hit', 'False']
+
+
+def test_remove_watermarks_hit_and_miss(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    data = synthetic_pdf(2, 100, ('fm',), (0, 0))
+
+    miss = remove_watermarks(data, None, 1, cache=cache)
+    hit = remove_watermarks(data, None, 1, cache=cache)
+    assert (miss['cache'], hit['cache']) == ('miss', 'hit')
+    assert hit['output'] == miss['output']
+    assert hit['watermarks'] == miss['watermarks'] == ['/Fm0']
+
+    assert remove_watermarks(data, None, 2, cache=cache)['cache'] == 'miss'
+    assert remove_watermarks(data, None, 1, streaming=True, cache=cache)['cache'] == 'miss'
+
+    output = tmp_path / 'out.pdf'
+    assert remove_watermarks(data, str(output), 1, cache=cache)['cache'] == 'hit'
+    assert output.read_bytes() == miss['output']
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    # Room for two entries of 1000 bytes and their '{}' reports
+    cache = ResultCache(str(tmp_path), max_bytes=2500)
+    for key in ('aa01', 'bb02'):
+        cache.put(key, BytesIO(b'%' * 1000), {})
+    now = time.time()
+    os.utime(cache.paths('aa01')[1], (now - 200, now - 200))
+    os.utime(cache.paths('bb02')[1], (now - 100, now - 100))
+    # aa01 is used again, bb02 is now the least recently used
+    assert cache.get('aa01', BytesIO()) == {}
+
+    cache.put('cc03', BytesIO(b'%' * 1000), {})
+    assert cache.get('bb02', BytesIO()) is None
+    for key in ('aa01', 'cc03'):
+        output = BytesIO()
+        assert cache.get(key, output) == {}
+        assert output.getvalue() == b'%' * 1000
+    assert sum(os.path.getsize(path) for key in ('aa01', 'cc03') for path in cache.paths(key)) <= 2500
+
+
+class InterruptedOutput(BytesIO):
+    def getbuffer(self):
+        raise KeyboardInterrupt()
+
+
+def test_interrupted_put_leaves_no_entry(tmp_path):
+    cache = ResultCache(str(tmp_path))
+
+    # While writing the PDF
+    with pytest.raises(KeyboardInterrupt):
+        cache.put('aa01', InterruptedOutput(), {})
+    assert cache_files(cache) == []
+    assert cache.get('aa01', BytesIO()) is None
+
+    # While writing the report, once the PDF is in place
+    with pytest.raises(TypeError):
+        cache.put('bb02', BytesIO(b'%PDF'), {'watermarks': object()})
+    assert cache_files(cache) == ['bb02.pdf']
+    assert cache.get('bb02', BytesIO()) is None
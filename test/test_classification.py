@@ -0,0 +1,54 @@
+"""
+Classification of the XObject resources: labels read without changing the PDF, and its cache
+"""
+from io import BytesIO
+
+import pytest
+from PyPDF4 import PdfFileReader
+from PyPDF4.generic import IndirectObject
+
+import synthetic_pdf
+from PDFSolvent import remove_watermarks
+
+
+@pytest.fixture
+def piece_info_loop_pdf():
+    """
+    A form XObject, not a watermark, whose /PieceInfo loops through two indirect objects
+    """
+    content = b"q /Fm0 Do Q BT /F1 12 Tf 72 700 Td (Body text) Tj ET"
+    form = b"0 0 10 10 re f"
+    return synthetic_pdf.pdf_file([
+        b"<</Type /Catalog /Pages 2 0 R>>",
+        b"<</Type /Pages /Count 1 /Kids [3 0 R]>>",
+        b"<</Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R"
+        b" /Resources <</Font <</F1 8 0 R>> /XObject <</Fm0 5 0 R>>>>>>",
+        b"<</Length %d>>\nstream\n%s\nendstream" % (len(content), content),
+        b"<</Type /XObject /Subtype /Form /BBox [0 0 10 10] /PieceInfo 6 0 R /Length %d>>\nstream\n%s\nendstream"
+        % (len(form), form),
+        b"<</ADBE 7 0 R>>",
+        b"<</Private /Other /Back 6 0 R>>",
+        b"<</Type /Font /Subtype /Type1 /BaseFont /Helvetica>>",
+    ], 1)
+
+
+@pytest.mark.parametrize('options', [{}, {'streaming': True}, {'incremental': True}],
+                         ids=['parsed', 'streaming', 'incremental'])
+@pytest.mark.parametrize('mode', [1, 2, 3])
+def test_piece_info_loop_is_written(piece_info_loop_pdf, mode, options):
+    report = remove_watermarks(piece_info_loop_pdf, None, mode, **options)
+    assert report['watermarks'] == []
+
+    page = PdfFileReader(BytesIO(report['output'])).getPage(0)
+    piece_info = page['/Resources']['/XObject']['/Fm0'].raw_get('/PieceInfo')
+    assert isinstance(piece_info, IndirectObject)
+    assert isinstance(piece_info.getObject().raw_get('/ADBE').getObject().raw_get('/Back'), IndirectObject)
+
+
+def test_shared_xobject_is_classified_once():
+    # Every page has its own /XObject dictionary, with the same /Fm0 and /X1
+    data = synthetic_pdf.synthetic_pdf(4, 100, ('fm', 'x'), (8, 8))
+    report = remove_watermarks(data, None, 1)
+    assert sorted(report['watermarks']) == ['/Fm0', '/X1']
+    assert report['counters']['classification_misses'] == 2
+    assert report['counters']['classification_hits'] == 6
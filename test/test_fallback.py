@@ -0,0 +1,104 @@
+"""
+PyMuPDF fallback: pages PyPDF fails on, and PDFs PyPDF can't open
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import fitz
+import pytest
+from PyPDF4.utils import PdfReadError
+
+import PDFSolvent
+from batch import remove_watermarks_from_file
+from PDFSolvent import FallbackError, remove_watermarks
+from synthetic_pdf import synthetic_pdf
+
+PDFSOLVENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'PDFSolvent')
+
+
+def page_texts(data: bytes):
+    """
+    Text of each page, without the watermark
+    """
+    return [page.get_text().replace('RETRACTED\n', '') for page in fitz.open("pdf", data)]
+
+
+def test_fallback_pages_are_merged_in_order(monkeypatch):
+    data = synthetic_pdf(4, 200, ('fm',), (0, 0), seed=1)
+    remove_from_page = PDFSolvent.remove_watermarks_from_single_page
+    calls = []
+
+    def fail_on_second_page(page, *args, **kwargs):
+        calls.append(page)
+        if len(calls) == 2:
+            raise PdfReadError("broken page")
+        return remove_from_page(page, *args, **kwargs)
+
+    monkeypatch.setattr(PDFSolvent, 'remove_watermarks_from_single_page', fail_on_second_page)
+    report = remove_watermarks(data, None, 2)
+
+    assert report['fallback'] and report['fallback_pages'] == [1]
+    assert report['backend'] == 'mixed'
+    assert page_texts(report['output']) == page_texts(data)
+
+
+def test_file_fallback(tmp_path):
+    data = bytearray(synthetic_pdf(2, 200, ('fm',), (0, 0)))
+    # PyPDF can't find the cross-reference table, PyMuPDF repairs it
+    data[data.rindex(b'startxref'):] = b''
+    report = remove_watermarks(bytes(data), str(tmp_path / 'out.pdf'), 2)
+
+    assert report['backend'] == 'fitz' and report['fallback']
+    assert len(fitz.open(str(tmp_path / 'out.pdf'))) == 2
+
+
+def test_stats_are_alone_on_stdout(tmp_path):
+    data = bytearray(synthetic_pdf(2, 200, ('fm',), (0, 0)))
+    data[data.rindex(b'startxref'):] = b''
+    pdf = tmp_path / 'in.pdf'
+    pdf.write_bytes(bytes(data))
+    result = subprocess.run([sys.executable, PDFSOLVENT_DIR, '-i', str(pdf), '-o', str(tmp_path / 'out.pdf'),
+                             '-v', '--stats', 'json'],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    assert 'fitz' in json.loads(result.stdout)
+    assert "PyPDFError trying Pymupdf" in result.stderr
+    assert "Fallback file open: 1" in result.stderr
+
+
+def test_failed_fallback_leaves_no_partial_output(tmp_path, monkeypatch):
+    def fail_while_writing(inputFile, target, stats):
+        with open(target, 'wb') as f:
+            f.write(b'%PDF-1.4 partial')
+        raise RuntimeError("PyMuPDF failed")
+
+    monkeypatch.setattr(PDFSolvent, 'fitz_remove_watermarks_with_stats', fail_while_writing)
+    with pytest.raises(FallbackError) as error:
+        remove_watermarks(b'%PDF-1.4 not a PDF', str(tmp_path / 'out.pdf'), 2)
+
+    assert error.value.report['fallback']
+    assert isinstance(error.value.__cause__, RuntimeError)
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_batch_records_failed_fallback(tmp_path):
+    inputFile = tmp_path / 'in.pdf'
+    inputFile.write_bytes(b'%PDF-1.4 not a PDF')
+    result = remove_watermarks_from_file(str(inputFile), str(tmp_path / 'out.pdf'), 2)
+
+    assert result['status'] == 'error'
+    assert result['fallback'] and result['backend'] == 'fitz'
+    assert sorted(os.listdir(str(tmp_path))) == ['in.pdf']
+
+
+def test_batch_records_timeout_in_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(PDFSolvent, 'fitz_remove_watermarks_with_stats', lambda *args: time.sleep(5))
+    inputFile = tmp_path / 'in.pdf'
+    inputFile.write_bytes(b'%PDF-1.4 not a PDF')
+    result = remove_watermarks_from_file(str(inputFile), str(tmp_path / 'out.pdf'), 2, timeout=0.2)
+
+    assert result['status'] == 'timeout' and 'error' not in result
+    assert result['fallback'] and result['backend'] == 'fitz'
+    assert sorted(os.listdir(str(tmp_path))) == ['in.pdf']
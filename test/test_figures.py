@@ -0,0 +1,30 @@
+"""
+Figures covering the page: the size of the unit square mapped by the CTM of their blocks
+"""
+from io import BytesIO
+
+import pytest
+from PyPDF4 import PdfFileReader
+
+import synthetic_pdf
+from PDFSolvent import find_figures_covering_page
+
+# The CTM of the /X1 block, and whether the figure covers the 612 x 792 page
+MATRICES = {
+    'full-page': (b"612 0 0 792 0 0", True),
+    'flipped': (b"612 0 0 -792 0 792", True),
+    'rotated': (b"0 792 -612 0 612 0", True),
+    'full-width-strip': (b"612 0 0 20 0 380", False),
+    'full-height-strip': (b"20 0 0 792 300 0", False),
+    'rotated-strip': (b"0 20 -612 0 612 380", False),
+}
+
+
+@pytest.mark.parametrize('streaming', [False, True], ids=['parsed', 'streaming'])
+@pytest.mark.parametrize('matrix, covers', list(MATRICES.values()), ids=list(MATRICES))
+def test_figure_coverage(monkeypatch, matrix, covers, streaming):
+    monkeypatch.setitem(synthetic_pdf.WATERMARK_BLOCKS, 'x', b"q " + matrix + b" cm /X1 Do Q\n")
+    source = PdfFileReader(BytesIO(synthetic_pdf.synthetic_pdf(1, 100, ('x',), (0, 0))))
+
+    figures = find_figures_covering_page(source.getPage(0), source, ['/X1'], streaming=streaming)
+    assert figures == (['/X1'] if covers else [])
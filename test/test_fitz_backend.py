@@ -0,0 +1,50 @@
+"""
+PyMuPDF path: --backend fitz and the /Artifact watermark stripping
+"""
+import mmap
+
+import fitz
+import pytest
+
+from PDFSolvent import fitz_open_input, fitz_solvent_watermarks, remove_watermarks
+from synthetic_pdf import synthetic_pdf
+
+
+def page_contents(data: bytes) -> bytes:
+    doc = fitz.open("pdf", data)
+    return b''.join(doc.xref_stream(xref) for page in doc for xref in page.get_contents())
+
+
+def test_fitz_strips_artifact_watermarks():
+    data = synthetic_pdf(3, 200, ('artifact',), (0, 0))
+    assert b'/Watermark' in page_contents(data)
+
+    output = fitz_solvent_watermarks(data)
+    assert b'/Watermark' not in page_contents(output)
+    assert len(fitz.open("pdf", output)) == 3
+
+
+def test_fitz_backend():
+    report = remove_watermarks(synthetic_pdf(2, 200, ('artifact',), (0, 0)), None, 2, backend='fitz')
+    assert report['backend'] == 'fitz'
+    assert b'/Watermark' not in page_contents(report['output'])
+
+
+@pytest.mark.parametrize('buffer, copied', [
+    (bytes, False), (bytearray, False), (memoryview, False),
+    (lambda data: memoryview(data)[1:], True), (lambda data: mmap.mmap(-1, len(data)), True),
+], ids=['bytes', 'bytearray', 'memoryview', 'memoryview-slice', 'mmap'])
+def test_fitz_reads_buffers_in_place(monkeypatch, buffer, copied):
+    data = synthetic_pdf(1, 50, (), (0, 0))
+    pdf = buffer(data)
+    streams = []
+    fitz_open = fitz.open
+    monkeypatch.setattr(fitz, 'open', lambda *args, **kwargs: streams.append(kwargs['stream']))
+
+    fitz_open_input(pdf)
+    stream, = streams
+    assert isinstance(stream, (bytes, bytearray))
+    source = pdf.obj if isinstance(pdf, memoryview) else pdf
+    assert (stream is not source) == copied
+    if not copied:
+        assert fitz_open(stream=stream, filetype="pdf").page_count == 1
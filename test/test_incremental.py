@@ -0,0 +1,54 @@
+"""
+Incremental updates: the original PDF followed by the changed objects, equivalent to the full rewrite
+"""
+from io import BytesIO
+
+import fitz
+import pytest
+from PyPDF4 import PdfFileReader
+
+from PDFSolvent import remove_watermarks
+from synthetic_pdf import pdf_file, synthetic_pdf
+
+CONTENT = b"q /Fm0 Do Q BT /F1 12 Tf 72 700 Td (Body text) Tj ET"
+WATERMARK = b"BT /F1 40 Tf 100 400 Td (WATERMARK) Tj ET"
+
+
+def watermarked_pdf(resources: bytes, indirect: bytes) -> bytes:
+    """
+    One page drawing the /Fm0 watermark, the only entry of its /XObject
+    dictionary; 'indirect' is the object 6, referred to by 'resources'
+    """
+    return pdf_file([
+        b"<</Type /Catalog /Pages 2 0 R>>",
+        b"<</Type /Pages /Count 1 /Kids [3 0 R]>>",
+        b"<</Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources %s>>" % resources,
+        b"<</Length %d>>\nstream\n%s\nendstream" % (len(CONTENT), CONTENT),
+        b"<</Type /XObject /Subtype /Form /BBox [0 0 612 792] /Resources <</Font <</F1 7 0 R>>>>"
+        b" /PieceInfo <</ADBE_CompoundType <</Private /Watermark>>>> /Length %d>>\nstream\n%s\nendstream"
+        % (len(WATERMARK), WATERMARK),
+        indirect,
+        b"<</Type /Font /Subtype /Type1 /BaseFont /Helvetica>>",
+    ], 1)
+
+
+@pytest.mark.parametrize('data', [
+    watermarked_pdf(b"<</Font <</F1 7 0 R>> /XObject 6 0 R>>", b"<</Fm0 5 0 R>>"),
+    watermarked_pdf(b"6 0 R", b"<</Font <</F1 7 0 R>> /XObject <</Fm0 5 0 R>>>>"),
+], ids=['indirect-xobject', 'indirect-resources'])
+def test_emptied_resources_are_updated(data):
+    full = remove_watermarks(data, None, 1)['output']
+    incremental = remove_watermarks(data, None, 1, incremental=True)['output']
+    assert incremental.startswith(data)
+
+    assert dict(PdfFileReader(BytesIO(incremental)).getPage(0)['/Resources']['/XObject']) == {}
+    docs = [fitz.open("pdf", output) for output in (full, incremental)]
+    assert [doc[0].get_xobjects() for doc in docs] == [[], []]
+    assert docs[1][0].get_text() == docs[0][0].get_text() == "Body text\n"
+
+
+def test_unchanged_pdf_is_copied():
+    data = synthetic_pdf(2, 100, (), (0, 0))
+    output = remove_watermarks(data, None, 1, incremental=True)['output']
+    assert output == data
+    assert PdfFileReader(BytesIO(output)).getNumPages() == 2
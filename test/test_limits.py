@@ -0,0 +1,68 @@
+"""
+Resource limits: the way out of each limited page, and the budget checks while parsing
+"""
+import os
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+import pytest
+from PyPDF4 import PdfFileReader
+
+import PDFSolvent
+from PDFSolvent import RemovalLimits, ResourceLimitExceeded, remove_watermarks, stream_remove_watermarks_from_page
+from synthetic_pdf import synthetic_pdf
+
+PDFSOLVENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'PDFSolvent')
+
+
+def test_limited_pages_actions():
+    data = synthetic_pdf(4, 200, ('fm',), (0, 0))
+    report = remove_watermarks(data, None, 1, limits=RemovalLimits(max_pages=2, degrade='passthrough'))
+    assert report['limited_pages'] == [2, 3]
+    assert report['passthrough_pages'] == [2, 3]
+
+    report = remove_watermarks(data, None, 1, limits=RemovalLimits(max_pages=2, degrade='fitz'))
+    assert report['limited_pages'] == [2, 3]
+    assert report['passthrough_pages'] == []
+
+
+def test_cli_reports_the_action_taken(tmp_path):
+    pdf = tmp_path / 'in.pdf'
+    pdf.write_bytes(synthetic_pdf(3, 200, ('fm',), (0, 0)))
+    output = subprocess.run([sys.executable, PDFSOLVENT_DIR, '-i', str(pdf), '-o', str(tmp_path / 'out.pdf'),
+                             '-m', '1', '--max-pages', '1', '--max-page-stream-bytes', '1'],
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    # The first page goes over max_page_stream_bytes, copied unchanged whatever --on-limit says
+    assert "Pages over the limits, cleaned by PyMuPDF: 2, 3" in output
+    assert "Pages over the limits, copied unchanged: 1" in output
+
+
+def test_streaming_rewrite_stops_within_budget():
+    source = PdfFileReader(BytesIO(synthetic_pdf(1, 5000, ('fm',), (0, 0))))
+    page = source.getPage(0)
+    contents = page.raw_get('/Contents')
+    budget = RemovalLimits(max_seconds=60).start()
+    budget.exceeded = 'max_seconds'
+
+    with pytest.raises(ResourceLimitExceeded):
+        stream_remove_watermarks_from_page(page, ['/Fm0'], 3, budget=budget)
+    assert page.raw_get('/Contents') is contents
+
+
+def test_workers_check_the_time_limit(monkeypatch):
+    # The detection leaves the workers no time: they limit every page, the parent can't have seen it first
+    get_operands_watermarks_list = PDFSolvent.get_operands_watermarks_list
+
+    def slow_detection(*args):
+        watermarks = get_operands_watermarks_list(*args)
+        time.sleep(0.4)
+        return watermarks
+    monkeypatch.setattr(PDFSolvent, 'get_operands_watermarks_list', slow_detection)
+
+    data = synthetic_pdf(4, 200, ('fm',), (0, 0))
+    report = remove_watermarks(data, None, 1, workers=2,
+                               limits=RemovalLimits(max_seconds=0.3, degrade='passthrough'))
+    assert report['limited_pages'] == [0, 1, 2, 3]
+    assert report['passthrough_pages'] == [0, 1, 2, 3]
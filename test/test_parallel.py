@@ -0,0 +1,70 @@
+"""
+Parallel page processing: the output is the one of a serial run, byte for byte
+"""
+import os
+import re
+
+import pytest
+
+import synthetic_pdf
+from PDFSolvent import RemovalLimits, remove_watermarks
+
+# PyMuPDF gives every PDF it writes a new /ID, of hex or literal strings
+PDF_STRING = rb'(?:<[0-9A-Fa-f]*>|\((?:[^()\\]|\\.)*\))'
+PDF_ID = re.compile(rb'/ID\s*\[\s*%s\s*%s\s*\]' % (PDF_STRING, PDF_STRING), re.DOTALL)
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LIMITS = [None, RemovalLimits(max_pages=2, degrade='passthrough'), RemovalLimits(max_pages=2, degrade='fitz')]
+
+
+@pytest.fixture
+def x_figure_pdf(monkeypatch):
+    """
+    4 pages drawing an /X1 image that doesn't cover them, so the detection
+    parses every page and leaves it unchanged
+    """
+    page_content = synthetic_pdf.page_content
+    monkeypatch.setattr(synthetic_pdf, 'page_content',
+                        lambda *args: page_content(*args).replace(b'/Im0', b'/X1'))
+    return synthetic_pdf.synthetic_pdf(4, 200, (), (8, 8)).replace(b'/Im0 ', b'/X1  ')
+
+
+@pytest.mark.parametrize('limits', LIMITS, ids=['no-limits', 'passthrough', 'fitz'])
+@pytest.mark.parametrize('streaming', [False, True], ids=['parsed', 'streaming'])
+@pytest.mark.parametrize('mode', [1, 2, 3])
+def test_parallel_output_is_the_serial_output(x_figure_pdf, mode, streaming, limits):
+    serial = remove_watermarks(x_figure_pdf, None, mode, streaming=streaming, limits=limits)
+    parallel = remove_watermarks(x_figure_pdf, None, mode, streaming=streaming, limits=limits, workers=2)
+    assert PDF_ID.sub(b'', parallel['output']) == PDF_ID.sub(b'', serial['output'])
+
+
+@pytest.mark.parametrize('mode', [1, 2, 3])
+def test_parallel_incremental_output_is_the_serial_output(x_figure_pdf, mode):
+    serial = remove_watermarks(x_figure_pdf, None, mode, incremental=True)
+    parallel = remove_watermarks(x_figure_pdf, None, mode, incremental=True, workers=2)
+    assert parallel['output'] == serial['output']
+
+
+def test_unchanged_pages_keep_their_content_streams(x_figure_pdf):
+    # Nothing to remove at level 1: every content stream is copied as it is
+    output = remove_watermarks(x_figure_pdf, None, 1, workers=2)['output']
+    assert output.count(b'/FlateDecode') == x_figure_pdf.count(b'/FlateDecode')
+
+
+@pytest.mark.parametrize('mode', [1, 2, 3])
+def test_parallel_removal_is_the_serial_removal(mode):
+    # More pages than workers, with watermarks to remove on every page
+    data = synthetic_pdf.synthetic_pdf(5, 300, ('fm', 'extgstate', 'retracted'), (0, 0))
+    serial = remove_watermarks(data, None, mode)
+    parallel = remove_watermarks(data, None, mode, workers=2)
+    assert serial['watermarks']
+    assert parallel['output'] == serial['output']
+    assert parallel['output'] != data
+
+
+@pytest.mark.parametrize('name', ['10.1016_j.canlet.2010.09.002.pdf', '10.1371_journal.pone.0003856.pdf'])
+def test_parallel_removal_of_the_test_pdfs(name):
+    with open(os.path.join(TEST_DIR, name), 'rb') as f:
+        data = f.read()
+    assert remove_watermarks(data, None, 2, workers=3)['output'] == remove_watermarks(data, None, 2)['output']
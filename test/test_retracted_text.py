@@ -0,0 +1,50 @@
+"""
+'RETRACTED' text pass: the strings of the text operations read from the bytes
+are the ones PyPDF parses
+"""
+import pytest
+from PyPDF4.generic import DecodedStreamObject
+
+from PDFSolvent import CompactContentStream, shown_text, text_operands
+
+TEXT_OPERATIONS = [
+    b'(RETRACTED) Tj',
+    b'[(RE) -20 (TRAC) 15.5 (TED)] TJ',
+    b'<52455452414354454420> Tj',
+    b'[<5245 5452 4>] TJ',
+    b'<feff00520045> Tj',
+    b'(R\\(E\\)T\\\\R\\101\\103TED\\n) Tj',
+    b'(\\12a) Tj',
+    b'(\\7) Tj',
+    b'(a\\\nb) Tj',
+    b'(a(b)c) Tj',
+    b'(\x85\xa0\x1c\x80) Tj',
+    b'(\x00\n) Tj',
+    b'5 (a) Tj',
+    b'[(a) [(b)]] TJ',
+]
+
+
+def shown_strings(operands):
+    """
+    Strings of the operands that shown_text reads, and their PyPDF types
+    """
+    strings = operands[0] if operands and isinstance(operands[0], list) else operands[:1]
+    return [(string, type(string)) for string in strings if isinstance(string, (str, bytes))]
+
+
+@pytest.mark.parametrize('operation', TEXT_OPERATIONS)
+def test_text_operands_are_the_parsed_ones(operation):
+    stream = DecodedStreamObject()
+    stream.setData(b'BT ' + operation + b' ET')
+    content = CompactContentStream(stream, None)
+    try:
+        operands = content.operands(1)
+    except Exception as error:
+        # Left to PyPDF, which fails on it the same way
+        with pytest.raises(type(error)):
+            text_operands(content, 1)
+        return
+
+    assert shown_strings(text_operands(content, 1)) == shown_strings(operands)
+    assert shown_text(text_operands(content, 1, text=True)) == shown_text(operands)
@@ -0,0 +1,25 @@
+"""
+Server: the PDFs that requests can send by path=
+"""
+import os
+
+from server import resolve_served_path
+
+
+def test_path_is_disabled_without_root(tmp_path):
+    assert resolve_served_path(None, str(tmp_path / 'in.pdf')) is None
+
+
+def test_path_stays_below_root(tmp_path):
+    root = tmp_path / 'pdfs'
+    root.mkdir()
+    (root / 'in.pdf').write_bytes(b'%PDF-1.4')
+    (tmp_path / 'secret.pdf').write_bytes(b'%PDF-1.4')
+    os.symlink(str(tmp_path / 'secret.pdf'), str(root / 'link.pdf'))
+    resolved = os.path.realpath(str(root / 'in.pdf'))
+
+    assert resolve_served_path(str(root), 'in.pdf') == resolved
+    assert resolve_served_path(str(root), str(root / 'in.pdf')) == resolved
+    assert resolve_served_path(str(root), '../secret.pdf') is None
+    assert resolve_served_path(str(root), str(tmp_path / 'secret.pdf')) is None
+    assert resolve_served_path(str(root), 'link.pdf') is None
@@ -0,0 +1,54 @@
+"""
+Triage of the watermark candidates, against what the removal takes as watermarks
+"""
+import json
+import os
+import subprocess
+import sys
+from io import BytesIO
+
+import pytest
+from PyPDF4 import PdfFileReader
+
+from PDFSolvent import find_watermark_candidates, remove_watermarks
+import synthetic_pdf
+
+PDFSOLVENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'PDFSolvent')
+
+
+def test_shared_extgstate_is_not_a_candidate_at_level_2(monkeypatch):
+    # /GS0 is in the resources of every page, but no page draws the watermark block
+    monkeypatch.setitem(synthetic_pdf.WATERMARK_BLOCKS, 'extgstate', b'')
+    data = synthetic_pdf.synthetic_pdf(4, 200, ('extgstate',), (0, 0))
+
+    flags = find_watermark_candidates(PdfFileReader(BytesIO(data)), 2)
+    assert not flags['repeated_extgstate']
+    assert not flags['candidates']
+    assert remove_watermarks(data, None, 2)['watermarks'] == []
+
+    assert find_watermark_candidates(PdfFileReader(BytesIO(data)), 3)['repeated_extgstate']
+
+
+def check(path):
+    return subprocess.run([sys.executable, PDFSOLVENT_DIR, '-i', str(path), '-m', '1', '--check'],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+
+@pytest.mark.parametrize('styles, status', [(('fm',), 1), ((), 0)], ids=['watermarked', 'clean'])
+def test_check_exit_status(tmp_path, styles, status):
+    pdf = tmp_path / 'in.pdf'
+    pdf.write_bytes(synthetic_pdf.synthetic_pdf(2, 100, styles, (0, 0)))
+    result = check(pdf)
+    assert result.returncode == status
+    assert json.loads(result.stdout)['candidates'] == bool(status)
+
+
+@pytest.mark.parametrize('data', [b'not a PDF', None], ids=['malformed', 'missing'])
+def test_check_of_unreadable_pdf(tmp_path, data):
+    pdf = tmp_path / 'in.pdf'
+    if data is not None:
+        pdf.write_bytes(data)
+    result = check(pdf)
+    assert result.returncode == 2
+    assert result.stdout == ''
+    assert result.stderr.startswith("Could not read ") and 'Traceback' not in result.stderr